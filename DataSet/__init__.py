@@ -1,3 +1,5 @@
+from .storage import *
+from .graphs import *
 from .preprocess import *
 from .loader import *
 from .trajectories import *
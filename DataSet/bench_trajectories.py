@@ -0,0 +1,77 @@
+'''
+timing benchmark of window extraction: per-frame loop (extract_windows_loop) vs sort-based engine (extract_windows)
+synthetic scene file in preprocessed format (frame, id, x, y, vx, vy)
+'''
+
+import numpy as np
+
+import argparse
+import os
+import tempfile
+import time
+
+from trajectories import read_file, extract_windows, extract_windows_loop
+
+
+def synthetic_scene(num_frames, num_agents, drop_rate=0.02, seed=0):
+    rng = np.random.RandomState(seed)
+    data = []
+    for agent_id in range(num_agents):
+        front = rng.randint(0, num_frames-1)
+        end = rng.randint(front+1, num_frames+1)
+        frames = np.arange(front, end)
+        frames = frames[rng.rand(len(frames)) >= drop_rate]  # missing detections break tracks
+        pos = np.cumsum(rng.randn(len(frames), 2), axis=0)
+        vel = np.append(pos[1:]-pos[:-1], np.zeros((1, 2)), axis=0)
+        agent_data = np.zeros((len(frames), 6))
+        agent_data[:, 0] = frames
+        agent_data[:, 1] = agent_id
+        agent_data[:, 2:4] = pos
+        agent_data[:, 4:6] = vel
+        data.append(agent_data)
+    data = np.concatenate(data, axis=0)
+
+    return data[np.argsort(data[:, 0], kind='stable')]
+
+
+def time_call(func, data, args, repeat):
+    times = []
+    for _ in range(repeat):
+        t_start = time.time()
+        out = func(data, args.obs_len+args.pred_len, args.frame_skip, args.dset_feature, args.min_agent)
+        times.append(time.time()-t_start)
+
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--num_frames', type=int, default=2000)
+    parser.add_argument('--num_agents', type=int, default=400)
+    parser.add_argument('--obs_len', type=int, default=15)
+    parser.add_argument('--pred_len', type=int, default=25)
+    parser.add_argument('--frame_skip', type=int, default=1)
+    parser.add_argument('--dset_feature', type=int, default=4)
+    parser.add_argument('--min_agent', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'data0')
+        np.savetxt(path, synthetic_scene(args.num_frames, args.num_agents), delimiter=',')
+        data = read_file(path)
+
+    t_loop, (seq_loop, ids_loop, num_loop) = time_call(extract_windows_loop, data, args, args.repeat)
+    t_sort, (seq_sort, ids_sort, num_sort) = time_call(extract_windows, data, args, args.repeat)
+
+    same = np.array_equal(seq_loop, seq_sort) and num_loop == num_sort and \
+           all(np.array_equal(i, j) for i, j in zip(ids_loop, ids_sort))
+
+    print('rows {}, windows {}, tracks {}'.format(len(data), len(num_sort), len(seq_sort)))
+    print('loop = {:.3f}s, sort = {:.3f}s, speedup = {:.1f}x, identical = {}'.format(t_loop, t_sort, t_loop/max(t_sort, 1e-9), same))
+
+
+if __name__ == '__main__':
+    main()
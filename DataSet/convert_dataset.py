@@ -0,0 +1,34 @@
+'''
+one-shot conversion of text splits (dataset/<Name>/<tag>/{train,test}/data*) into .npy shards with a manifest
+'''
+
+import argparse
+import os
+
+from storage import convert_split, text_files
+
+
+def split_dirs(root):
+    for dir_path, dir_names, _ in os.walk(root):
+        dir_names.sort()
+        if os.path.basename(dir_path) in ('train', 'test'):
+            yield dir_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--dset_root', type=str, default='dataset')
+    parser.add_argument('--delim', type=str, default=',')
+    parser.add_argument('--remove_text', action='store_true', default=False)
+
+    args = parser.parse_args()
+
+    for split_dir in split_dirs(args.dset_root):
+        if len(text_files(split_dir)) == 0: continue
+        converted = convert_split(split_dir, delim=args.delim, remove_text=args.remove_text)
+        print('{}: {} shards'.format(split_dir, len(converted)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+normalized adjacency sequences (As_seq) of trajectory windows, computed once when the dataset is built
+same graphs as Models/stgcn3d_gep_*/graph.py: kernel 0 is the identity, kernel 1 the time-to-closest-approach weights
+of the vectorized window (frames 1..T-1 minus frame 0, as data_vectorize), normalized as D^-1/2 A D^-1/2
+a dataset keeps them as one flat float32 array, window i is graph_data[offsets[i]:offsets[i+1]] seen as (T-1, K, V, V)
+'''
+
+import torch
+
+import numpy as np
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Models', 'common'))
+from graph_ops import ttc_weights, normalize_adjacency
+
+
+NUM_KERNELS = 2
+
+
+def window_graphs(traj, alpha=1e-3):
+    # traj size: (..., T, V, F) float windows -> As_seq (..., T-1, K, V, V)
+    vectorized = traj[..., 1:, :, :]-traj[..., :1, :, :]
+    V = traj.size(-2)
+
+    A = torch.zeros(vectorized.shape[:-2]+(NUM_KERNELS, V, V))
+    A[..., 0, :, :] = torch.eye(V)
+    A[..., 1, :, :] = ttc_weights(vectorized)
+
+    return normalize_adjacency(A, alpha)
+
+
+def graph_offsets(num_nodes_seq_list, seq_len):
+    sizes = (seq_len-1)*NUM_KERNELS*np.asarray(num_nodes_seq_list, dtype=np.int64)**2
+
+    return np.concatenate(([0], np.cumsum(sizes)))
+
+
+def build_graphs(traj, num_nodes_seq_list, alpha=1e-3, max_floats=1<<24, out=None):
+    # traj size: (P, F, T) float tracks of all windows back to back, as TrajectoryDataset keeps them
+    # windows with the same node count go through window_graphs together, max_floats bounds one group
+    # out: flat float32 array of graph_offsets(...)[-1] values to fill, e.g. a memmap, so the table is never held in memory
+    seq_len = traj.size(2)
+    offsets = graph_offsets(num_nodes_seq_list, seq_len)
+    graph_data = np.zeros(offsets[-1], dtype=np.float32) if out is None else out
+
+    num_nodes = np.asarray(num_nodes_seq_list, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(num_nodes)[:-1])).astype(np.int64)
+    for V in np.unique(num_nodes):
+        windows = np.flatnonzero(num_nodes == V)
+        step = max(1, max_floats//int((seq_len-1)*NUM_KERNELS*V*V))
+        for lo in range(0, len(windows), step):
+            batch = windows[lo:lo+step]
+            rows = torch.from_numpy(starts[batch][:, None]+np.arange(V))
+            As_seq = window_graphs(traj[rows].permute(0, 3, 1, 2), alpha)  # (G, V, F, T) -> (G, T, V, F)
+            for window, block in zip(batch, As_seq.reshape(len(batch), -1).numpy()):
+                graph_data[offsets[window]:offsets[window+1]] = block
+
+    return graph_data
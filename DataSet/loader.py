@@ -1,23 +1,196 @@
-from torch.utils.data import DataLoader
-from trajectories import TrajectoryDataset, seq_collate
+import torch
+from torch.utils.data import DataLoader, Sampler
+from trajectories import TrajectoryDataset, seq_collate, seq_collate_padded, split_files
+from storage import file_stamp
+from graphs import graph_offsets, build_graphs
+
+import numpy as np
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+CACHE_VERSION = 1  # bump when the windowing rules change
+
+
+def window_cache_key(path, args, min_agent=1):
+    params = {
+        'version': CACHE_VERSION,
+        'obs_len': args.obs_len,
+        'pred_len': args.pred_len,
+        'frame_skip': args.frame_skip,
+        'num_feature': args.dset_feature,
+        'min_agent': min_agent,
+        'files': [file_stamp(file) for file in split_files(path)]
+    }
+
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_window_cache(cache_dir, key):
+    entry = os.path.join(cache_dir, key)
+    if not os.path.isfile(os.path.join(entry, 'meta.json')):
+        return None
+
+    seq_list = np.load(os.path.join(entry, 'seq.npy'))
+    ids = np.load(os.path.join(entry, 'ids.npy'))
+    num_nodes = np.load(os.path.join(entry, 'num_nodes.npy'))
+
+    ids_seq_list = np.split(ids, np.cumsum(num_nodes)[:-1]) if len(num_nodes) > 0 else []
+
+    return seq_list, ids_seq_list, num_nodes.tolist()
+
+
+def save_window_cache(cache_dir, key, dset):
+    entry = os.path.join(cache_dir, key)
+    if os.path.isdir(entry):
+        return
+
+    seq_list, ids_seq_list, num_nodes_seq_list = dset.get_windows()
+    ids = np.concatenate(ids_seq_list) if ids_seq_list else np.zeros(0)
+
+    # write next to the final entry and rename, so concurrent runs never read a partial entry
+    if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+    tmp_entry = tempfile.mkdtemp(prefix=key+'.', dir=cache_dir)
+    np.save(os.path.join(tmp_entry, 'seq.npy'), seq_list)
+    np.save(os.path.join(tmp_entry, 'ids.npy'), ids)
+    np.save(os.path.join(tmp_entry, 'num_nodes.npy'), np.asarray(num_nodes_seq_list, dtype=np.int64))
+    with open(os.path.join(tmp_entry, 'meta.json'), 'w') as f:
+        json.dump({'data_dir': os.path.abspath(dset.data_dir), 'num_seq': dset.num_seq, 'seq_len': dset.seq_len}, f, indent=2)
+
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:
+        shutil.rmtree(tmp_entry, ignore_errors=True)  # another run stored the same windows first
+
+
+def load_graph_cache(cache_dir, key):
+    path = os.path.join(cache_dir, key, 'graphs.npy')
+    if not os.path.isfile(path):
+        return None
+
+    return np.load(path, mmap_mode='r')
+
+
+def save_graph_cache(cache_dir, key, dset):
+    # added to an existing window entry, the first run asking for graphs stores them
+    # blocks are written straight into the memory-mapped file, the dataset does not build its own copy first
+    entry = os.path.join(cache_dir, key)
+    path = os.path.join(entry, 'graphs.npy')
+    if not os.path.isdir(entry) or os.path.isfile(path):
+        return
+
+    traj = torch.cat((dset.obs_traj, dset.pred_traj), dim=2)
+    size = int(graph_offsets(dset.num_nodes_seq_list, dset.seq_len)[-1])
+
+    fd, tmp_path = tempfile.mkstemp(prefix='graphs.', suffix='.npy', dir=entry)
+    os.close(fd)
+    graph_data = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(size,))
+    build_graphs(traj, dset.num_nodes_seq_list, out=graph_data)
+    graph_data.flush()
+    del graph_data
+    os.replace(tmp_path, path)
+
+
+class NodeCountBatchSampler(Sampler):
+    # batches only hold scenes with the same number of nodes, so data_batch yields one full group per batch
+    # every scene is visited once per epoch, only the last batch of each node count can be short
+    def __init__(self, num_nodes_seq_list, batch_size, shuffle=True, drop_last=False):
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+        num_nodes = np.asarray(num_nodes_seq_list)
+        self.buckets = [np.flatnonzero(num_nodes == num) for num in np.unique(num_nodes)]
+
+
+    def __iter__(self):
+        batches = []
+        for bucket in self.buckets:
+            if self.shuffle:
+                bucket = bucket[torch.randperm(len(bucket)).numpy()]
+            for start in range(0, len(bucket), self.batch_size):
+                batch = bucket[start:start+self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size: break
+                batches.append(batch.tolist())
+
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches)).tolist()]
+
+        return iter(batches)
+
+
+    def __len__(self):
+        if self.drop_last:
+            return sum(len(bucket)//self.batch_size for bucket in self.buckets)
+
+        return sum((len(bucket)+self.batch_size-1)//self.batch_size for bucket in self.buckets)
+
 
 def data_loader(args, path, min_agent=1):
+    lazy = getattr(args, 'dset_lazy', False)
+    cache_dir = getattr(args, 'dset_cache', None)
+    use_cache = bool(cache_dir) and not lazy
+
+    graphs = getattr(args, 'dset_graphs', False)
+
+    windows, graph_data = None, None
+    if use_cache:
+        key = window_cache_key(path, args, min_agent)
+        windows = load_window_cache(cache_dir, key)
+        if windows is not None and graphs:
+            graph_data = load_graph_cache(cache_dir, key)
+
+    # with a cache, missing graphs are built into the cache entry and memory-mapped from there
+    cache_graphs = use_cache and graphs and graph_data is None
+
     dset = TrajectoryDataset(
         path,
         obs_len=args.obs_len,
         pred_len=args.pred_len,
         frame_skip=args.frame_skip,
         num_feature=args.dset_feature,
-        min_agent=min_agent
+        min_agent=min_agent,
+        lazy=lazy,
+        num_workers=getattr(args, 'dset_workers', 0),
+        windows=windows,
+        graphs=graphs and not cache_graphs,
+        graph_data=graph_data
     )
 
-    loader = DataLoader(
-        dset,
-        batch_size=args.batch_size,
-        shuffle=True,
-        num_workers=args.num_worker,
-        drop_last=True,
-        collate_fn=seq_collate
-    )
+    if use_cache and windows is None:
+        save_window_cache(cache_dir, key, dset)
+    if cache_graphs:
+        save_graph_cache(cache_dir, key, dset)
+        cached = load_graph_cache(cache_dir, key)
+        dset.graphs = True
+        dset.set_graphs(cached if cached is not None else build_graphs(torch.cat((dset.obs_traj, dset.pred_traj), dim=2), dset.num_nodes_seq_list))
+
+    # padded batches come as (obs, pred, ids, node_mask, num_nodes) for models that take mixed node counts at once
+    padded = getattr(args, 'dset_padded', False)
+    collate_fn = seq_collate_padded if padded else seq_collate
+    pin_memory = padded and torch.cuda.is_available()
+
+    if getattr(args, 'node_batch', False):
+        loader = DataLoader(
+            dset,
+            batch_sampler=NodeCountBatchSampler(dset.num_nodes_seq_list, args.batch_size, shuffle=True),
+            num_workers=args.num_worker,
+            collate_fn=collate_fn,
+            pin_memory=pin_memory
+        )
+    else:
+        loader = DataLoader(
+            dset,
+            batch_size=args.batch_size,
+            shuffle=True,
+            num_workers=args.num_worker,
+            drop_last=True,
+            collate_fn=collate_fn,
+            pin_memory=pin_memory
+        )
 
     return dset, loader
@@ -1,22 +1,29 @@
 '''
 format orginal dataset data into (frame, id, local x, local y, local vx, local vy .etc)
 divide dataset data into 'train' / 'test'
+raw files are converted in chunks (see stream.py), so peak memory does not grow with the raw file size
 '''
 
 import numpy as np
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+from storage import save_shard, add_shard, remove_shard, read_manifest, file_digest
+from stream import read_chunks, estimate_parts, convert_tracks, stream_convert, NUM_CONVERTED_COLUMNS
 
 '''
 Stanford Drone Dataset
 '''
 
 class DroneDataset():
-    def __init__(self, dset_path, save_path='dataset'):
+    def __init__(self, dset_path, save_path='dataset', chunk_rows=1<<20):
         self.dset_path = dset_path
         self.save_path = save_path
         self.base_path = 'annotations'
         #self.categories = {'bookstore':7, 'coupa':4, 'deathCircle':5, 'gates':9, 'hyang':15, 'little':4, 'nexus':12, 'quad':4}
         self.categories = {'deathCircle':1}
+        self.chunk_rows = chunk_rows
         self.files = []
 
 
@@ -27,254 +34,260 @@ class DroneDataset():
                 self.files.append(file)
 
 
-    def data_convert(self, file):
-        raw_data = np.loadtxt(file, delimiter=' ', usecols=(0, 1, 2, 3, 4, 5))
-        converted_data = []
-
-        data = raw_data[np.argsort(raw_data[:, 0])]
-        agent_ids = np.unique(data[:, 0])
+    def data_chunks(self, file):
+        return read_chunks(file, delimiter=' ', usecols=(0, 1, 2, 3, 4, 5), chunk_rows=self.chunk_rows)
 
-        for agent_id in agent_ids:
-            data_seg = data[data[:, 0] == agent_id, :]
-            converted_data_seg = np.zeros((data_seg.shape[0], 6))
 
-            data_seg_x = (data_seg[:, 1]+data_seg[:, 3]) / 2
-            data_seg_y = (data_seg[:, 2]+data_seg[:, 4]) / 2
-            data_seg_vx = data_seg_x[1:]-data_seg_x[:-1]
-            data_seg_vy = data_seg_y[1:]-data_seg_y[:-1]
-            data_seg_vx, data_seg_vy = np.append(data_seg_vx, 0.0), np.append(data_seg_vy, 0.0)
-            
-            converted_data_seg[:, 0] = data_seg[:, 5]
-            converted_data_seg[:, 1] = data_seg[:, 0]
-            converted_data_seg[:, 2] = data_seg_x
-            converted_data_seg[:, 3] = data_seg_y
-            converted_data_seg[:, 4] = data_seg_vx
-            converted_data_seg[:, 5] = data_seg_vy
+    def data_tracks(self, raw_data):
+        # (frame, id, x, y), position is the bounding box center
+        return np.stack((raw_data[:, 5], raw_data[:, 0], (raw_data[:, 1]+raw_data[:, 3])/2, (raw_data[:, 2]+raw_data[:, 4])/2), axis=1)
 
-            converted_data.append(converted_data_seg)
-        converted_data = np.concatenate(converted_data, axis=0)
 
-        converted_data = converted_data[np.argsort(converted_data[:, 0])]
-
-        return converted_data
+    def data_convert(self, file):
+        raw_data = np.concatenate(list(self.data_chunks(file)), axis=0)
 
+        return convert_tracks(self.data_tracks(raw_data))
 
-    def data_save(self, converted_data):
-        #converted_data = converted_data[:converted_data.shape[0]//10, :]
 
-        bound = int(converted_data.shape[0]*0.7)
-        train_data = converted_data[:bound, :]
-        test_data = converted_data[bound:, :]
+    def split_ranges(self, num_rows):
+        bound = int(num_rows*0.7)
 
         train_path = os.path.join(self.save_path, 'DroneDataset', 'train')
         test_path = os.path.join(self.save_path, 'DroneDataset', 'test')
 
-        if not os.path.exists(train_path): os.makedirs(train_path)
-        if not os.path.exists(test_path): os.makedirs(test_path)
+        return [(0, bound, train_path), (bound, num_rows, test_path)]
 
-        train_count = len([name for name in os.listdir(train_path) if os.path.isfile(os.path.join(train_path, name))])
-        test_count = len([name for name in os.listdir(test_path) if os.path.isfile(os.path.join(test_path, name))])
 
-        train_name = os.path.join(train_path, 'data'+str(train_count))
-        test_name = os.path.join(test_path, 'data'+str(test_count))
+    def data_save(self, converted_data):
+        #converted_data = converted_data[:converted_data.shape[0]//10, :]
 
-        np.savetxt(train_name, train_data, delimiter=',')
-        np.savetxt(test_name, test_data, delimiter=',')
+        for start, end, path in self.split_ranges(converted_data.shape[0]):
+            save_shard(path, converted_data[start:end, :])
 
 
     def pipeline(self):
         self.data_files()
         for file in self.files:
-            converted_data = self.data_convert(file)
-            self.data_save(converted_data)
-    
+            stream_convert(self.data_chunks(file), self.data_tracks, self.split_ranges, num_parts=estimate_parts(file))
+
 '''
 NGSIM US-101 Dataset
 '''
 class NGSIMDataset():
-    def __init__(self, dset_path, save_path='dataset'):
+    def __init__(self, dset_path, save_path='dataset', tag='NGSIM', chunk_rows=1<<20):
         self.dset_path = dset_path
         self.save_path = save_path
+        self.tag = tag
         self.base_path = '.'
+        self.chunk_rows = chunk_rows
         self.files = []
 
-    
+
     def data_files(self):
         path = os.path.join(self.dset_path, self.base_path)
         for name in os.listdir(path):
             file = os.path.join(path, name)
             if os.path.isfile(file):
                 self.files.append(file)
-    
 
-    def data_convert(self, file):
-        raw_data = np.loadtxt(file, delimiter=',', usecols=(0, 5, 4, 3), skiprows=1)
-        converted_data = []
 
-        data = raw_data[np.argsort(raw_data[:, 0])]
-        agent_ids = np.unique(data[:, 0])
+    def data_chunks(self, file):
+        return read_chunks(file, delimiter=',', usecols=(0, 5, 4, 3), skiprows=1, chunk_rows=self.chunk_rows)
 
-        for agent_id in agent_ids:
-            data_seg = data[data[:, 0] == agent_id, :]
-            converted_data_seg = np.zeros((data_seg.shape[0], 6))
 
-            data_seg_x = data_seg[:, 2]
-            data_seg_y = data_seg[:, 1]
-            data_seg_vx = data_seg_x[1:]-data_seg_x[:-1]
-            data_seg_vy = data_seg_y[1:]-data_seg_y[:-1]
-            data_seg_vx, data_seg_vy = np.append(data_seg_vx, 0.0), np.append(data_seg_vy, 0.0)
+    def data_tracks(self, raw_data):
+        # (frame, id, x, y) from (id, local y, local x, global time)
+        return np.stack((raw_data[:, 3], raw_data[:, 0], raw_data[:, 2], raw_data[:, 1]), axis=1)
 
-            converted_data_seg[:, 0] = data_seg[:, 3]
-            converted_data_seg[:, 1] = data_seg[:, 0]
-            converted_data_seg[:, 2] = data_seg_x
-            converted_data_seg[:, 3] = data_seg_y
-            converted_data_seg[:, 4] = data_seg_vx
-            converted_data_seg[:, 5] = data_seg_vy
 
-            converted_data.append(converted_data_seg)
-        converted_data = np.concatenate(converted_data, axis=0)
+    def data_convert(self, file):
+        raw_data = np.concatenate(list(self.data_chunks(file)), axis=0)
 
-        converted_data = converted_data[np.argsort(converted_data[:, 0])]
+        return convert_tracks(self.data_tracks(raw_data))
 
-        return converted_data
 
-    
-    def data_save(self, converted_data):
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
-        converted_data = converted_data[converted_data.shape[0]*4//10:converted_data.shape[0]*7//10, :]
-=======
-        converted_data = converted_data[converted_data.shape[0]*0//10:converted_data.shape[0]*2//10, :]
->>>>>>> parent of e29953c... Merge branch 'master' into pr/4
-=======
-        converted_data = converted_data[converted_data.shape[0]*0//10:converted_data.shape[0]*2//10, :]
->>>>>>> parent of e29953c... Merge branch 'master' into pr/4
-=======
-        converted_data = converted_data[converted_data.shape[0]*4//10:converted_data.shape[0]*7//10, :]
->>>>>>> parent of 0532639... revert
-=======
-
-        converted_data = converted_data[converted_data.shape[0]*0//10:converted_data.shape[0]*2//10, :]
-
->>>>>>> parent of 6cef09f... Revert "Merge pull request #5 from tommieeee/pr/4"
+    def split_ranges(self, num_rows):
+        start, end = num_rows*4//10, num_rows*7//10
 
         # bound = int(converted_data.shape[0]*0.2)
         # train_data = converted_data[bound:, :]
         # test_data = converted_data[:bound, :]
-        
-        bound1 = int(converted_data.shape[0]*0.9)
-        bound2 = int(converted_data.shape[0]*1.0)
-        train_data = np.concatenate([converted_data[:bound1, :], converted_data[bound2:, :]], axis=0)
-        test_data = converted_data[bound1:bound2, :]
 
-        train_path = os.path.join(self.save_path, 'NGSIMDataset', 'NGSIM','train')
-        test_path = os.path.join(self.save_path, 'NGSIMDataset', 'NGSIM', 'test')
+        bound = start+int((end-start)*0.9)
+
+        train_path = os.path.join(self.save_path, 'NGSIMDataset', self.tag, 'train')
+        test_path = os.path.join(self.save_path, 'NGSIMDataset', self.tag, 'test')
+
+        return [(start, bound, train_path), (bound, end, test_path)]
+
+
+    def window_ranges(self, num_rows):
+        # a time window cut by seg_ngsim.py is kept whole, split 0.9 / 0.1 like the [40%, 70%) slice above
+        bound = int(num_rows*0.9)
+
+        train_path = os.path.join(self.save_path, 'NGSIMDataset', self.tag, 'train')
+        test_path = os.path.join(self.save_path, 'NGSIMDataset', self.tag, 'test')
 
-        if not os.path.exists(train_path): os.makedirs(train_path)
-        if not os.path.exists(test_path): os.makedirs(test_path)
+        return [(0, bound, train_path), (bound, num_rows, test_path)]
 
-        train_count = len([name for name in os.listdir(train_path) if os.path.isfile(os.path.join(train_path, name))])
-        test_count = len([name for name in os.listdir(test_path) if os.path.isfile(os.path.join(test_path, name))])
 
-        train_name = os.path.join(train_path, 'data'+str(train_count))
-        test_name = os.path.join(test_path, 'data'+str(test_count))
+    def data_save(self, converted_data):
+        for start, end, path in self.split_ranges(converted_data.shape[0]):
+            save_shard(path, converted_data[start:end, :])
 
-        np.savetxt(train_name, train_data, delimiter=',')
-        np.savetxt(test_name, test_data, delimiter=',')
 
-    
     def pipeline(self):
         self.data_files()
         for file in self.files:
-            converted_data = self.data_convert(file)
-            self.data_save(converted_data)
+            stream_convert(self.data_chunks(file), self.data_tracks, self.split_ranges, num_parts=estimate_parts(file))
 
 
 '''
 GTA Dataset
 '''
 class GTADataset():
-    def __init__(self, dset_path, save_path='dataset', tag='GTAS', full_tag='straight', number=6):
+    def __init__(self, dset_path, save_path='dataset', tag='GTAS', full_tag='straight', number=6, chunk_rows=1<<20):
         self.dset_path = dset_path
         self.save_path = save_path
         self.tag = tag
         self.full_tag = full_tag
         self.number = number
+        self.chunk_rows = chunk_rows
         self.files = []
 
-    
+
     def data_files(self):
         for idx in range(self.number):
             dir_path = os.path.join(self.dset_path, self.tag, '['+str(idx)+']'+self.full_tag)
-            for name in os.listdir(dir_path):
+            for name in sorted(os.listdir(dir_path)):
                 file = os.path.join(dir_path, name)
                 if os.path.isfile(file):
                     self.files.append(file)
-    
+
+
+    def data_chunks(self, file):
+        return read_chunks(file, delimiter=',', usecols=(0, 1, 2, 3), chunk_rows=self.chunk_rows)
+
+
+    def data_tracks(self, raw_data):
+        return raw_data[:, :4]
+
 
     def data_convert(self, file):
-        raw_data = np.loadtxt(file, delimiter=',', usecols=(0, 1, 2, 3))
-        converted_data = []
+        raw_data = np.concatenate(list(self.data_chunks(file)), axis=0)
+
+        return convert_tracks(self.data_tracks(raw_data))
 
-        data = raw_data[np.argsort(raw_data[:, 1])]
-        agent_ids = np.unique(data[:, 1])
 
-        for agent_id in agent_ids:
-            data_seg = data[data[:, 1] == agent_id, :]
-            converted_data_seg = np.zeros((data_seg.shape[0], 6))
+    def split_paths(self):
+        train_path = os.path.join(self.save_path, 'GTADataset', self.tag, 'train')
+        test_path = os.path.join(self.save_path, 'GTADataset', self.tag, 'test')
 
-            data_seg_x = data_seg[:, 2]
-            data_seg_y = data_seg[:, 3]
-            data_seg_vx = data_seg_x[1:]-data_seg_x[:-1]
-            data_seg_vy = data_seg_y[1:]-data_seg_y[:-1]
-            data_seg_vx, data_seg_vy = np.append(data_seg_vx, 0.0), np.append(data_seg_vy, 0.0)
+        return train_path, test_path
 
-            converted_data_seg[:, 0] = data_seg[:, 0]
-            converted_data_seg[:, 1] = data_seg[:, 1]
-            converted_data_seg[:, 2] = data_seg_x
-            converted_data_seg[:, 3] = data_seg_y
-            converted_data_seg[:, 4] = data_seg_vx
-            converted_data_seg[:, 5] = data_seg_vy
 
-            converted_data.append(converted_data_seg)
-        converted_data = np.concatenate(converted_data, axis=0)
+    def split_ranges(self, num_rows):
+        bound = int(num_rows*0.7)
+        train_path, test_path = self.split_paths()
 
-        converted_data = converted_data[np.argsort(converted_data[:, 0])]
+        return [(0, bound, train_path), (bound, num_rows, test_path)]
 
-        return converted_data
 
-    
     def data_save(self, converted_data):
-        bound = int(converted_data.shape[0]*0.7)
-        train_data = converted_data[:bound, :]
-        test_data = converted_data[bound:, :]
+        for start, end, path in self.split_ranges(converted_data.shape[0]):
+            save_shard(path, converted_data[start:end, :])
 
-        train_path = os.path.join(self.save_path, 'GTADataset', self.tag, 'train')
-        test_path = os.path.join(self.save_path, 'GTADataset', self.tag, 'test')
 
-        if not os.path.exists(train_path): os.makedirs(train_path)
-        if not os.path.exists(test_path): os.makedirs(test_path)
+    def sources_path(self):
+        # source recording -> content hash, output shard and rows per split
+        return os.path.join(self.save_path, 'GTADataset', self.tag, 'sources.json')
 
-        train_count = len([name for name in os.listdir(train_path) if os.path.isfile(os.path.join(train_path, name))])
-        test_count = len([name for name in os.listdir(test_path) if os.path.isfile(os.path.join(test_path, name))])
 
-        train_name = os.path.join(train_path, 'data'+str(train_count))
-        test_name = os.path.join(test_path, 'data'+str(test_count))
+    def read_sources(self):
+        if not os.path.isfile(self.sources_path()):
+            return {}
 
-        np.savetxt(train_name, train_data, delimiter=',')
-        np.savetxt(test_name, test_data, delimiter=',')
+        with open(self.sources_path(), 'r') as f:
+            return json.load(f)
 
 
-    def pipeline(self):
+    def write_sources(self, sources):
+        tmp_path = self.sources_path()+'.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(sources, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.sources_path())
+
+
+    def convert_source(self, job):
+        # runs in a worker, only writes the shard files, manifests are updated by the parent
+        file, name = job
+        num_rows = stream_convert(self.data_chunks(file), self.data_tracks, self.split_ranges, num_parts=estimate_parts(file), name=name, register=False)
+
+        return [end-start for start, end, _ in self.split_ranges(num_rows)]
+
+
+    def remove_source(self, sources, key):
+        # a recording gone from dset_path takes its shards and manifest entries with it
+        name = sources.pop(key)['shard']
+        for path in self.split_paths():
+            remove_shard(path, name)
+        self.write_sources(sources)
+
+
+    def pipeline(self, num_workers=0):
         self.data_files()
+        os.makedirs(os.path.join(self.save_path, 'GTADataset', self.tag), exist_ok=True)
+        split_paths = self.split_paths()
+        sources = self.read_sources()
+
+        keys = set(os.path.relpath(file, self.dset_path) for file in self.files)
+        removed = [key for key in sources if key not in keys]
+        for key in removed:
+            self.remove_source(sources, key)
+
+        used_names = set(entry['shard'] for entry in sources.values())
+        for path in split_paths:
+            used_names.update(shard['name'] for shard in (read_manifest(path) or {'shards': []})['shards'])
+
+        # only new or changed recordings are converted, a changed recording keeps its shard name
+        jobs, digests = [], []
+        count = 0
         for file in self.files:
-            converted_data = self.data_convert(file)
-            self.data_save(converted_data)
+            key = os.path.relpath(file, self.dset_path)
+            digest = file_digest(file)
+            entry = sources.get(key)
+            if entry is not None and entry['sha1'] == digest:
+                continue
+
+            if entry is not None:
+                name = entry['shard']
+            else:
+                while 'data'+str(count)+'.npy' in used_names: count += 1
+                name = 'data'+str(count)+'.npy'
+                used_names.add(name)
+            jobs.append((file, name))
+            digests.append(digest)
+
+        print('{} recordings, {} to convert, {} removed'.format(len(self.files), len(jobs), len(removed)))
+
+        executor = ProcessPoolExecutor(max_workers=num_workers) if num_workers > 1 and len(jobs) > 1 else None
+        results = executor.map(self.convert_source, jobs) if executor is not None else map(self.convert_source, jobs)
+        try:
+            for (file, name), digest, rows in zip(jobs, digests, results):
+                for path, num_rows in zip(split_paths, rows):
+                    add_shard(path, name, num_rows, NUM_CONVERTED_COLUMNS)
+                sources[os.path.relpath(file, self.dset_path)] = {
+                    'sha1': digest,
+                    'shard': name,
+                    'splits': {os.path.basename(path): num_rows for path, num_rows in zip(split_paths, rows)}
+                }
+                self.write_sources(sources)  # progress survives an interrupted run
+        finally:
+            if executor is not None: executor.shutdown()
 
 # start preprocess
-# pre_dset = GTADataset('/mnt/Dataset/TrajDset/GTA', save_path='dataset', tag='GTAS', full_tag='straight', number=6)
-pre_dset = NGSIMDataset('TrajDset/NGSIM', save_path='dataset')
-# pre_dset = DroneDataset('/home/xuxie/Dataset/traj_dataset/Drone', save_path='dataset')
-pre_dset.pipeline()
+if __name__ == '__main__':
+    # pre_dset = GTADataset('/mnt/Dataset/TrajDset/GTA', save_path='dataset', tag='GTAS', full_tag='straight', number=6)
+    pre_dset = NGSIMDataset('TrajDset/NGSIM', save_path='dataset')
+    # pre_dset = DroneDataset('/home/xuxie/Dataset/traj_dataset/Drone', save_path='dataset')
+    pre_dset.pipeline()
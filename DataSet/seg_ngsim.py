@@ -1,40 +1,99 @@
+'''
+cut the raw NGSIM US-101 export into named time-of-day windows in one streaming pass
+every window is written in the preprocessed format as its own tag, dataset/NGSIMDataset/<name>/{train,test}
+'''
+
 import numpy as np
-import datetime
+
+import argparse
 import os
+import tempfile
+
+from preprocess import NGSIMDataset
+from storage import read_manifest
+from stream import read_blocks, estimate_parts, stream_convert, NUM_TRACK_COLUMNS
+
+
+# the three US-101 periods, local time of the recording (PDT)
+US101_WINDOWS = ['US101_0750=07:50-08:05', 'US101_0805=08:05-08:20', 'US101_0820=08:20-08:35']
+
+
+def parse_window(window):
+	name, time_range = window.split('=')
+	start, end = time_range.split('-')
+	start_h, start_m = start.split(':')
+	end_h, end_m = end.split(':')
+
+	return name, int(start_h)*60+int(start_m), int(end_h)*60+int(end_m)
+
+
+def minute_of_day(time_stamp, utc_offset=-7):
+	# Global_Time is in ms since epoch (UTC), shift to local time before dropping the date
+	local_time = (time_stamp.astype(np.int64)+int(utc_offset*3600000)).astype('datetime64[ms]')
+
+	return (local_time-local_time.astype('datetime64[D]')).astype('timedelta64[m]').astype(np.int64)
+
+
+def within_time_range(minutes, start, end):
+	return (minutes >= start) & (minutes < end)
+
+
+def saved_rows(dset):
+	# rows listed in the train / test manifests of a window
+	manifests = [read_manifest(path) for _, _, path in dset.window_ranges(0)]
+
+	return sum(shard['rows'] for manifest in manifests if manifest is not None for shard in manifest['shards'])
+
+
+def segment(file, windows, save_path='dataset', utc_offset=-7, chunk_rows=1<<20):
+	windows = [parse_window(window) for window in windows]
+	dsets = [NGSIMDataset(os.path.dirname(file), save_path=save_path, tag=name, chunk_rows=chunk_rows) for name, _, _ in windows]
+
+	with tempfile.TemporaryDirectory() as work_dir:
+		paths = [os.path.join(work_dir, name) for name, _, _ in windows]
+		files = [open(path, 'wb') for path in paths]
+		rows_in = [0]*len(windows)
+		try:
+			for chunk in dsets[0].data_chunks(file):
+				tracks = np.ascontiguousarray(dsets[0].data_tracks(chunk))
+				minutes = minute_of_day(tracks[:, 0], utc_offset)
+				for i, (f, (_, start, end)) in enumerate(zip(files, windows)):
+					window_tracks = tracks[within_time_range(minutes, start, end)]
+					window_tracks.tofile(f)
+					rows_in[i] += len(window_tracks)
+		finally:
+			for f in files: f.close()
+
+		for dset, path, num_in, (name, _, _) in zip(dsets, paths, rows_in, windows):
+			# the whole window goes into train / test, not the [40%, 70%) slice of split_ranges
+			rows_before = saved_rows(dset)
+			num_rows = stream_convert(read_blocks(path, NUM_TRACK_COLUMNS, chunk_rows), lambda tracks: tracks, dset.window_ranges, num_parts=estimate_parts(path))
+			num_out = saved_rows(dset)-rows_before
+			assert num_in == num_rows == num_out, '{}: {} rows in, {} converted, {} saved'.format(name, num_in, num_rows, num_out)
+			print('{}: {} rows'.format(name, num_rows))
+
+
+def main():
+	parser = argparse.ArgumentParser()
+
+	parser.add_argument('--file', type=str, default=None)
+	parser.add_argument('--save_path', type=str, default='dataset')
+	parser.add_argument('--windows', type=str, nargs='+', default=US101_WINDOWS)
+	parser.add_argument('--utc_offset', type=float, default=-7)
+	parser.add_argument('--chunk_rows', type=int, default=1<<20)
+
+	args = parser.parse_args()
+
+	file_name = args.file
+	if file_name is None:
+		file_path = os.path.join('TrajDset', 'NGSIM')
+		for name in os.listdir(file_path):
+			file_name = os.path.join(file_path, name)
+			if os.path.isfile(file_name):
+				break
+
+	segment(file_name, args.windows, save_path=args.save_path, utc_offset=args.utc_offset, chunk_rows=args.chunk_rows)
+
 
-def within_time_range(h, m, hmin=7, mmin=50, hmax=8, mmax=35):
-	if h >= hmin and h <= hmax:
-		if h == hmin:
-			if m >= mmin:
-				return True
-			else:
-				return False
-		elif h == hmax:
-			if m < mmax:
-				return True
-			else:
-				return False
-		else:
-			return True
-	return False
-
-
-file_path = os.path.join('TrajDset', 'NGSIM')
-
-for name in os.listdir(file_path):
-	file_name = os.path.join(file_path, name)
-	if os.path.isfile(file_name):
-		break
-
-raw_data = np.loadtxt(file_name, delimiter=',', skiprows=1)
-
-converted_data = []
-for line in raw_data:
-	time_stamp = int(line[3])
-	h = datetime.datetime.fromtimestamp(time_stamp/1000).hour
-	m = datetime.datetime.fromtimestamp(time_stamp/1000).minute
-	if within_time_range(h, m):
-		converted_data.append(line)
-
-converted_name = 'NGSIM_simple.txt'
-np.savetxt(converted_name, converted_data, delimiter=',')
\ No newline at end of file
+if __name__ == '__main__':
+	main()
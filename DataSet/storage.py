@@ -0,0 +1,142 @@
+'''
+binary storage of preprocessed splits
+a split directory (dataset/<Name>/<tag>/train, .../test) holds column-major .npy shards of (frame, id, x, y, vx, vy .etc)
+and a manifest.json listing them in load order; shards are opened with np.load(mmap_mode='r')
+'''
+
+import numpy as np
+
+import hashlib
+import json
+import os
+
+
+MANIFEST_NAME = 'manifest.json'
+COLUMNS = ['frame', 'id', 'x', 'y', 'vx', 'vy']
+
+
+def file_digest(path, chunk_size=1<<20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def file_stamp(path):
+    # cheap change check for cache keys, a rewritten file gets a new mtime
+    stat = os.stat(path)
+
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def read_manifest(split_dir):
+    path = os.path.join(split_dir, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return None
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_manifest(split_dir, manifest):
+    path = os.path.join(split_dir, MANIFEST_NAME)
+    tmp_path = path+'.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)  # readers never see a half written manifest
+
+
+def new_manifest(num_columns):
+    columns = COLUMNS[:num_columns]+['c'+str(i) for i in range(len(COLUMNS), num_columns)]
+
+    return {'format': 'npy', 'columns': columns, 'shards': []}
+
+
+def next_shard_name(manifest):
+    names = [shard['name'] for shard in manifest['shards']]
+    count = len(names)
+    while 'data'+str(count)+'.npy' in names: count += 1
+
+    return 'data'+str(count)+'.npy'
+
+
+def add_shard(split_dir, name, num_rows, num_columns):
+    manifest = read_manifest(split_dir)
+    if manifest is None:
+        manifest = new_manifest(num_columns)
+    names = [shard['name'] for shard in manifest['shards']]
+
+    shard = {'name': name, 'rows': int(num_rows)}
+    if name in names:
+        manifest['shards'][names.index(name)] = shard
+    else:
+        manifest['shards'].append(shard)
+    write_manifest(split_dir, manifest)
+
+
+def open_shard(split_dir, num_rows, num_columns, name=None):
+    # preallocated shard for incremental writers, register it with add_shard once it is filled
+    if not os.path.exists(split_dir): os.makedirs(split_dir)
+
+    if name is None:
+        name = next_shard_name(read_manifest(split_dir) or new_manifest(num_columns))
+    shard = np.lib.format.open_memmap(os.path.join(split_dir, name), mode='w+', dtype=np.float64, shape=(num_rows, num_columns), fortran_order=True)
+
+    return name, shard
+
+
+def save_shard(split_dir, data, name=None, register=True):
+    # register=False leaves the manifest to the caller, e.g. the parent of the workers writing the shards
+    if not os.path.exists(split_dir): os.makedirs(split_dir)
+
+    if name is None:
+        name = next_shard_name(read_manifest(split_dir) or new_manifest(data.shape[1]))
+    np.save(os.path.join(split_dir, name), np.asfortranarray(data, dtype=np.float64))
+    if register:
+        add_shard(split_dir, name, data.shape[0], data.shape[1])
+
+    return name
+
+
+def remove_shard(split_dir, name):
+    manifest = read_manifest(split_dir)
+    if manifest is not None:
+        manifest['shards'] = [shard for shard in manifest['shards'] if shard['name'] != name]
+        write_manifest(split_dir, manifest)
+
+    path = os.path.join(split_dir, name)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def shard_paths(split_dir):
+    manifest = read_manifest(split_dir)
+    if manifest is None:
+        return []
+
+    return [os.path.join(split_dir, shard['name']) for shard in manifest['shards']]
+
+
+def load_shards(split_dir, mmap_mode='r'):
+    return [np.load(path, mmap_mode=mmap_mode) for path in shard_paths(split_dir)]
+
+
+def text_files(split_dir):
+    names = sorted(os.listdir(split_dir))
+    names = [name for name in names if not name.endswith('.npy') and not name.startswith(MANIFEST_NAME)]
+
+    return [name for name in names if os.path.isfile(os.path.join(split_dir, name))]
+
+
+def convert_split(split_dir, delim=',', remove_text=False):
+    converted = []
+    for name in text_files(split_dir):
+        path = os.path.join(split_dir, name)
+        data = np.loadtxt(path, delimiter=delim, ndmin=2)
+        converted.append(save_shard(split_dir, data, name=name+'.npy'))
+        if remove_text:
+            os.remove(path)
+
+    return converted
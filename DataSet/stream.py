@@ -0,0 +1,140 @@
+'''
+streaming conversion of raw exports into preprocessed shards (frame, id, x, y, vx, vy) with bounded memory
+pass 1 scatters raw (frame, id, x, y) rows into agent partitions, pass 2 computes velocities per agent partition
+and scatters the converted rows into frame-range partitions, pass 3 emits the frame partitions in order into the shards
+peak memory is one chunk or one partition, never the whole file
+'''
+
+import numpy as np
+
+import itertools
+import os
+import tempfile
+
+from storage import open_shard, add_shard, save_shard
+
+
+NUM_TRACK_COLUMNS = 4  # frame, id, x, y
+NUM_CONVERTED_COLUMNS = 6  # frame, id, x, y, vx, vy
+
+
+def read_chunks(path, delimiter=',', usecols=None, skiprows=0, chunk_rows=1<<20):
+    with open(path, 'r') as f:
+        for _ in range(skiprows): f.readline()
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if len(lines) == 0: break
+            yield np.loadtxt(lines, delimiter=delimiter, usecols=usecols, ndmin=2)
+
+
+def read_blocks(path, num_columns, chunk_rows=1<<20):
+    # chunks of a raw float64 row file written with ndarray.tofile
+    num_rows = os.path.getsize(path)//(8*num_columns)
+    for start in range(0, num_rows, chunk_rows):
+        count = min(chunk_rows, num_rows-start)
+        yield np.fromfile(path, dtype=np.float64, count=count*num_columns, offset=start*num_columns*8).reshape(-1, num_columns)
+
+
+def estimate_parts(path, part_bytes=256<<20):
+    return max(1, int(np.ceil(os.path.getsize(path)/part_bytes)))
+
+
+def track_velocity(tracks):
+    # rows grouped by agent and ordered by frame, velocity is the forward difference inside each agent segment
+    tracks = tracks[np.lexsort((tracks[:, 0], tracks[:, 1]))]
+    converted = np.zeros((len(tracks), NUM_CONVERTED_COLUMNS))
+    converted[:, :NUM_TRACK_COLUMNS] = tracks
+    if len(tracks) > 1:
+        same_agent = tracks[1:, 1] == tracks[:-1, 1]  # false at segment boundaries, the last row of an agent keeps zero velocity
+        converted[:-1, 4:6] = np.where(same_agent[:, None], np.diff(tracks[:, 2:4], axis=0), 0.0)
+
+    return converted
+
+
+def frame_sort(converted):
+    return converted[np.lexsort((converted[:, 1], converted[:, 0]))]
+
+
+def convert_tracks(tracks):
+    return frame_sort(track_velocity(tracks))
+
+
+def scatter(part_files, rows, part):
+    order = np.argsort(part, kind='stable')
+    counts = np.bincount(part, minlength=len(part_files))
+    for f, block in zip(part_files, np.split(rows[order], np.cumsum(counts)[:-1])):
+        if len(block) > 0: block.tofile(f)
+
+
+def gather(path, num_columns):
+    return np.fromfile(path, dtype=np.float64).reshape(-1, num_columns)
+
+
+def agent_parts(tracks, num_parts):
+    return (np.floor(tracks[:, 1]).astype(np.int64) % num_parts).astype(np.intp)
+
+
+def frame_parts(frames, edges):
+    return np.searchsorted(edges[1:-1], frames, side='right').astype(np.intp)
+
+
+def stream_convert(chunks, to_tracks, split_ranges, num_parts=1, tmp_dir=None, name=None, register=True):
+    # chunks: iterable of raw row blocks, to_tracks: raw block -> (n, 4) frame, id, x, y
+    # split_ranges: num_rows -> [(start, end, split_dir)] over the frame ordered converted rows
+    # name: shard name in every split dir (next free one by default), register=False leaves the manifests to the caller
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as work_dir:
+        agent_paths = [os.path.join(work_dir, 'agent'+str(i)) for i in range(num_parts)]
+        frame_paths = [os.path.join(work_dir, 'frame'+str(i)) for i in range(num_parts)]
+
+        # pass 1: raw chunks -> agent partitions
+        num_rows = 0
+        frame_min, frame_max = np.inf, -np.inf
+        part_files = [open(path, 'wb') for path in agent_paths]
+        try:
+            for chunk in chunks:
+                tracks = np.ascontiguousarray(to_tracks(chunk), dtype=np.float64)
+                if len(tracks) == 0: continue
+                num_rows += len(tracks)
+                frame_min, frame_max = min(frame_min, tracks[:, 0].min()), max(frame_max, tracks[:, 0].max())
+                scatter(part_files, tracks, agent_parts(tracks, num_parts))
+        finally:
+            for f in part_files: f.close()
+
+        # pass 2: agent partitions -> velocities -> frame partitions
+        edges = np.linspace(frame_min, frame_max, num_parts+1) if num_rows > 0 else np.zeros(num_parts+1)
+        part_files = [open(path, 'wb') for path in frame_paths]
+        try:
+            for path in agent_paths:
+                converted = track_velocity(gather(path, NUM_TRACK_COLUMNS))
+                os.remove(path)
+                if len(converted) > 0:
+                    scatter(part_files, converted, frame_parts(converted[:, 0], edges))
+        finally:
+            for f in part_files: f.close()
+
+        # pass 3: frame partitions in order -> shards
+        ranges = [(start, end, split_dir) for start, end, split_dir in split_ranges(num_rows)]
+        shards = []
+        for start, end, split_dir in ranges:
+            if end > start:
+                shard_name, shard = open_shard(split_dir, end-start, NUM_CONVERTED_COLUMNS, name=name)
+            else:
+                shard_name, shard = save_shard(split_dir, np.zeros((0, NUM_CONVERTED_COLUMNS)), name=name, register=register), None
+            shards.append((shard_name, shard))
+
+        offset = 0
+        for path in frame_paths:
+            converted = frame_sort(gather(path, NUM_CONVERTED_COLUMNS))
+            for (start, end, _), (_, shard) in zip(ranges, shards):
+                lo, hi = max(start, offset), min(end, offset+len(converted))
+                if hi > lo:
+                    shard[lo-start:hi-start] = converted[lo-offset:hi-offset]
+            offset += len(converted)
+
+        for (start, end, split_dir), (shard_name, shard) in zip(ranges, shards):
+            if shard is None: continue
+            shard.flush()
+            if register:
+                add_shard(split_dir, shard_name, end-start, NUM_CONVERTED_COLUMNS)
+
+    return num_rows
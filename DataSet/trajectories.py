@@ -1,16 +1,52 @@
 import torch
 from torch.utils.data import Dataset
+from torch.nn.utils.rnn import pad_sequence
 
 import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from storage import read_manifest, shard_paths
+from graphs import NUM_KERNELS, window_graphs, graph_offsets, build_graphs
 
 
 def seq_collate(data):
+    if len(data[0]) == 5:
+        # datasets built with graphs=True also hand out the As_seq of every window
+        (obs_seq_list, pred_seq_list, ids_list, num_nodes_list, As_seq_list) = zip(*data)
+
+        return (obs_seq_list, pred_seq_list, ids_list, num_nodes_list, As_seq_list)
+
     (obs_seq_list, pred_seq_list, ids_list, num_nodes_list) = zip(*data)
 
     return (obs_seq_list, pred_seq_list, ids_list, num_nodes_list)
 
 
+def seq_collate_padded(data):
+    # dense batch padded to the largest scene: obs (N, obs_len, V_max, F), pred (N, pred_len, V_max, F),
+    # ids (N, V_max) with -1 for padding, node_mask (N, V_max) and num_nodes (N,)
+    # plus As_seq (N, T-1, K, V_max, V_max), zero outside each scene, when the dataset carries graphs
+    (obs_seq_list, pred_seq_list, ids_list, num_nodes_list) = list(zip(*data))[:4]
+
+    obs_traj = pad_sequence([obs.permute(1, 0, 2) for obs in obs_seq_list], batch_first=True).permute(0, 2, 1, 3)
+    pred_traj = pad_sequence([pred.permute(1, 0, 2) for pred in pred_seq_list], batch_first=True).permute(0, 2, 1, 3)
+    ids = pad_sequence(list(ids_list), batch_first=True, padding_value=-1.0)
+
+    num_nodes = torch.tensor(num_nodes_list, dtype=torch.long)
+    node_mask = torch.arange(ids.size(1)).unsqueeze(0) < num_nodes.unsqueeze(1)
+
+    if len(data[0]) == 5:
+        As_seq_list = [item[4] for item in data]
+        As_seq = torch.zeros((len(data),)+As_seq_list[0].shape[:2]+(ids.size(1), ids.size(1)))
+        for i, A in enumerate(As_seq_list):
+            As_seq[i, :, :, :A.size(-1), :A.size(-1)] = A
+
+        return (obs_traj.contiguous(), pred_traj.contiguous(), ids, node_mask, num_nodes, As_seq)
+
+    return (obs_traj.contiguous(), pred_traj.contiguous(), ids, node_mask, num_nodes)
+
+
 def read_file(path, delim=','):
     data  = []
     with open(path, 'r') as f:
@@ -22,8 +58,205 @@ def read_file(path, delim=','):
     return np.asarray(data)
 
 
+def split_files(data_dir):
+    if read_manifest(data_dir) is not None:
+        return shard_paths(data_dir)  # binary shards, fall back to text files otherwise
+
+    all_files = sorted(os.listdir(data_dir))  # same window order, and so the same cache key, on every file system
+
+    return [os.path.join(data_dir, path) for path in all_files]
+
+
+def load_file(path, delim=','):
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+
+    return read_file(path, delim)
+
+
+def read_split(data_dir, delim=','):
+    return (load_file(path, delim) for path in split_files(data_dir))
+
+
+def map_files(func, paths, num_workers=0):
+    # results come back in file order whatever the worker count, so the dataset is deterministic
+    if num_workers <= 1 or len(paths) <= 1:
+        return [func(path) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=min(num_workers, len(paths))) as executor:
+        return list(executor.map(func, paths))
+
+
+def extract_windows_loop(data, seq_len, frame_skip=1, num_feature=4, min_agent=1):
+    num_nodes_seq_list = []
+    ids_seq_list = []
+    seq_list = []
+
+    frames = np.unique(data[:, 0]).tolist()  # number of frames
+    frame_data = []
+    for frame in frames:  # iterate through each frame number
+        frame_data.append(data[frame == data[:, 0], :])  # list of data each particular frame
+    num_seq = len(frames)-seq_len+1  # total number of frames-(obs+pred)+1 for separating all frames to saparate trials
+
+    for idx in range(num_seq+1):
+        frame_data_seg = frame_data[idx:idx+(seq_len-1)*frame_skip+1:frame_skip]  # list of data in desired seq of frames of len obs+pred
+        if len(frame_data_seg) < seq_len: break
+        curr_seq_data = np.concatenate(frame_data_seg, axis=0)  # numpy array of data in desired frame seq
+
+        agents_in_curr_seq = np.unique(curr_seq_data[:, 1])  # agents in the frame seq
+        curr_seq = np.zeros((len(agents_in_curr_seq), num_feature, seq_len))  # 3-dim np array dim1: saparate agents dim2,3: frame x features
+        curr_ids = np.zeros((len(agents_in_curr_seq)))
+        agent_flag = True
+
+        # collect sequence in dense fashion, no frame skip
+        # num_nodes = 0
+        # for agent_id in agents_in_curr_seq:
+        #     curr_agent_seq = curr_seq_data[agent_id == curr_seq_data[:, 1], :]
+        #     curr_agent_seq = np.around(curr_agent_seq, decimals=4)
+        #     agent_front = frames.index(curr_agent_seq[0, 0])-idx
+        #     agent_end = frames.index(curr_agent_seq[-1, 0])-idx+1
+        #     if agent_end-agent_front != seq_len or len(curr_agent_seq) != seq_len:
+        #         continue
+        #     curr_agent_seq = np.transpose(curr_agent_seq[:, 2:2+num_feature])
+        #     _idx = num_nodes
+        #     curr_seq[_idx, :, agent_front:agent_end] = curr_agent_seq
+        #     curr_ids[_idx] = agent_id
+        #     num_nodes += 1
+
+        # collect sequence in dense fashion
+        num_nodes = 0
+        for agent_id in agents_in_curr_seq:
+            curr_agent_seq = curr_seq_data[agent_id == curr_seq_data[:, 1], :]
+            curr_agent_seq = np.around(curr_agent_seq, decimals=4)
+            if len(curr_agent_seq) != seq_len:
+                continue
+            curr_agent_seq = np.transpose(curr_agent_seq[:, 2:2+num_feature])
+            _idx = num_nodes
+            curr_seq[_idx, :, :] = curr_agent_seq
+            curr_ids[_idx] = agent_id
+            num_nodes += 1
+
+        # collect sequence in sparse fashion
+        #num_nodes = 0
+        #for agent_id in agents_in_curr_seq:
+        #   curr_agent_seq = curr_seq_data[agent_id == curr_seq_data[:, 1], :]
+        #   curr_agent_seq = np.around(curr_agent_seq, decimals=4)
+        #   if len(curr_agent_seq) != seq_len:
+        #       agent_flag = False
+        #       break
+        #   curr_agent_seq = np.transpose(curr_agent_seq[:, 2:2+num_feature])
+        #   _idx = num_nodes
+        #   curr_seq[_idx, :, :] = curr_agent_seq
+        #   curr_ids[_idx] = agent_id
+        #   num_nodes += 1
+
+        # count_veh = len(np.argwhere(curr_ids[:num_nodes] < 100))
+        # count_ped = len(np.argwhere(curr_ids[:num_nodes] >= 100))
+
+        # if num_nodes > min_agent and count_veh > 0 and count_ped > 0:
+        # if num_nodes > min_agent and num_nodes < max_agent and agent_flag:
+        if num_nodes > min_agent and agent_flag:
+            num_nodes_seq_list.append(num_nodes)  # number of agents in the frame seq
+            ids_seq_list.append(curr_ids[:num_nodes])  # numpy of ids in the frame seq
+            seq_list.append(curr_seq[:num_nodes])  # data in the frame seq
+
+    if len(seq_list) == 0:
+        return np.zeros((0, num_feature, seq_len)), ids_seq_list, num_nodes_seq_list
+
+    return np.concatenate(seq_list, axis=0), ids_seq_list, num_nodes_seq_list
+
+
+def window_index(data, seq_len, frame_skip=1, min_agent=1):
+    frames, frame_idx = np.unique(data[:, 0], return_inverse=True)
+    frame_idx = frame_idx.reshape(-1)
+    span = (seq_len-1)*frame_skip  # frame index distance between first and last step of a window
+
+    # sort rows by agent, then frame residue under frame skip, then frame, so every agent track
+    # sampled at stride frame_skip is one contiguous run of rows
+    order = np.lexsort((frame_idx, frame_idx % frame_skip, data[:, 1]))
+    agents = data[order, 1]
+    track_frames = frame_idx[order]
+
+    # windows are counted by rows, so repeated (frame, agent) rows need the reference path
+    if np.any((agents[1:] == agents[:-1]) & (track_frames[1:] == track_frames[:-1])):
+        return None
+
+    num_rows = len(order)
+    if num_rows < seq_len or len(frames)-span < 1:
+        return order, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # row i heads a full window iff row i+seq_len-1 belongs to the same agent exactly span frames later
+    heads = np.arange(num_rows-seq_len+1)
+    tails = heads+seq_len-1
+    valid = (agents[tails] == agents[heads]) & (track_frames[tails]-track_frames[heads] == span)
+    heads = heads[valid]
+
+    # order windows by start frame, agents ascending within a window
+    window_order = np.lexsort((agents[heads], track_frames[heads]))
+    heads = heads[window_order]
+    _, num_nodes = np.unique(track_frames[heads], return_counts=True)
+
+    keep = num_nodes > min_agent
+    heads = heads[np.repeat(keep, num_nodes)]
+    num_nodes = num_nodes[keep]
+
+    return order, heads, num_nodes
+
+
+def dense_index(seq, ids_seq_list):
+    # lay out already extracted tracks as raw rows so they can be served through the same index
+    num_tracks, num_feature, seq_len = seq.shape
+    data = np.zeros((num_tracks*seq_len, 2+num_feature))
+    if num_tracks > 0:
+        data[:, 1] = np.repeat(np.concatenate(ids_seq_list), seq_len)
+        data[:, 2:] = seq.transpose(0, 2, 1).reshape(-1, num_feature)
+
+    return data, np.arange(len(data)), np.arange(num_tracks)*seq_len
+
+
+def gather_tracks(data, order, heads, seq_len, num_feature=4):
+    rows = order[heads[:, None]+np.arange(seq_len)]  # (num_tracks, seq_len) row indices
+    seq = np.around(data[rows, 2:2+num_feature], decimals=4)
+
+    return seq, data[rows[:, 0], 1]
+
+
+def extract_windows(data, seq_len, frame_skip=1, num_feature=4, min_agent=1):
+    index = window_index(data, seq_len, frame_skip, min_agent)
+    if index is None:
+        return extract_windows_loop(data, seq_len, frame_skip, num_feature, min_agent)
+    order, heads, num_nodes = index
+
+    seq, ids = gather_tracks(data, order, heads, seq_len, num_feature)
+    seq = np.ascontiguousarray(seq.transpose(0, 2, 1))
+
+    num_nodes_seq_list = num_nodes.tolist()
+    ids_seq_list = np.split(ids, np.cumsum(num_nodes)[:-1]) if len(num_nodes) > 0 else []
+
+    return seq, ids_seq_list, num_nodes_seq_list
+
+
+def file_windows(path, seq_len, frame_skip=1, num_feature=4, min_agent=1, delim=','):
+    return extract_windows(load_file(path, delim), seq_len, frame_skip, num_feature, min_agent)
+
+
+def file_index(path, seq_len, frame_skip=1, num_feature=4, min_agent=1, delim=','):
+    data = load_file(path, delim)
+    index = window_index(data, seq_len, frame_skip, min_agent)
+    if index is None:
+        seq, ids, num_nodes = extract_windows_loop(data, seq_len, frame_skip, num_feature, min_agent)
+        data, order, heads = dense_index(seq, ids)
+        return data, order, heads, np.asarray(num_nodes, dtype=np.int64)
+
+    order, heads, num_nodes = index
+    if isinstance(data, np.memmap):
+        data = None  # shards are reopened by the caller instead of being shipped between processes
+
+    return data, order, heads, num_nodes
+
+
 class TrajectoryDataset(Dataset):
-    def __init__(self, data_dir, obs_len=8, pred_len=12, frame_skip=1, num_feature=4, min_agent=1, max_agent=50, delim=','):
+    def __init__(self, data_dir, obs_len=8, pred_len=12, frame_skip=1, num_feature=4, min_agent=1, max_agent=50, delim=',', lazy=False, num_workers=0, windows=None, graphs=False, graph_data=None):
         super(TrajectoryDataset, self).__init__()
 
         self.data_dir = data_dir
@@ -35,85 +268,41 @@ class TrajectoryDataset(Dataset):
         self.min_agent = min_agent
         self.max_agent = max_agent
         self.delim = delim
+        self.lazy = lazy
+        self.num_workers = num_workers
+        self.graphs = graphs
+
+        if self.lazy:
+            self.build_index()
+        elif windows is not None:
+            self.set_windows(*windows)  # (seq, ids_seq_list, num_nodes_seq_list) computed earlier, e.g. from a window cache
+        else:
+            self.build_windows()
+
+        # normalized As_seq per window, built once here instead of every epoch in the training loop
+        # lazy datasets have no window tensors and build them per item
+        if self.graphs and not self.lazy:
+            self.set_graphs(graph_data if graph_data is not None else build_graphs(torch.cat((self.obs_traj, self.pred_traj), dim=2), self.num_nodes_seq_list))
+
 
-        all_files = os.listdir(self.data_dir)
-        all_files = [os.path.join(self.data_dir, path) for path in all_files]
+    def build_windows(self):
         num_nodes_seq_list = []
         ids_seq_list = []
         seq_list = []
 
-        for path in all_files:  # iterate through all files
-            data = read_file(path)  # import data
-            frames = np.unique(data[:, 0]).tolist()  # number of frames
-            frame_data = []
-            for frame in frames:  # iterate through each frame number
-                frame_data.append(data[frame == data[:, 0], :])  # list of data each particular frame
-            num_seq = len(frames)-self.seq_len+1  # total number of frames-(obs+pred)+1 for separating all frames to saparate trials
-
-            for idx in range(num_seq+1):
-                frame_data_seg = frame_data[idx:idx+(self.seq_len-1)*self.frame_skip+1:self.frame_skip]  # list of data in desired seq of frames of len obs+pred
-                if len(frame_data_seg) < self.seq_len: break
-                curr_seq_data = np.concatenate(frame_data_seg, axis=0)  # numpy array of data in desired frame seq
-
-                agents_in_curr_seq = np.unique(curr_seq_data[:, 1])  # agents in the frame seq
-                curr_seq = np.zeros((len(agents_in_curr_seq), self.num_feature, self.seq_len))  # 3-dim np array dim1: saparate agents dim2,3: frame x features
-                curr_ids = np.zeros((len(agents_in_curr_seq)))
-                agent_flag = True
-
-                # collect sequence in dense fashion, no frame skip
-                # num_nodes = 0
-                # for agent_id in agents_in_curr_seq:
-                #     curr_agent_seq = curr_seq_data[agent_id == curr_seq_data[:, 1], :]
-                #     curr_agent_seq = np.around(curr_agent_seq, decimals=4)
-                #     agent_front = frames.index(curr_agent_seq[0, 0])-idx
-                #     agent_end = frames.index(curr_agent_seq[-1, 0])-idx+1
-                #     if agent_end-agent_front != self.seq_len or len(curr_agent_seq) != self.seq_len:
-                #         continue
-                #     curr_agent_seq = np.transpose(curr_agent_seq[:, 2:2+self.num_feature])
-                #     _idx = num_nodes
-                #     curr_seq[_idx, :, agent_front:agent_end] = curr_agent_seq
-                #     curr_ids[_idx] = agent_id
-                #     num_nodes += 1
-
-                # collect sequence in dense fashion
-                num_nodes = 0
-                for agent_id in agents_in_curr_seq:
-                    curr_agent_seq = curr_seq_data[agent_id == curr_seq_data[:, 1], :]
-                    curr_agent_seq = np.around(curr_agent_seq, decimals=4)
-                    if len(curr_agent_seq) != self.seq_len:
-                        continue
-                    curr_agent_seq = np.transpose(curr_agent_seq[:, 2:2+self.num_feature])
-                    _idx = num_nodes
-                    curr_seq[_idx, :, :] = curr_agent_seq
-                    curr_ids[_idx] = agent_id
-                    num_nodes += 1
-
-                # collect sequence in sparse fashion
-                #num_nodes = 0
-                #for agent_id in agents_in_curr_seq:
-                #   curr_agent_seq = curr_seq_data[agent_id == curr_seq_data[:, 1], :]
-                #   curr_agent_seq = np.around(curr_agent_seq, decimals=4)
-                #   if len(curr_agent_seq) != self.seq_len:
-                #       agent_flag = False
-                #       break
-                #   curr_agent_seq = np.transpose(curr_agent_seq[:, 2:2+self.num_feature])
-                #   _idx = num_nodes
-                #   curr_seq[_idx, :, :] = curr_agent_seq
-                #   curr_ids[_idx] = agent_id
-                #   num_nodes += 1
-
-                # count_veh = len(np.argwhere(curr_ids[:num_nodes] < 100))
-                # count_ped = len(np.argwhere(curr_ids[:num_nodes] >= 100))
-
-                # if num_nodes > self.min_agent and count_veh > 0 and count_ped > 0:
-                # if num_nodes > self.min_agent and num_nodes < self.max_agent and agent_flag:
-                if num_nodes > self.min_agent and agent_flag:
-                    num_nodes_seq_list.append(num_nodes)  # number of agents in the frame seq
-                    ids_seq_list.append(curr_ids[:num_nodes])  # numpy of ids in the frame seq
-                    seq_list.append(curr_seq[:num_nodes])  # data in the frame seq
-
-        self.num_seq = len(seq_list)
-        seq_list = np.concatenate(seq_list, axis=0)
+        all_files = split_files(self.data_dir)
+        func = partial(file_windows, seq_len=self.seq_len, frame_skip=self.frame_skip, num_feature=self.num_feature, min_agent=self.min_agent, delim=self.delim)
+
+        for seq, ids, num_nodes in map_files(func, all_files, self.num_workers):  # iterate through all files
+            num_nodes_seq_list.extend(num_nodes)
+            ids_seq_list.extend(ids)
+            seq_list.append(seq)
+
+        self.set_windows(np.concatenate(seq_list, axis=0), ids_seq_list, num_nodes_seq_list)
+
+
+    def set_windows(self, seq_list, ids_seq_list, num_nodes_seq_list):
+        self.num_seq = len(num_nodes_seq_list)
 
         self.num_nodes_seq_list = num_nodes_seq_list
         self.ids_seq_list = ids_seq_list
@@ -123,11 +312,62 @@ class TrajectoryDataset(Dataset):
         self.seq_start_end = [(start, end) for start, end in zip(cum_start_idx[:-1], cum_start_idx[1:])]
 
 
+    def set_graphs(self, graph_data):
+        # graph_data may be a read-only memmap, e.g. from a window cache
+        self.graph_data = graph_data
+        self.graph_offsets = graph_offsets(self.num_nodes_seq_list, self.seq_len)
+
+
+    def get_graph(self, index):
+        num_nodes = self.num_nodes_seq_list[index]
+        block = np.array(self.graph_data[self.graph_offsets[index]:self.graph_offsets[index+1]])
+
+        return torch.from_numpy(block).view(self.seq_len-1, NUM_KERNELS, num_nodes, num_nodes)
+
+
+    def get_windows(self):
+        seq_list = torch.cat((self.obs_traj, self.pred_traj), dim=2).numpy()
+
+        return seq_list, self.ids_seq_list, self.num_nodes_seq_list
+
+
+    def build_index(self):
+        # keep raw rows (memory-mapped for binary splits) plus one head row per track, windows are sliced on demand
+        self.file_data = []
+        self.file_order = []
+        track_heads = []
+        window_file = []
+        num_nodes_seq_list = []
+
+        all_files = split_files(self.data_dir)
+        func = partial(file_index, seq_len=self.seq_len, frame_skip=self.frame_skip, num_feature=self.num_feature, min_agent=self.min_agent, delim=self.delim)
+
+        for file_id, (data, order, heads, num_nodes) in enumerate(map_files(func, all_files, self.num_workers)):
+            if data is None:
+                data = load_file(all_files[file_id], self.delim)
+
+            self.file_data.append(data)
+            self.file_order.append(order)
+            track_heads.append(heads)
+            window_file.append(np.full(len(num_nodes), file_id, dtype=np.int64))
+            num_nodes_seq_list.extend(num_nodes.tolist())
+
+        self.num_seq = len(num_nodes_seq_list)
+        self.num_nodes_seq_list = num_nodes_seq_list
+        self.track_heads = np.concatenate(track_heads) if track_heads else np.zeros(0, dtype=np.int64)
+        self.window_file = np.concatenate(window_file) if window_file else np.zeros(0, dtype=np.int64)
+        cum_start_idx = [0]+np.cumsum(num_nodes_seq_list).tolist()
+        self.seq_start_end = [(start, end) for start, end in zip(cum_start_idx[:-1], cum_start_idx[1:])]
+
+
     def __len__(self):
         return self.num_seq
     
 
     def __getitem__(self, index):
+        if self.lazy:
+            return self.get_lazy_item(index)
+
         start, end = self.seq_start_end[index]
         obs_traj = self.obs_traj[start:end, :]
         pred_traj = self.pred_traj[start:end, :]
@@ -142,5 +382,28 @@ class TrajectoryDataset(Dataset):
         out = [
             obs_traj, pred_traj, ids, num_nodes
         ]
+        if self.graphs:
+            out.append(self.get_graph(index))
+
+        return out
+
+
+    def get_lazy_item(self, index):
+        start, end = self.seq_start_end[index]
+        file_id = self.window_file[index]
+        seq, ids = gather_tracks(self.file_data[file_id], self.file_order[file_id], self.track_heads[start:end], self.seq_len, self.num_feature)
+
+        traj = torch.from_numpy(seq).type(torch.float).permute(1, 0, 2)
+        obs_traj = traj[:self.obs_len]
+        pred_traj = traj[self.obs_len:]
+        ids = torch.from_numpy(ids).type(torch.float)
+
+        num_nodes = self.num_nodes_seq_list[index]
+
+        out = [
+            obs_traj, pred_traj, ids, num_nodes
+        ]
+        if self.graphs:
+            out.append(window_graphs(traj))
 
         return out
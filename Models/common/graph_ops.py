@@ -0,0 +1,29 @@
+'''
+batched graph weights shared by the graph.py of the model dirs and DataSet/graphs.py
+ttc_weights gives the time-to-closest-approach weights of all node pairs at once, normalize_adjacency D^-1/2 A D^-1/2
+'''
+
+import torch
+
+
+def ttc_weights(templates, ceil_time=False):
+    # templates size: (..., V, 4) -> (..., V, V), all node pairs at once
+    # weight is 1/tmin for pairs still closing in, tmin = -(dp.dv)/ceil(|dv|^2) is the time to the closest approach
+    # ceil_time: tmin = ceil(-(dp.dv)/|dv|^2) with the reciprocal in double, as the s_gae graphs always did
+    pos, vel = templates[..., :2], templates[..., 2:4]
+    dp = pos.unsqueeze(-2)-pos.unsqueeze(-3)  # (..., V, V, 2), node i minus node j
+    dv = vel.unsqueeze(-2)-vel.unsqueeze(-3)
+    if ceil_time:
+        tmin = (-(dp*dv).sum(-1)/(dv**2).sum(-1)).ceil().double()
+    else:
+        tmin = -(dp*dv).sum(-1)/(dv**2).sum(-1).ceil()
+
+    # diagonal and equal velocities give nan or inf, both end up as 0 like diverging pairs
+    return torch.where(tmin > 0.0, 1.0/tmin, torch.zeros_like(tmin))
+
+
+def normalize_adjacency(A, alpha=1e-3):
+    # A size: (..., V, V) -> D^-1/2 A D^-1/2, D is the column sum of A plus alpha
+    Dn = (torch.sum(A, -2)+alpha)**(-0.5)
+
+    return Dn.unsqueeze(-1)*A*Dn.unsqueeze(-2)
@@ -0,0 +1,70 @@
+'''
+frozen eval-mode copies of the ST-GCN models (STGCN3DModule, STGCN3DGEPModel, STGCN2DModel, the social STGCN2DModels)
+only exact folds are made: a BatchNorm goes into the conv / linear layer right before it in a Sequential,
+the gep base input data_bn into the input side of the first graph conv, Dropout is dropped
+the BatchNorm right after a graph conv stays: the einsum with A sits between it and the conv,
+so a conv bias would be scaled by the column sums of A, and the ReLU after it keeps it out of the next conv
+that BatchNorm is kept on purpose: the no_bn column of bench_inference.py drops it, and is only 1.02-1.07x faster than
+the frozen model, so the eval-mode time is in the graph and temporal convs, not the normalizations
+'''
+
+import torch
+import torch.nn as nn
+
+import copy
+
+
+def bn_affine(bn):
+    # eval-mode bn(x) = x*scale+shift per channel
+    scale = (bn.running_var+bn.eps).rsqrt()
+    shift = -bn.running_mean*scale
+    if bn.affine:
+        scale, shift = scale*bn.weight, shift*bn.weight+bn.bias
+
+    return scale, shift
+
+
+def fold_output(layer, scale, shift):
+    # layer(x)*scale+shift as one conv / linear layer
+    size = (-1,)+(1,)*(layer.weight.dim()-1)
+    bias = layer.bias*scale if layer.bias is not None else torch.zeros_like(scale)
+
+    layer.weight = nn.Parameter(layer.weight*scale.view(size))
+    layer.bias = nn.Parameter(bias+shift)
+
+
+def fold_input(layer, scale, shift):
+    # layer(x*scale+shift) as one conv / linear layer, the layer must not pad its input
+    size = (1, -1)+(1,)*(layer.weight.dim()-2)
+    bias = layer.bias if layer.bias is not None else torch.zeros(layer.weight.size(0)).to(layer.weight)
+
+    layer.bias = nn.Parameter(bias+(layer.weight*shift.view(size)).flatten(1).sum(1))
+    layer.weight = nn.Parameter(layer.weight*scale.view(size))
+
+
+def inference_optimize(model):
+    model = copy.deepcopy(model).eval()
+
+    with torch.no_grad():
+        for module in model.modules():
+            if isinstance(getattr(module, 'data_bn', None), nn.modules.batchnorm._BatchNorm) and hasattr(module, 'st_gcn3d_modules'):
+                # input normalization of STGCN3DModule, pair inputs carry the node channels twice
+                conv = module.st_gcn3d_modules[0].gcn.conv
+                scale, shift = bn_affine(module.data_bn)
+                repeat = conv.in_channels//scale.size(0)
+                fold_input(conv, scale.repeat(repeat), shift.repeat(repeat))
+                module.data_bn = nn.Identity()
+
+            if not isinstance(module, nn.Sequential):
+                continue
+            for i in range(len(module)):
+                if isinstance(module[i], nn.Dropout):
+                    module[i] = nn.Identity()
+                elif i > 0 and isinstance(module[i], nn.modules.batchnorm._BatchNorm) and isinstance(module[i-1], (nn.Linear, nn.modules.conv._ConvNd)):
+                    fold_output(module[i-1], *bn_affine(module[i]))
+                    module[i] = nn.Identity()
+
+    for param in model.parameters():
+        param.requires_grad = False
+
+    return model
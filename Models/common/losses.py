@@ -0,0 +1,65 @@
+'''
+losses on padded batches from seq_collate_padded (DataSet/trajectories.py), shared by the GCN models
+node_mask (N, V_max) marks the real nodes of every scene, padded nodes add nothing to the losses nor to their gradients
+the model must keep them out of its own batch statistics as well, e.g. STGCN2DModel(x, A, node_mask) in st_gcn2d
+each loss is the sum over scenes of the per-scene nll_loss / mse_loss / displacement_error in the model utils
+'''
+
+import torch
+
+
+def masked_nll_loss(pred_out, pred_data, node_mask):
+    # pred_out (N, pred_len, V_max, 5), pred_data (N, pred_len, V_max, F)
+    pred_len = pred_data.size(1)
+    mask = node_mask.unsqueeze(1).unsqueeze(-1)
+    safe_out = torch.tensor([0.0, 0.0, 1.0, 1.0, 0.0]).to(pred_out)  # keeps log() finite on padded nodes
+    pred_out = torch.where(mask, pred_out, safe_out)
+
+    muX = pred_out[:, :, :, 0]
+    muY = pred_out[:, :, :, 1]
+    sigX = pred_out[:, :, :, 2]
+    sigY = pred_out[:, :, :, 3]
+    rho = pred_out[:, :, :, 4]
+    ohr = torch.pow(1-torch.pow(rho, 2), -0.5)
+
+    x = pred_data[:, :, :, 0]
+    y = pred_data[:, :, :, 1]
+    out = torch.pow(ohr, 2)*(torch.pow(sigX, 2)*torch.pow(x-muX, 2) + torch.pow(sigY, 2)*torch.pow(y-muY, 2) - \
+          2*rho*torch.pow(sigX, 1)*torch.pow(sigY, 1)*(x-muX)*(y-muY)) - torch.log(sigX*sigY*ohr)
+    out = out*node_mask.unsqueeze(1).to(out)
+
+    num_nodes = node_mask.sum(dim=1).to(out)
+    loss = torch.sum(out, dim=(1, 2))/(pred_len*num_nodes)
+    return torch.sum(loss)
+
+
+def masked_mse_loss(pred_out, pred_data, node_mask):
+    pred_len = pred_data.size(1)
+    muX = pred_out[:, :, :, 0]
+    muY = pred_out[:, :, :, 1]
+
+    x = pred_data[:, :, :, 0]
+    y = pred_data[:, :, :, 1]
+    out = torch.pow(x-muX, 2)+torch.pow(y-muY, 2)
+    out = out*node_mask.unsqueeze(1).to(out)
+
+    num_nodes = node_mask.sum(dim=1).to(out)
+    loss = torch.sum(out, dim=(1, 2))/(pred_len*num_nodes)
+    return torch.sum(loss)
+
+
+def masked_displacement_error(pred_traj, pred_traj_gt, node_mask, mode='avg'):
+    # pred_traj, pred_traj_gt: (N, pred_len, V_max, 2), 'avg' and 'sum' are summed over scenes like the per-scene loop
+    loss = pred_traj_gt-pred_traj
+    loss = loss**2
+    # padded nodes have a zero distance, sqrt(0) has no gradient: they take sqrt(1) and are zeroed after
+    mask = node_mask.unsqueeze(1)
+    loss = torch.where(mask, loss.sum(dim=3), torch.ones_like(loss[..., 0])).sqrt().mean(dim=1)
+    loss = loss*node_mask.to(loss)
+
+    if mode == 'sum':
+        return torch.sum(loss)
+    elif mode == 'avg':
+        return torch.sum(loss.sum(dim=1)/node_mask.sum(dim=1).to(loss))
+    elif mode == 'raw':
+        return loss
@@ -0,0 +1,37 @@
+'''
+first graph conv of the ST-GCN 3D models on node inputs, shared by the GraphConvNet3D copies of the model dirs
+node_feeder gives (N, C, T, V) node features standing for the (N, 2C, T, V, V) pair tensor of data_feeder,
+whose first C channels are taken at node u and the last C at node v
+only the input pair tensor is avoided: the output of the first layer is still (N, C_out, T, V, V)
+'''
+
+import torch
+import torch.nn.functional as F
+
+
+def node_terms(conv, s_kernel_size, x):
+    # conv: the pointwise Conv3d of the graph conv, x size: (n, c, t, v)
+    # the conv splits into a node u term (with the bias) and a node v term, both (n, k, c_out, t, v)
+    assert conv.kernel_size[0] == 1 and conv.stride[0] == 1
+
+    n, c, t, v = x.size()
+    weight = conv.weight[:, :, 0]
+    x_u = F.conv2d(x, weight[:, :c], conv.bias)
+    x_v = F.conv2d(x, weight[:, c:])
+
+    kc = x_u.size(1)
+    x_u = x_u.view(n, s_kernel_size, kc // s_kernel_size, t, v)
+    x_v = x_v.view(n, s_kernel_size, kc // s_kernel_size, t, v)
+
+    return x_u, x_v
+
+
+def node_graph_conv(conv, s_kernel_size, x, A):
+    # same as the conv and einsum of GraphConvNet3D on data_feeder(x), A size: (n, k, v, v)
+    # sum_v (x_u[u]+x_v[v])*A[v, w] = x_u[u]*sum_v A[v, w] + (x_v A)[w]
+    x_u, x_v = node_terms(conv, s_kernel_size, x)
+
+    x = torch.einsum('nkctu, nkw->nctuw', (x_u, A.sum(2)))
+    x = x+torch.einsum('nkctv, nkvw->nctw', (x_v, A)).unsqueeze(3)
+
+    return x.contiguous()
@@ -73,7 +73,7 @@ def eval_model(data_dir, net, args):
                     ids = ids.cuda()
 
                 veh_data, ped_data = veh_ped_seperate(data, ids)
-                veh_data, first_values_dict = data_vectorize(veh_data)
+                veh_data, first_values = data_vectorize(veh_data)
                 veh_input_data = veh_data[:args.obs_len, :, :]
                 veh_pred_data = veh_data[args.obs_len:, :, :]
 
@@ -86,12 +86,12 @@ def eval_model(data_dir, net, args):
                 if args.use_cuda:
                     k_ret_seq = k_ret_seq.cuda()
 
-                veh_pred_data = data_revert(veh_pred_data, first_values_dict)
+                veh_pred_data = data_revert(veh_pred_data, first_values)
 
                 error = 0.0
                 for k in range(args.best_k):
                     ret_seq = sample(net, veh_input_data, ped_input_data, ped_pred_data, veh_num_nodes, ped_num_nodes, args)
-                    ret_seq = data_revert(ret_seq, first_values_dict)
+                    ret_seq = data_revert(ret_seq, first_values)
 
                     k_ret_seq[k] = ret_seq
                     error += final_displacement_error(ret_seq[-1], veh_pred_data[-1])
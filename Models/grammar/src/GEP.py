@@ -22,9 +22,34 @@ def format_num(num):
         return '{:.1e}'.format(num)
 
 
+def output_log(prob):
+    # A zero output stays -inf as with np.log, the prefix sums over frames handle the zero frames apart
+    with np.errstate(divide='ignore'):
+        return np.log(np.asarray(prob, dtype=np.float64))
+
+
+def running_max(values, groups):
+    # Running max of values and the first index reaching it, restarted where the nondecreasing groups change
+    max_values = np.empty_like(values)
+    max_index = np.empty(len(values), dtype=int)
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(groups)) + 1, [len(values)]))
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        max_values[begin:end] = np.maximum.accumulate(values[begin:end])
+        # The first index reaching the running max, as a strict comparison over increasing index would
+        new_max = np.ones(end - begin, dtype=bool)
+        new_max[1:] = values[begin+1:end] > max_values[begin:end-1]
+        max_index[begin:end] = begin + np.maximum.accumulate(np.where(new_max, np.arange(end - begin), 0))
+    return max_values, max_index
+
+
 class State(object):
-    def __init__(self, r, dot, start, end, i, j, rule_index, operation, last_i, last_j, last_rule_index, prefix, prob, forward, inner):
+    __slots__ = ('_r', '_r_id', '_dot', '_start', '_end', '_i', '_j', '_rule_index', '_operation',
+                 '_last_i', '_last_j', '_last_rule_index', '_prefix', '_prob', '_forward', '_inner', '_key')
+
+    def __init__(self, r, r_id, dot, start, end, i, j, rule_index, operation, last_i, last_j, last_rule_index, prefix, prob, forward, inner):
         self._r = r
+        # Integer code of the rule in the compiled grammar of the parser
+        self._r_id = r_id
         self._dot = dot
         self._start = start
         self._end = end
@@ -48,6 +73,9 @@ class State(object):
         self._forward = forward
         self._inner = inner
 
+        # Earley equivalence: same rule, dot, span and prefix, used to index the state sets
+        self._key = (r_id, dot, start, end, tuple(prefix))
+
     def is_complete(self):
         return self._dot == len(self._r.rhs())
 
@@ -57,7 +85,7 @@ class State(object):
         return self._r.rhs()[self._dot]
 
     def earley_equivalent(self, other_state):
-        return self.earley_hash() == other_state.earley_hash()
+        return self._key == other_state.key
 
     def earley_hash(self):
         rhs = [str(n) for n in self._r.rhs()]
@@ -93,9 +121,15 @@ class State(object):
 
         return '({}) & ${}$ & {} & {} & ``${}$" & {}\\\\'.format(state_idx, rule, format_num(self._forward), format_num(self._inner), prefix_tex, comment)
 
+    @property
+    def key(self): return self._key
+
     @property
     def r(self): return self._r
 
+    @property
+    def r_id(self): return self._r_id
+
     @property
     def dot(self): return self._dot
 
@@ -142,26 +176,61 @@ class GeneralizedEarley(object):
     def __init__(self, grammar, mapping=None):
         self._grammar = grammar
         self._classifier_output = None
+        self._log_classifier_output = None
         self._total_frame = 0
         self._cached_log_prob = None
         self._cached_grammar_prob = None
         self._state_set = None
+        self._state_index = None
+        self._waiting_index = None
+        self._scanned_sets = None
         self._queue = None
         self._prefix_queue = None
         self._max_log_prob = None
         self._best_l = None
         self._mapping = mapping
         self._state_set_id = {'': (0, 0)}
+        self._compile_grammar()
         self._parse_init()
         #grammarutils.grammar_to_dot(self._grammar, '/home/baoxiong/grammar.txt')
 
+    def _compile_grammar(self):
+        # Integer codes for the symbols and rules, productions with the same lhs and rhs share a rule id
+        self._symbol_id = dict()
+        self._productions = list()
+        self._rule_lhs = list()
+        # Nonterminal symbol ids of the rhs, None for terminals
+        self._rule_rhs = list()
+        # lhs symbol id -> [(rule id, production probability)] for every production, in grammar order
+        self._lhs_rules = dict()
+
+        rule_id = dict()
+        for r in self._grammar.productions():
+            lhs = self._symbol_id.setdefault(str(r.lhs()), len(self._symbol_id))
+            if (r.lhs(), r.rhs()) not in rule_id:
+                rule_id[(r.lhs(), r.rhs())] = len(self._productions)
+                self._productions.append(r)
+                self._rule_lhs.append(lhs)
+                self._rule_rhs.append(tuple(self._symbol_id.setdefault(str(symbol), len(self._symbol_id))
+                                            if nltk.grammar.is_nonterminal(symbol) else None for symbol in r.rhs()))
+            self._lhs_rules.setdefault(lhs, []).append((rule_id[(r.lhs(), r.rhs())], r.prob()))
+
+    def next_symbol_id(self, s):
+        rhs = self._rule_rhs[s.r_id]
+        return rhs[s.dot] if s.dot < len(rhs) else None
+
     def _parse_init(self, classifier_output=None):
         self._queue = []
         self._state_set = [[[]]]
-        for r in self._grammar.productions():
-            if str(r.lhs()) == 'GAMMA':
-                self._state_set[0][0].append(State(r, 0, 0, 0, 0, 0, -1, 'root', 0, 0, 0, [], 0.0, 1.0, 1.0))
-                break
+        # self._state_index[m][n] maps the earley key of every state in self._state_set[m][n] to the state
+        self._state_index = [[dict()]]
+        # self._waiting_index[m][n] maps a nonterminal id to the states in self._state_set[m][n] expecting it next
+        self._waiting_index = [[dict()]]
+        # Prefix string -> None once its state set is closed under predict and complete, the (m, n, prefix string)
+        # of its child sets once it is scanned as well, so sets are only expanded once when extend parses again
+        self._scanned_sets = dict()
+        r_id, _ = self._lhs_rules[self._symbol_id['GAMMA']][0]
+        self.add_state(0, 0, State(self._productions[r_id], r_id, 0, 0, 0, 0, 0, -1, 'root', 0, 0, 0, [], 0.0, 1.0, 1.0))
         heapq.heappush(self._queue, ((1.0 - 1.0, (0, 0, '', self._state_set[0][0]))))
         self._max_log_prob = -np.inf
 
@@ -169,6 +238,7 @@ class GeneralizedEarley(object):
             if len(classifier_output.shape) != 2:
                 raise ValueError('Classifier output shape not recognized, expecting (frame_num, class_num).')
             self._classifier_output = classifier_output
+            self._log_classifier_output = output_log(classifier_output)
             self._cached_log_prob = dict()
             self._cached_grammar_prob = dict()
             self._total_frame = self._classifier_output.shape[0]
@@ -226,7 +296,42 @@ class GeneralizedEarley(object):
                 print(l, p)
 
     def parse(self, classifier_output):
+        # Parses can differ from the parser before extend(): state sets are now closed under predict and complete
+        # before they are scanned, so on grammars that reach a terminal both directly and after a completion p(l|G),
+        # the prefix probabilities and the best parse change (check_prefix_prob.py). Flat grammars parse the same
         self._parse_init(classifier_output)
+        return self._search()
+
+    def extend(self, classifier_output):
+        # Online parsing: append frames to the classifier output of the last parse and parse the whole sequence again
+        # The state sets only depend on the prefixes, they are kept with the cached p(l|x_{0:t}) of the previous frames
+        if self._classifier_output is None:
+            return self.parse(classifier_output)
+        if len(classifier_output.shape) != 2 or classifier_output.shape[1] != self._class_num:
+            raise ValueError('Classifier output shape not recognized, expecting (frame_num, {}).'.format(self._class_num))
+
+        last_frame = self._total_frame
+        self._classifier_output = np.vstack((self._classifier_output, classifier_output))
+        self._log_classifier_output = np.vstack((self._log_classifier_output, output_log(classifier_output)))
+        self._total_frame = self._classifier_output.shape[0]
+
+        # Shorter prefixes first, the new frames of l are computed from those of l_minus
+        for l in sorted(self._cached_log_prob.keys(), key=lambda item: len(item.split())):
+            log_prob = np.ones(self._total_frame + 1) * np.finfo('d').min
+            log_prob[:last_frame] = self._cached_log_prob[l][:last_frame]
+            prefix_log_prob = self._cached_log_prob[l][last_frame]
+            self._cached_log_prob[l] = log_prob
+            if l == '':
+                log_prob[self._total_frame] = 0.0
+            else:
+                self.update_log_prob(l.split(' '), last_frame, prefix_log_prob)
+
+        self._queue = []
+        heapq.heappush(self._queue, ((1.0 - 1.0, (0, 0, '', self._state_set[0][0]))))
+        self._max_log_prob = -np.inf
+        return self._search()
+
+    def _search(self):
         count = 0
         while self._queue:
             count += 1
@@ -243,21 +348,29 @@ class GeneralizedEarley(object):
                 self._best_l = set_l
 
             # self.state_set_vis()
-            # TODO: new_scanned_states naturally satisfies set properties, assertion needed
-            new_scanned_states = list()
-            for rule_index, s in enumerate(current_set):
-                if s.is_complete():
-                    self.complete(m, n, rule_index, s)
-                elif nltk.grammar.is_nonterminal(s.next_symbol()):
-                    self.predict(m, n, rule_index, s)
-                elif nltk.grammar.is_terminal(s.next_symbol()):
-                    if m == self._total_frame:
-                        continue
-                    new_scanned_states.append(self.scan(m, n, rule_index, s))
-                else:
-                    raise ValueError('No operation (predict, scan, complete) applies to state {}'.format(s))
-
-            for new_m, new_n, new_prefix_str in new_scanned_states:
+            # The set is closed under predict and complete before any state is scanned, so every scanned forward
+            # probability includes all the completions reaching its state (check_prefix_prob.py)
+            if set_l not in self._scanned_sets:
+                for rule_index, s in enumerate(current_set):
+                    if s.is_complete():
+                        self.complete(m, n, rule_index, s)
+                    elif nltk.grammar.is_nonterminal(s.next_symbol()):
+                        self.predict(m, n, rule_index, s)
+                    elif not nltk.grammar.is_terminal(s.next_symbol()):
+                        raise ValueError('No operation (predict, scan, complete) applies to state {}'.format(s))
+                self._scanned_sets[set_l] = None
+
+            # Scanning adds a symbol to the prefix, not before there is a frame for it
+            if self._scanned_sets[set_l] is None and m < self._total_frame:
+                new_scanned_states = list()
+                for rule_index, s in enumerate(current_set):
+                    if not s.is_complete() and nltk.grammar.is_terminal(s.next_symbol()):
+                        new_scanned_state = self.scan(m, n, rule_index, s)
+                        if new_scanned_state not in new_scanned_states:
+                            new_scanned_states.append(new_scanned_state)
+                self._scanned_sets[set_l] = new_scanned_states
+
+            for new_m, new_n, new_prefix_str in self._scanned_sets[set_l] or []:
                 new_prefix = self._state_set[new_m][new_n][0].prefix
                 # new_prefix_str = self._state_set[new_m][new_n][0].prefix_str()
 
@@ -271,11 +384,14 @@ class GeneralizedEarley(object):
                         # if new_hash not in scanned_state_no_duplicate:
                         #     scanned_state_no_duplicate.add(new_hash)
                         #     self._cached_grammar_prob[new_prefix_str] += new_s.forward
-                    prob = self.compute_prob(new_prefix)
-                    branch_log_probs[new_prefix_str] = self._cached_log_prob[set_l][self._total_frame]
-                    for new_s in self._state_set[new_m][new_n]:
-                        new_s.prob = prob
-                    heapq.heappush(self._queue, (1.0 - prob, (new_m, new_n, new_prefix_str, self._state_set[new_m][new_n])))
+                # Pushed whether or not p(l|G) was cached: extend searches the sets of an earlier search again.
+                # Within one search a child set is only reached from its parent set, expanded once, so it is
+                # pushed once as before
+                prob = self.compute_prob(new_prefix)
+                branch_log_probs[new_prefix_str] = self._cached_log_prob[set_l][self._total_frame]
+                for new_s in self._state_set[new_m][new_n]:
+                    new_s.prob = prob
+                heapq.heappush(self._queue, (1.0 - prob, (new_m, new_n, new_prefix_str, self._state_set[new_m][new_n])))
 
             # Early stop
             if self._queue:
@@ -295,38 +411,39 @@ class GeneralizedEarley(object):
         return self._best_l, self._max_log_prob
 
     def get_log_prob_sum(self):
-        log_prob = np.log(self._classifier_output).transpose()
-        log_prob_sum = np.zeros((self._class_num, self._total_frame, self._total_frame))
-        for c in range(self._class_num):
-            for b in range(self._total_frame):
-                log_prob_sum[c, b, b] = log_prob[c, b]
-        for c in range(self._class_num):
-            for b in range(self._total_frame):
-                for e in range(b+1, self._total_frame):
-                    log_prob_sum[c, b, e] = log_prob_sum[c, b, e-1] + log_prob[c, e]
-        return log_prob, log_prob_sum
+        # Prefix sums over frames, log_prob_sum[c, t] = log y_0^{c} + ... + log y_{t-1}^{c} without the zero outputs
+        # and zero_sum[c, t] the number of zero outputs among y_0^{c} ... y_{t-1}^{c}
+        # The log probability of class c on frames b..e is log_prob_sum[c, e+1] - log_prob_sum[c, b],
+        # or -inf when zero_sum[c, e+1] != zero_sum[c, b]
+        log_prob = self._log_classifier_output.transpose()
+        zero = np.isneginf(log_prob)
+        log_prob_sum = np.concatenate((np.zeros((self._class_num, 1)), np.cumsum(np.where(zero, 0.0, log_prob), axis=1)), axis=1)
+        zero_sum = np.concatenate((np.zeros((self._class_num, 1), dtype=int), np.cumsum(zero, axis=1)), axis=1)
+        return log_prob, log_prob_sum, zero_sum
 
     def compute_labels(self):
-        log_prob, log_prob_sum = self.get_log_prob_sum()
+        log_prob, log_prob_sum, zero_sum = self.get_log_prob_sum()
 
         tokens = [int(token) for token in self._best_l.split(' ')]
         dp_tables = np.zeros((len(tokens), self._total_frame))
         traces = np.zeros_like(dp_tables)
 
-        for end in range(0, self._total_frame):
-            dp_tables[0, end] = log_prob_sum[tokens[0], 0, end]
+        dp_tables[0, :] = np.where(zero_sum[tokens[0], 1:] == 0, log_prob_sum[tokens[0], 1:] - log_prob_sum[tokens[0], 0], -np.inf)
 
         for token_i, token in enumerate(tokens):
-            if token_i == 0:
+            if token_i == 0 or token_i >= self._total_frame:
                 continue
-            for end in range(token_i, self._total_frame):
-                max_log_prob = -np.inf
-                for begin in range(token_i, end+1):
-                    check_prob = dp_tables[token_i-1, begin-1] + log_prob_sum[token, begin, end]
-                    if check_prob > max_log_prob:
-                        max_log_prob = check_prob
-                        traces[token_i, end] = begin-1
-                dp_tables[token_i, end] = max_log_prob
+            # dp_tables[token_i, end] = max_{token_i <= begin <= end} dp_tables[token_i-1, begin-1] + log_prob_sum[token, end+1] - log_prob_sum[token, begin]
+            # Only the first two terms depend on begin, so the max is a running max along end
+            # A segment over a zero output is -inf, so the running max starts again after every zero frame
+            begins = np.arange(token_i, self._total_frame)
+            begin_log_prob = dp_tables[token_i-1, begins-1] - log_prob_sum[token, begins]
+            max_log_prob, best_begins = running_max(begin_log_prob, zero_sum[token, begins])
+            max_log_prob[zero_sum[token, begins+1] != zero_sum[token, begins]] = -np.inf
+
+            # Ends where every begin is -inf keep the trace 0, as the strict comparison of the begin loop did
+            dp_tables[token_i, token_i:] = max_log_prob + log_prob_sum[token, token_i+1:]
+            traces[token_i, token_i:] = np.where(max_log_prob > -np.inf, begins[best_begins] - 1, 0)
 
         # Back tracing
         token_pos = [-1 for _ in tokens]
@@ -334,7 +451,7 @@ class GeneralizedEarley(object):
         for token_i in reversed(range(len(tokens)-1)):
             token_pos[token_i] = int(traces[token_i+1, token_pos[token_i+1]])
 
-        labels = - np.ones(self._total_frame).astype(np.int)
+        labels = - np.ones(self._total_frame).astype(int)
         labels[:token_pos[0]+1] = tokens[0]
         for token_i in range(1, len(tokens)):
             labels[token_pos[token_i-1]+1:token_pos[token_i]+1] = tokens[token_i]
@@ -362,46 +479,42 @@ class GeneralizedEarley(object):
         # if s.rule_index == -1:
         #     return
         # back_s = self._state_set[s.i][s.j][s.rule_index]
-        for back_s in self._state_set[s.i][s.j]:
-            if str(back_s.next_symbol()) == str(s.r.lhs()) and back_s.end == s.start:
+        for back_s in self._waiting_index[s.i][s.j].setdefault(self._rule_lhs[s.r_id], []):
+            if back_s.end == s.start:
                 forward_prob = back_s.forward * s.inner
                 inner_prob = back_s.inner * s.inner
                 # TODO: Check about this rule's    /complete operation
-                new_s = State(back_s.r, back_s.dot + 1, back_s.start, s.end, back_s.i, back_s.j, back_s.rule_index,
+                new_s = State(back_s.r, back_s.r_id, back_s.dot + 1, back_s.start, s.end, back_s.i, back_s.j, back_s.rule_index,
                               'complete', s.i, s.j, (s.rule_index, rule_index), s.prefix, s.prob, forward_prob, inner_prob)
 
                 # Stockle, A. 1995 p176 completion probability calculation
-                state_exist = False
-                for r_idx, exist_s in enumerate(self._state_set[m][n]):
-                    if exist_s.earley_equivalent(new_s):
-                        assert (not state_exist), 'Complete duplication'
-                        state_exist = True
-                        exist_s.forward += forward_prob
-                        exist_s.inner += inner_prob
-
-                if not state_exist:
-                    self._state_set[m][n].append(new_s)
+                exist_s = self._state_index[m][n].get(new_s.key)
+                if exist_s is not None:
+                    exist_s.forward += forward_prob
+                    exist_s.inner += inner_prob
+                else:
+                    self.add_state(m, n, new_s)
 
     def predict(self, m, n, rule_index, s):
-        expand_symbol = str(s.next_symbol())
-        for r in self._grammar.productions():
-            production_prob = r.prob()
+        for r_id, production_prob in self._lhs_rules.get(self.next_symbol_id(s), []):
             forward_prob = s.forward * production_prob
             inner_prob = production_prob
 
-            if expand_symbol == str(r.lhs()):
-                new_s = State(r, 0, s.end, s.end, m, n, rule_index, 'predict', m, n, rule_index, s.prefix, s.prob, forward_prob, inner_prob)
+            new_s = State(self._productions[r_id], r_id, 0, s.end, s.end, m, n, rule_index, 'predict', m, n, rule_index, s.prefix, s.prob, forward_prob, inner_prob)
 
-                # Stockle, A. 1995 p176 prediction probability calculation
-                state_exist = False
-                for exist_s in self._state_set[m][n]:
-                    if exist_s.earley_equivalent(new_s):
-                        assert(not state_exist), 'Prediction duplication'
-                        state_exist = True
-                        exist_s.forward += forward_prob
+            # Stockle, A. 1995 p176 prediction probability calculation
+            exist_s = self._state_index[m][n].get(new_s.key)
+            if exist_s is not None:
+                exist_s.forward += forward_prob
+            else:
+                self.add_state(m, n, new_s)
 
-                if not state_exist:
-                    self._state_set[m][n].append(new_s)
+    def add_state(self, m, n, new_s):
+        self._state_set[m][n].append(new_s)
+        self._state_index[m][n][new_s.key] = new_s
+        next_id = self.next_symbol_id(new_s)
+        if next_id is not None:
+            self._waiting_index[m][n].setdefault(next_id, []).append(new_s)
 
     def scan(self, m, n, rule_index, s):
         new_prefix = s.prefix[:]
@@ -411,12 +524,14 @@ class GeneralizedEarley(object):
         inner_prob = s.inner
 
         # TODO: check scan rule father index
-        new_s = State(s.r, s.dot + 1, s.start, s.end + 1, s.i, s.j, s.rule_index, 'scan', m, n, rule_index, new_prefix, 0.0, forward_prob, inner_prob)
+        new_s = State(s.r, s.r_id, s.dot + 1, s.start, s.end + 1, s.i, s.j, s.rule_index, 'scan', m, n, rule_index, new_prefix, 0.0, forward_prob, inner_prob)
         # print(new_s)
 
         if m == len(self._state_set) - 1:
             new_n = 0
             self._state_set.append([])
+            self._state_index.append([])
+            self._waiting_index.append([])
         else:
             new_n = len(self._state_set[m + 1])
 
@@ -430,17 +545,33 @@ class GeneralizedEarley(object):
             # print(new_s)
             assert(not exist_s.earley_equivalent(new_s)), 'No same Earley state should appear for non-recursive grammar'
             if exist_s.prefix_str() == new_prefix_str:
-                self._state_set[m + 1][s_idx].append(new_s)
+                self.add_state(m + 1, s_idx, new_s)
                 return m + 1, s_idx, new_prefix_str
 
         # print 'scan: S[{}, {}]'.format(m+1, new_n), new_s
         self._state_set[m + 1].append([])
-        self._state_set[m + 1][new_n].append(new_s)
+        self._state_index[m + 1].append(dict())
+        self._waiting_index[m + 1].append(dict())
+        self.add_state(m + 1, new_n, new_s)
         self._state_set_id[new_prefix_str] = (m + 1, new_n)
         return m + 1, new_n, new_prefix_str
 
     def compute_prob(self, prefix):
         l = ' '.join(prefix)
+
+        if l not in self._cached_log_prob:
+            # Initialize p(l|x_{0:T}) to negative infinity
+            self._cached_log_prob[l] = np.ones(self._total_frame + 1) * np.finfo('d').min
+            self.update_log_prob(prefix, 0)
+
+        # Search according to prefix probability (Prefix probability stored in the last dimension)
+        # TODO: better to return log instead of exp
+        return np.exp(self._cached_log_prob[l][self._total_frame])
+
+    def update_log_prob(self, prefix, first_frame, prefix_log_prob=None):
+        # Fills p(l|x_{0:t}) for frames first_frame to T-1 and the prefix probability p(l...|x_{0:T})
+        # prefix_log_prob is the prefix probability up to first_frame, the earlier frames are already cached
+        l = ' '.join(prefix)
         l_minus = ' '.join(prefix[:-1])
 
         # Store grammar transition probability
@@ -450,68 +581,53 @@ class GeneralizedEarley(object):
         transition_log_prob = np.log(self._cached_grammar_prob[l]) - np.log(self._cached_grammar_prob[l_minus])
         # transition_log_prob = 0
 
-        if l not in self._cached_log_prob:
-            if self._mapping:
-                k = int(self._mapping[prefix[-1]])
-            else:
-                k = int(prefix[-1])
-            l_minus = ' '.join(prefix[:-1])
+        if self._mapping:
+            k = int(self._mapping[prefix[-1]])
+        else:
+            k = int(prefix[-1])
 
-            # Initialize p(l|x_{0:T}) to negative infinity
-            self._cached_log_prob[l] = np.ones(self._total_frame + 1) * np.finfo('d').min
+        log_prob = self._cached_log_prob[l]
+        log_prob_minus = self._cached_log_prob[l_minus]
+        log_y = self._log_classifier_output[:, k]
+        if first_frame == 0:
             if len(prefix) == 1:
                 # Initializiation for p(l|x_{0:T}) when T = 0 and l only contains one symbol
-                self._cached_log_prob[l][0] = np.log(self._classifier_output[0, k]) + transition_log_prob
-                # self._cached_log_prob[l][0] = np.log(self._classifier_output[0, k])
+                log_prob[0] = log_y[0] + transition_log_prob
+            # When only 1 frame, p(l...|x_{0:t}) = p(l... | x_0) = p(l | x_0)
+            prefix_log_prob = log_prob[0]
+            first_frame = 1
 
+        if self._total_frame > first_frame:
             # Compute p(l)
-            for t in range(1, self._total_frame):
-                # To prevent numerical underflow for np.exp when the exponent is too small
-                # In the meanwhile, prevent overflow for np.exp(maximum - regularizer)
-
-                max_log = max(self._cached_log_prob[l][t - 1],
-                              self._cached_log_prob[l_minus][t - 1] + transition_log_prob)
-                # max_log = max(self._cached_log_prob[l][t - 1], self._cached_log_prob[l_minus][t - 1])
-
-                # p(l|x_{0:t}, G) = y_t^{k} (p(l | x_{0:t-1}, G) + p(k | l^{-}, G) p(l^{-} | x_{0:t-1}, G))
-
-                self._cached_log_prob[l][t] \
-                    = np.log(self._classifier_output[t, k]) + max_log + \
-                    np.log(np.exp(self._cached_log_prob[l][t - 1] - max_log) +
-                    np.exp(self._cached_log_prob[l_minus][t - 1] + transition_log_prob - max_log))
-
-                # if t == self._total_frame - 1:
-                #     self._cached_log_prob[l][t] \
-                #         = np.log(self._classifier_output[t, k]) + max_log + \
-                #           np.log(np.exp(self._cached_log_prob[l][t - 1] - max_log) +
-                #                  np.exp(self._cached_log_prob[l_minus][t - 1] - max_log)) + self._cached_grammar_prob[l]
-                # else:
-                #     self._cached_log_prob[l][t] \
-                #         = np.log(self._classifier_output[t, k]) + max_log + \
-                #           np.log(np.exp(self._cached_log_prob[l][t - 1] - max_log) +
-                #                  np.exp(self._cached_log_prob[l_minus][t - 1] - max_log))
+            # p(l|x_{0:t}, G) = y_t^{k} (p(l | x_{0:t-1}, G) + p(k | l^{-}, G) p(l^{-} | x_{0:t-1}, G))
+            # Unrolled from f = first_frame with Y_t = y_f^{k} ... y_t^{k} (Y_{f-1} = 1):
+            # p(l|x_{0:t}, G) = Y_t (p(l|x_{0:f-1}, G) + sum_{s=f}^{t} p(k | l^{-}, G) p(l^{-} | x_{0:s-1}, G) / Y_{s-1})
+            # the sum is a cumulative logaddexp over the frames, which also keeps np.exp from under/overflowing
+            # A zero output y_t^{k} gives p(l|x_{0:t}, G) = 0 (-inf), the unrolled sum starts again from f = t+1
+            zero_frames = first_frame + np.flatnonzero(np.isneginf(log_y[first_frame:self._total_frame]))
+            begin = first_frame
+            for end in list(zero_frames) + [self._total_frame]:
+                if end > begin:
+                    log_y_cum = np.concatenate(([0.0], np.cumsum(log_y[begin:end])))
+                    log_terms = np.concatenate(([log_prob[begin - 1]],
+                                                log_prob_minus[begin - 1:end - 1] + transition_log_prob - log_y_cum[:-1]))
+                    log_prob[begin:end] = log_y_cum[1:] + np.logaddexp.accumulate(log_terms)[1:]
+                if end < self._total_frame:
+                    log_prob[end] = -np.inf
+                begin = end + 1
 
             # Compute p(l...)
-            if self._total_frame == 1:
-                # When only 1 frame, p(l...|x_{0:t}) = p(l... | x_0) = p(l | x_0)
-                self._cached_log_prob[l][self._total_frame] = self._cached_log_prob[l][0]
-            else:
-                max_log = max(self._cached_log_prob[l][0],
-                              np.max(self._cached_log_prob[l_minus][0:self._total_frame - 1] + transition_log_prob))
+            max_log = max(prefix_log_prob, np.max(log_prob_minus[first_frame - 1:self._total_frame - 1] + transition_log_prob))
 
+            if max_log > -np.inf:
                 # (ICML 2018) Generalized Earley parser Equation(3)
-                self._cached_log_prob[l][self._total_frame] = np.exp(self._cached_log_prob[l][0] - max_log)
-
-                for t in range(1, self._total_frame):
-                    self._cached_log_prob[l][self._total_frame] += self._classifier_output[t, k] * \
-                                        np.exp(self._cached_log_prob[l_minus][t - 1] + transition_log_prob - max_log)
+                prefix_prob = np.exp(prefix_log_prob - max_log) + \
+                    np.sum(self._classifier_output[first_frame:self._total_frame, k] *
+                           np.exp(log_prob_minus[first_frame - 1:self._total_frame - 1] + transition_log_prob - max_log))
 
-                self._cached_log_prob[l][self._total_frame] = \
-                    np.log(self._cached_log_prob[l][self._total_frame]) + max_log
+                prefix_log_prob = np.log(prefix_prob) + max_log
 
-        # Search according to prefix probability (Prefix probability stored in the last dimension)
-        # TODO: better to return log instead of exp
-        return np.exp(self._cached_log_prob[l][self._total_frame])
+        log_prob[self._total_frame] = prefix_log_prob
 
 
 def main():
@@ -0,0 +1,151 @@
+"""
+Timing benchmark of GeneralizedEarley.parse for T from 10 to 200 frames: the per-frame compute_prob recursion used
+before (LoopGeneralizedEarley) vs the cumulative logaddexp over the frame axis
+random classifier outputs, best parses, their log probabilities and all cached prefix probabilities are compared
+
+Then online parsing as in gep_pred_parse: after the T observed frames, --extend_steps chunks of one-hot like frames
+are appended, parsing the whole sequence again with parse vs only the new frames with extend
+
+"""
+
+import argparse
+import time
+
+import numpy as np
+import nltk
+
+import grammarutils
+from GEP import GeneralizedEarley
+
+
+class LoopGeneralizedEarley(GeneralizedEarley):
+    # reference: one frame at a time with scalar np.log/np.exp
+    def compute_prob(self, prefix):
+        l = ' '.join(prefix)
+        l_minus = ' '.join(prefix[:-1])
+
+        transition_log_prob = np.log(self._cached_grammar_prob[l]) - np.log(self._cached_grammar_prob[l_minus])
+
+        if l not in self._cached_log_prob:
+            if self._mapping:
+                k = int(self._mapping[prefix[-1]])
+            else:
+                k = int(prefix[-1])
+
+            self._cached_log_prob[l] = np.ones(self._total_frame + 1) * np.finfo('d').min
+            if len(prefix) == 1:
+                self._cached_log_prob[l][0] = np.log(self._classifier_output[0, k]) + transition_log_prob
+
+            for t in range(1, self._total_frame):
+                max_log = max(self._cached_log_prob[l][t - 1],
+                              self._cached_log_prob[l_minus][t - 1] + transition_log_prob)
+
+                self._cached_log_prob[l][t] \
+                    = np.log(self._classifier_output[t, k]) + max_log + \
+                    np.log(np.exp(self._cached_log_prob[l][t - 1] - max_log) +
+                    np.exp(self._cached_log_prob[l_minus][t - 1] + transition_log_prob - max_log))
+
+            if self._total_frame == 1:
+                self._cached_log_prob[l][self._total_frame] = self._cached_log_prob[l][0]
+            else:
+                max_log = max(self._cached_log_prob[l][0],
+                              np.max(self._cached_log_prob[l_minus][0:self._total_frame - 1] + transition_log_prob))
+
+                self._cached_log_prob[l][self._total_frame] = np.exp(self._cached_log_prob[l][0] - max_log)
+
+                for t in range(1, self._total_frame):
+                    self._cached_log_prob[l][self._total_frame] += self._classifier_output[t, k] * \
+                                        np.exp(self._cached_log_prob[l_minus][t - 1] + transition_log_prob - max_log)
+
+                self._cached_log_prob[l][self._total_frame] = \
+                    np.log(self._cached_log_prob[l][self._total_frame]) + max_log
+
+        return np.exp(self._cached_log_prob[l][self._total_frame])
+
+
+# nested, non-recursive grammar over 3 classes, so prefixes have more than one parse
+TEST_GRAMMAR = """
+GAMMA -> S [1.0]
+S -> A B [0.4] | B A [0.3] | A [0.2] | C B A [0.1]
+A -> '0' '1' [0.5] | '1' [0.3] | '0' [0.2]
+B -> '2' C [0.6] | '0' [0.4]
+C -> '1' '2' [0.7] | '0' [0.3]
+"""
+
+
+def time_call(func, repeat):
+    times = []
+    for _ in range(repeat):
+        t_start = time.time()
+        out = func()
+        times.append(time.time() - t_start)
+
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--grammar_file', type=str, default='')
+    parser.add_argument('--nc', type=int, default=3)
+    parser.add_argument('--frames', type=int, nargs='+', default=[10, 25, 50, 100, 200])
+    parser.add_argument('--extend_steps', type=int, default=4)
+    parser.add_argument('--extend_frames', type=int, default=10)
+    parser.add_argument('--epsilon', type=float, default=1e-10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.grammar_file:
+        symbol_index = {str(num): num for num in range(args.nc)}
+        grammar = grammarutils.read_grammar(args.grammar_file, index=True, mapping=symbol_index)
+    else:
+        grammar = nltk.PCFG.fromstring(TEST_GRAMMAR)
+
+    rng = np.random.RandomState(args.seed)
+    for T in args.frames:
+        classifier_output = rng.dirichlet(np.ones(args.nc) * 0.5, size=T)
+        loop_parser, vec_parser = LoopGeneralizedEarley(grammar), GeneralizedEarley(grammar)
+
+        t_loop, (l_loop, p_loop) = time_call(lambda: loop_parser.parse(classifier_output), args.repeat)
+        t_vec, (l_vec, p_vec) = time_call(lambda: vec_parser.parse(classifier_output), args.repeat)
+
+        diff = max(np.abs(loop_parser._cached_log_prob[l] - vec_parser._cached_log_prob[l]).max() for l in loop_parser._cached_log_prob)
+        print('T = {:3d}: loop = {:.4f}s, vectorized = {:.4f}s, speedup = {:.1f}x, same parse = {}, log prob diff = {:.2e}, max cached diff = {:.2e}'.format(
+            T, t_loop, t_vec, t_loop / max(t_vec, 1e-9), l_loop == l_vec, abs(p_loop - p_vec), diff))
+
+    for T in args.frames:
+        classifier_output = rng.dirichlet(np.ones(args.nc) * 0.5, size=T)
+        new_frames = []
+        for _ in range(args.extend_steps):
+            frames = np.ones((args.extend_frames, args.nc)) * args.epsilon
+            frames[:, rng.randint(args.nc)] = 1.0
+            new_frames.append(frames / frames[0].sum())
+
+        def reparse():
+            parser = GeneralizedEarley(grammar)
+            parser.parse(classifier_output)
+            sequence = classifier_output
+            for frames in new_frames:
+                sequence = np.vstack((sequence, frames))
+                result = parser.parse(sequence)
+            return result, parser.future_predict(args.epsilon)
+
+        def extend():
+            parser = GeneralizedEarley(grammar)
+            parser.parse(classifier_output)
+            for frames in new_frames:
+                result = parser.extend(frames)
+            return result, parser.future_predict(args.epsilon)
+
+        t_parse, ((l_parse, p_parse), f_parse) = time_call(reparse, args.repeat)
+        t_extend, ((l_extend, p_extend), f_extend) = time_call(extend, args.repeat)
+
+        print('T = {:3d} + {}x{}: parse = {:.4f}s, extend = {:.4f}s, speedup = {:.1f}x, same parse = {}, log prob diff = {:.2e}, future diff = {:.2e}'.format(
+            T, args.extend_steps, args.extend_frames, t_parse, t_extend, t_parse / max(t_extend, 1e-9), l_parse == l_extend,
+            abs(p_parse - p_extend), np.abs(f_parse - f_extend).max()))
+
+
+if __name__ == '__main__':
+    main()
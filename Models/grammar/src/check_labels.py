@@ -0,0 +1,150 @@
+"""
+Regression check of GeneralizedEarley.compute_labels and of the cached p(l|x_{0:t}) against the frame by frame loops
+they replaced, on random classifier outputs with and without zero outputs
+
+compute_labels runs a running max over prefix sums of log y instead of the triple loop over (token, end, begin),
+update_log_prob a cumulative logaddexp instead of the recursion over t. A zero output is -inf in both, as np.log
+gave in the loops: segments over it are -inf in the labels DP and p(l|x_{0:t}) is 0 at its frame
+
+"""
+
+import argparse
+
+import numpy as np
+import nltk
+
+from GEP import GeneralizedEarley
+from check_prefix_prob import NESTED_GRAMMAR
+
+
+def loop_labels(log_prob, tokens):
+    # The triple loop of compute_labels, log_prob size: (class_num, frame_num)
+    total_frame = log_prob.shape[1]
+    log_prob_sum = np.zeros((log_prob.shape[0], total_frame, total_frame))
+    for c in range(log_prob.shape[0]):
+        for b in range(total_frame):
+            log_prob_sum[c, b, b] = log_prob[c, b]
+            for e in range(b+1, total_frame):
+                log_prob_sum[c, b, e] = log_prob_sum[c, b, e-1] + log_prob[c, e]
+
+    dp_tables = np.zeros((len(tokens), total_frame))
+    traces = np.zeros_like(dp_tables)
+    for end in range(0, total_frame):
+        dp_tables[0, end] = log_prob_sum[tokens[0], 0, end]
+    for token_i, token in enumerate(tokens):
+        if token_i == 0:
+            continue
+        for end in range(token_i, total_frame):
+            max_log_prob = -np.inf
+            for begin in range(token_i, end+1):
+                check_prob = dp_tables[token_i-1, begin-1] + log_prob_sum[token, begin, end]
+                if check_prob > max_log_prob:
+                    max_log_prob = check_prob
+                    traces[token_i, end] = begin-1
+            dp_tables[token_i, end] = max_log_prob
+
+    token_pos = [-1 for _ in tokens]
+    token_pos[-1] = total_frame - 1
+    for token_i in reversed(range(len(tokens)-1)):
+        token_pos[token_i] = int(traces[token_i+1, token_pos[token_i+1]])
+
+    labels = - np.ones(total_frame).astype(int)
+    labels[:token_pos[0]+1] = tokens[0]
+    for token_i in range(1, len(tokens)):
+        labels[token_pos[token_i-1]+1:token_pos[token_i]+1] = tokens[token_i]
+
+    return labels, token_pos
+
+
+def loop_log_prob(classifier_output, grammar_prob, prefixes):
+    # The recursion over t of compute_prob for every prefix, shorter prefixes first
+    total_frame = classifier_output.shape[0]
+    cached_log_prob = {'': np.ones(total_frame + 1) * np.finfo('d').min}
+    cached_log_prob[''][total_frame] = 0.0
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for l in sorted(prefixes, key=lambda item: len(item.split())):
+            if l == '':
+                continue
+            prefix = l.split(' ')
+            l_minus = ' '.join(prefix[:-1])
+            transition_log_prob = np.log(grammar_prob[l]) - np.log(grammar_prob[l_minus])
+            k = int(prefix[-1])
+            log_prob, log_prob_minus = np.ones(total_frame + 1) * np.finfo('d').min, cached_log_prob[l_minus]
+            cached_log_prob[l] = log_prob
+            if len(prefix) == 1:
+                log_prob[0] = np.log(classifier_output[0, k]) + transition_log_prob
+            for t in range(1, total_frame):
+                max_log = max(log_prob[t - 1], log_prob_minus[t - 1] + transition_log_prob)
+                log_prob[t] = np.log(classifier_output[t, k]) + max_log + \
+                    np.log(np.exp(log_prob[t - 1] - max_log) + np.exp(log_prob_minus[t - 1] + transition_log_prob - max_log))
+            if total_frame == 1:
+                log_prob[total_frame] = log_prob[0]
+            else:
+                max_log = max(log_prob[0], np.max(log_prob_minus[0:total_frame - 1] + transition_log_prob))
+                log_prob[total_frame] = np.exp(log_prob[0] - max_log)
+                for t in range(1, total_frame):
+                    log_prob[total_frame] += classifier_output[t, k] * np.exp(log_prob_minus[t - 1] + transition_log_prob - max_log)
+                log_prob[total_frame] = np.log(log_prob[total_frame]) + max_log
+
+    return cached_log_prob
+
+
+def same_log(a, b, rtol=1e-9, atol=1e-9):
+    # equal up to rounding, probability 0 only where the other is 0; 0 is -inf or the np.finfo('d').min the cached
+    # p(l|x_{0:t}) start from. The loop b gives nan once both of its terms are 0, and in every value computed from
+    # it, those are not compared
+    a, b = a[~np.isnan(b)], b[~np.isnan(b)]
+    a, b = (np.where(x < np.finfo('d').min / 2, -np.inf, x) for x in (a, b))
+    return np.array_equal(np.isneginf(a), np.isneginf(b)) and np.allclose(a[np.isfinite(a)], b[np.isfinite(b)], rtol=rtol, atol=atol)
+
+
+def random_output(rng, total_frame, class_num, zero_rate):
+    classifier_output = rng.dirichlet(np.ones(class_num), size=total_frame)
+    classifier_output[rng.random((total_frame, class_num)) < zero_rate] = 0.0
+    # keep one nonzero output per frame
+    classifier_output[np.arange(total_frame), rng.integers(class_num, size=total_frame)] += 0.1
+    return classifier_output / classifier_output.sum(axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trials', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    grammar = nltk.PCFG.fromstring(NESTED_GRAMMAR)
+    checked = {'labels': 0, 'prefixes': 0}
+    for trial in range(args.trials):
+        total_frame = int(rng.integers(1, 16))
+        zero_rate = (0.0, 0.2, 0.5)[trial % 3]
+        classifier_output = random_output(rng, total_frame, 3, zero_rate)
+
+        gep = GeneralizedEarley(grammar)
+        gep.parse(classifier_output)
+
+        cached_log_prob = loop_log_prob(classifier_output, gep._cached_grammar_prob, gep._cached_log_prob.keys())
+        for l, log_prob in gep._cached_log_prob.items():
+            assert same_log(log_prob, cached_log_prob[l]), 'trial {}: p("{}"|x) {} instead of {}'.format(trial, l, log_prob, cached_log_prob[l])
+            checked['prefixes'] += 1
+
+        # the parsed string and random token strings, shorter and longer than the frames
+        log_prob = np.log(np.where(classifier_output > 0, classifier_output, 1.0)).transpose()
+        log_prob[classifier_output.transpose() == 0] = -np.inf
+        parsed = [gep._best_l] if gep._best_l else []
+        for l in parsed + [' '.join(str(c) for c in rng.integers(3, size=int(rng.integers(1, total_frame + 3)))) for _ in range(5)]:
+            gep._best_l = l
+            labels, _, token_pos = gep.compute_labels()
+            tokens = [int(token) for token in l.split(' ')]
+            expected_labels, expected_pos = loop_labels(log_prob, tokens)
+            # a boundary between two equal tokens is a tie of exact sums, rounding picks it, the labels are the same
+            repeated = any(a == b for a, b in zip(tokens[:-1], tokens[1:]))
+            assert np.array_equal(labels, expected_labels) and (repeated or token_pos == expected_pos), \
+                'trial {}: "{}" labels {} {} instead of {} {}'.format(trial, l, labels, token_pos, expected_labels, expected_pos)
+            checked['labels'] += 1
+
+    print('{} label sequences, {} prefix probabilities checked'.format(checked['labels'], checked['prefixes']))
+
+
+if __name__ == '__main__':
+    main()
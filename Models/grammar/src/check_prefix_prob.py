@@ -0,0 +1,81 @@
+"""
+Regression check of the grammar prefix probabilities p(l|G) cached by GeneralizedEarley, on a nested grammar where
+a terminal can be scanned from a state set both directly and after a completion (A -> X, Y -> X '2' with X -> '0')
+
+A state set is closed under predict and complete before any of its states is scanned, so the forward probability
+of a scanned state includes every completion reaching it. Scanning while the set still grows gave p('0'|G) = 0.45
+instead of 0.6 here, as the path A -> Y -> X '2' was scanned before X was completed
+
+The expected values are computed by hand: A yields '0' with 0.25 + 0.2, '1' with 0.25, '0 2' and '1 2' with 0.15
+each, then B adds '1' and C adds '2'. They are checked after parse and after extend, for several frame sequences
+
+"""
+
+import argparse
+
+import numpy as np
+import nltk
+
+from GEP import GeneralizedEarley
+
+
+NESTED_GRAMMAR = """
+GAMMA -> S [1.0]
+S -> A B [0.6] | A C [0.4]
+A -> X [0.5] | Y [0.5]
+Y -> '0' [0.4] | X '2' [0.6]
+X -> '0' [0.5] | '1' [0.5]
+B -> '1' [1.0]
+C -> '2' [1.0]
+"""
+
+PREFIX_PROB = {
+    '': 1.0,
+    '0': 0.45 + 0.15,
+    '1': 0.25 + 0.15,
+    '0 1': 0.45 * 0.6,
+    '0 2': 0.45 * 0.4 + 0.15,
+    '1 1': 0.25 * 0.6,
+    '1 2': 0.25 * 0.4 + 0.15,
+    '0 2 1': 0.15 * 0.6,
+    '0 2 2': 0.15 * 0.4,
+    '1 2 1': 0.15 * 0.6,
+    '1 2 2': 0.15 * 0.4,
+}
+
+
+def frames(labels, nc=3, confidence=0.8):
+    classifier_output = np.ones((len(labels), nc)) * (1.0 - confidence) / (nc - 1)
+    classifier_output[np.arange(len(labels)), labels] = confidence
+    return classifier_output
+
+
+def check(parser, name):
+    assert parser._cached_grammar_prob, name
+    for l, prob in parser._cached_grammar_prob.items():
+        assert l in PREFIX_PROB, '{}: unexpected prefix "{}"'.format(name, l)
+        assert abs(prob - PREFIX_PROB[l]) < 1e-12, '{}: p("{}"|G) = {} instead of {}'.format(name, l, prob, PREFIX_PROB[l])
+    print('{}: {} prefixes checked'.format(name, len(parser._cached_grammar_prob)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duration', type=int, default=3)
+    args = parser.parse_args()
+
+    grammar = nltk.PCFG.fromstring(NESTED_GRAMMAR)
+    for sentence in ([0, 2, 1], [1, 2], [0, 1], [0, 2, 2], [1, 1]):
+        labels = np.repeat(sentence, args.duration)
+
+        gep = GeneralizedEarley(grammar)
+        gep.parse(frames(labels))
+        check(gep, 'parse  {}'.format(sentence))
+
+        gep = GeneralizedEarley(grammar)
+        gep.parse(frames(labels[:args.duration]))
+        gep.extend(frames(labels[args.duration:]))
+        check(gep, 'extend {}'.format(sentence))
+
+
+if __name__ == '__main__':
+    main()
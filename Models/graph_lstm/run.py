@@ -142,7 +142,7 @@ def exec_model(dataloader_train, dataloader_test, args):
                     ids = ids.cuda()
                 
                 veh_data, ped_data = veh_ped_seperate(data, ids)
-                veh_data, first_values_dict = data_vectorize(veh_data)
+                veh_data, first_values = data_vectorize(veh_data)
                 veh_input_data = veh_data[:args.obs_len, :, :]
                 veh_pred_data = veh_data[args.obs_len:, :, :]
 
@@ -153,8 +153,8 @@ def exec_model(dataloader_train, dataloader_test, args):
                 veh_num_nodes, ped_num_nodes = veh_input_data.size(1), ped_input_data.size(1)
                 ret_seq = sample(net, veh_input_data, ped_input_data, ped_pred_data, veh_num_nodes, ped_num_nodes, args)
                 
-                veh_pred_data = data_revert(veh_pred_data, first_values_dict)
-                ret_seq = data_revert(ret_seq, first_values_dict)
+                veh_pred_data = data_revert(veh_pred_data, first_values)
+                ret_seq = data_revert(ret_seq, first_values)
 
                 error = displacement_error(ret_seq, veh_pred_data)
                 # error = final_displacement_error(ret_seq[-1], veh_pred_data[-1])
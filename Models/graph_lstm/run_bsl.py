@@ -119,9 +119,9 @@ def exec_model(dataloader_train, dataloader_test, args):
                     pred_data = pred_data.cuda()
                     ids = ids.cuda()
                 
-                input_data, first_value_dict = data_vectorize(input_data)
+                input_data, first_values = data_vectorize(input_data)
                 ret_seq = sample(net, input_data, pred_data, num_nodes, args)
-                ret_seq = data_revert(ret_seq, first_value_dict)
+                ret_seq = data_revert(ret_seq, first_values)
 
                 veh_ret_seq, _ = veh_ped_seperate(ret_seq, ids)
                 veh_pred_seq, _ = veh_ped_seperate(pred_data, ids)
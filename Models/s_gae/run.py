@@ -170,6 +170,9 @@ def main():
     parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
     parser.add_argument('--dset_tag', type=str, default='')
     parser.add_argument('--dset_feature', type=int, default=4)
+    parser.add_argument('--dset_lazy', action='store_true', default=False)
+    parser.add_argument('--dset_workers', type=int, default=0)
+    parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
     parser.add_argument('--frame_skip', type=int, default=2)
     parser.add_argument('--num_epochs', type=int, default=3)
     parser.add_argument('--save_name', type=str, default='feature_NGSIM')
@@ -177,18 +180,7 @@ def main():
 
     args = parser.parse_args()
 
-    loader_name = args.dset_name+'_loader.pth.tar'
-    if os.path.exists(loader_name):
-        assert os.path.isfile(loader_name)
-        state = torch.load(loader_name)
-
-        d_loader = state['loader']
-    else:
-        _, d_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
-
-        state = {}
-        state['loader'] = d_loader
-        torch.save(state, loader_name)
+    _, d_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
     print(len(d_loader))
 
     # exec_model(d_loader, args)
@@ -25,21 +25,10 @@ def data_feeder(data_seq):
 
 
 def data_vectorize(data_seq):
-    first_value_dict = WriteOnceDict()
-    vecotorized_seq = []
-
-    num_nodes = data_seq.size(1)
-    frame0 = data_seq[0, :]
-    for node in range(num_nodes):
-        first_value_dict[node] = frame0[node]
-    for i in range(1, len(data_seq)):
-        frame = data_seq[i]
-        vecotorized_frame = torch.zeros(num_nodes, data_seq.size(-1))
-        for node in range(num_nodes):
-            vecotorized_frame[node] = frame[node, :]-first_value_dict[node]
-        vecotorized_seq.append(vecotorized_frame)
-    
-    return torch.stack(vecotorized_seq), first_value_dict
+    # frames 1..T-1 relative to frame 0 of every node, offsets (V, F) are the frame 0 values for data_revert
+    first_values = data_seq[0].clone()
+
+    return data_seq[1:]-first_values, first_values
         
 
 def vae_loss(preds, targets, mu, logvar, n_nodes, norms, pos_weights, device):
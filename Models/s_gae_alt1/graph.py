@@ -1,4 +1,9 @@
 import torch
+import os
+import sys
+sys.path.append(os.path.join(os.getcwd(), '..', 'common'))
+from graph_ops import ttc_weights, normalize_adjacency
+
 
 class Graph:
     # templates size: (V, 4), 4 dims are: x, y, vx, vy
@@ -13,14 +18,7 @@ class Graph:
 
     
     def edges(self, templates):
-        for i in range(self.num_nodes):
-            for j in range(i+1, self.num_nodes):
-                xi, yi, vxi, vyi = templates[i]
-                xj, yj, vxj, vyj = templates[j]
-                a, b, c, d = (xi-xj), (yi-yj), (vxi-vxj), (vyi-vyj)
-                tmin = -(a*c+b*d)/(c**2+d**2).ceil().item()
-                self.A[i, j] = 1.0 / tmin if tmin > 0.0 else 0.0
-                self.A[j, i] = self.A[i, j]
+        self.A[:self.num_nodes, :self.num_nodes] = ttc_weights(templates)
 
         self.A[:self.num_nodes, :self.num_nodes] = self.A[:self.num_nodes, :self.num_nodes]+torch.eye(self.num_nodes)
 
@@ -29,12 +27,7 @@ class Graph:
         DAD = torch.zeros(self.A.size())
         DAD.requires_grad = False
 
-        A_ = self.A[:self.num_nodes, :self.num_nodes]
-        D1 = torch.sum(A_, dim=0)+alpha
-        Dn = torch.zeros(self.num_nodes, self.num_nodes)
-        for i in range(self.num_nodes):
-            Dn[i, i] = D1[i]**(-0.5)
-        DAD[:self.num_nodes, :self.num_nodes] = Dn.mm(A_).mm(Dn)
+        DAD[:self.num_nodes, :self.num_nodes] = normalize_adjacency(self.A[:self.num_nodes, :self.num_nodes], alpha)
         
         return DAD
 
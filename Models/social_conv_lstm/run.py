@@ -91,7 +91,7 @@ def exec_model(dataloader_train, dataloader_test, args):
                 pred_data = pred_data_list[idx]
                 num_nodes = num_nodes_list[idx]
                 
-                input_data, first_values_dict = data_vectorize(input_data)
+                input_data, first_values = data_vectorize(input_data)
                 input_data_nbrs, last_frame_mask = get_conv_mask(input_data[-1], input_data, num_nodes, args.encoder_dim, args.neighbor_size, args.grid_size)
 
                 if args.use_cuda:
@@ -100,7 +100,7 @@ def exec_model(dataloader_train, dataloader_test, args):
                     last_frame_mask = last_frame_mask.to(dev)
 
                 output_data = net(input_data, input_data_nbrs, last_frame_mask)
-                ret_data = data_revert(output_data[:, :, :2], first_values_dict)
+                ret_data = data_revert(output_data[:, :, :2], first_values)
 
                 error = displacement_error(ret_data, pred_data)
                 # error = final_displacement_error(veh_ret_data[-1], veh_pred_data[-1])
@@ -141,30 +141,20 @@ def main():
     parser.add_argument('--dset_name', type=str, default='GTADataset')
     parser.add_argument('--dset_tag', type=str, default='GTAS')
     parser.add_argument('--dset_feature', type=int, default=4)
+    parser.add_argument('--dset_lazy', action='store_true', default=False)
+    parser.add_argument('--dset_workers', type=int, default=0)
+    parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
     parser.add_argument('--frame_skip', type=int, default=1)
     parser.add_argument('--num_epochs', type=int, default=30)
     parser.add_argument('--pretrain_epochs', type=int, default=5)
 
     args = parser.parse_args()
 
-    loader_name = args.dset_name+'_loader.pth.tar'
-	if os.path.exists(loader_name):
-		assert os.path.isfile(loader_name)
-		state = torch.load(loader_name)
-		
-		train_loader = state['train']
-		test_loader = state['test']
-	else:
-		_, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
-		_, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
-		
-		state = {}
-		state['train'] = train_loader
-		state['test'] = test_loader
-		torch.save(state, loader_name)
-
-	print(len(train_loader))
-	print(len(test_loader))
+    _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
+    _, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
+
+    print(len(train_loader))
+    print(len(test_loader))
 
     exec_model(train_loader, test_loader, args)
 
@@ -11,32 +11,15 @@ class WriteOnceDict(dict):
 
 
 def data_vectorize(data_seq):
-    first_value_dict = WriteOnceDict()
-    vectorized_seq = []
-
-    num_nodes = data_seq.size(1)
-    frame0 = data_seq[0, :]
-    for node in range(num_nodes):
-        first_value_dict[node] = frame0[node, :]
-    for i in range(1, len(data_seq)):
-        frame = data_seq[i]
-        vectorized_frame = torch.zeros(num_nodes, data_seq.size(-1))
-        for node in range(num_nodes):
-            vectorized_frame[node] = frame[node, :]-first_value_dict[node]
-        vectorized_seq.append(vectorized_frame)
-    
-    return torch.stack(vectorized_seq)
+    # frames 1..T-1 relative to frame 0 of every node, offsets (V, F) are the frame 0 values for data_revert
+    first_values = data_seq[0].clone()
 
+    return data_seq[1:]-first_values, first_values
 
-def data_revert(data_seq, first_value_dict):
-    reverted_seq = data_seq.clone()
 
-    num_nodes = data_seq.size(1)
-    for i, frame in enumerate(data_seq):
-        for node in range(num_nodes):
-            reverted_seq[i, node, :] = frame[node, :]+first_value_dict[node][:2]
-    
-    return reverted_seq
+def data_revert(data_seq, first_values):
+    # inverse of data_vectorize on the positions, data_seq holds positions only
+    return data_seq+first_values[:, :2].to(data_seq)
 
 
 def veh_ped_seperate(data_seq, ids, offset=100):
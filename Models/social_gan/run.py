@@ -289,25 +289,15 @@ def main():
     parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
     parser.add_argument('--dset_tag', type=str, default='')
     parser.add_argument('--dset_feature', type=int, default=4)
+    parser.add_argument('--dset_lazy', action='store_true', default=False)
+    parser.add_argument('--dset_workers', type=int, default=0)
+    parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
     parser.add_argument('--frame_skip', type=int, default=2)
 
     args = parser.parse_args()
 
-    loader_name = args.dset_name+'_loader.pth.tar'
-    if os.path.exists(loader_name):
-        assert os.path.isfile(loader_name)
-        state = torch.load(loader_name)
-        
-        train_loader = state['train']
-        test_loader = state['test']
-    else:
-        _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
-        _, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
-        
-        state = {}
-        state['train'] = train_loader
-        state['test'] = test_loader
-        torch.save(state, loader_name)
+    _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
+    _, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
 
     print(len(train_loader))
     print(len(test_loader))
@@ -137,10 +137,10 @@ def exec_model(dataloader_train, dataloader_test, args):
                     ids = ids.to(dev)
 
                 grids = get_grid_mask_seq(input_data, args.neighbor_size, args.grid_size, args.use_cuda, device=dev)
-                input_data, first_values_dict = data_vectorize(input_data)
+                input_data, first_values = data_vectorize(input_data)
 
                 ret_seq = sample(net, input_data, grids, num_nodes, args, device=dev)
-                ret_seq = data_revert(ret_seq, first_values_dict)
+                ret_seq = data_revert(ret_seq, first_values)
 
                 # veh_ret_seq, _ = veh_ped_seperate(ret_seq, ids)
                 # veh_pred_seq, _ = veh_ped_seperate(pred_data, ids)
@@ -188,26 +188,16 @@ def main():
     parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
     parser.add_argument('--dset_tag', type=str, default='')
     parser.add_argument('--dset_feature', type=int, default=4)
+    parser.add_argument('--dset_lazy', action='store_true', default=False)
+    parser.add_argument('--dset_workers', type=int, default=0)
+    parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
     parser.add_argument('--frame_skip', type=int, default=2)
     parser.add_argument('--num_epochs', type=int, default=30)
 
     args = parser.parse_args()
 
-    loader_name = args.dset_name+'_loader.pth.tar'
-    if os.path.exists(loader_name):
-        assert os.path.isfile(loader_name)
-        state = torch.load(loader_name)
-        
-        train_loader = state['train']
-        test_loader = state['test']
-    else:
-        _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
-        _, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
-        
-        state = {}
-        state['train'] = train_loader
-        state['test'] = test_loader
-        torch.save(state, loader_name)
+    _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
+    _, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
 
     print(len(train_loader))
     print(len(test_loader))
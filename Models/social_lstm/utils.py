@@ -10,27 +10,14 @@ class WriteOnceDict(dict):
 			super(WriteOnceDict, self).__setitem__(key, value)
 
 def data_vectorize(data_seq):
-    first_value_dict = WriteOnceDict()
-    vectorized_seq = data_seq.clone()
-
-    num_nodes = data_seq.size(1)
-    for i, frame in enumerate(data_seq):
-        for node in range(num_nodes):
-            first_value_dict[node] = frame[node, :]
-            vectorized_seq[i, node, :] = frame[node, :]-first_value_dict[node]
-    
-    return vectorized_seq, first_value_dict
+    # every frame relative to frame 0 of every node, offsets (V, F) are the frame 0 values for data_revert
+    first_values = data_seq[0].clone()
 
+    return data_seq-first_values, first_values
 
-def data_revert(data_seq, first_value_dict):
-    reverted_seq = data_seq.clone()
 
-    num_nodes = data_seq.size(1)
-    for i, frame in enumerate(data_seq):
-        for node in range(num_nodes):
-            reverted_seq[i, node, :] = frame[node, :]+first_value_dict[node]
-    
-    return reverted_seq
+def data_revert(data_seq, first_values):
+    return data_seq+first_values.to(data_seq)
 
 
 def get_coef(outputs):
@@ -96,7 +96,7 @@ def exec_model(dataloader_train, dataloader_test, args):
                 batch_size = len(num2input_dict[num])
                 batch_input_data, batch_pred_data = torch.stack(num2input_dict[num]), torch.stack(num2pred_dict[num])
 
-                batch_input_data, first_values_dicts = data_vectorize(batch_input_data)
+                batch_input_data, first_values = data_vectorize(batch_input_data)
                 # inputs = data_feeder(batch_input_data)
                 inputs = batch_input_data[:, :, :, :2]
 
@@ -109,7 +109,7 @@ def exec_model(dataloader_train, dataloader_test, args):
                     batch_pred_data = batch_pred_data.to(dev)
                 
                 preds = net(inputs, As)
-                batch_ret_data = data_revert(preds[:, :, :, :2], first_values_dicts, dev)
+                batch_ret_data = data_revert(preds[:, :, :, :2], first_values, dev)
                 batch_ret_data = batch_ret_data[:, :, :, :2]
 
                 error = 0.0
@@ -164,6 +164,10 @@ def main():
     parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
     parser.add_argument('--dset_tag', type=str, default="NGSIM")
     parser.add_argument('--dset_feature', type=int, default=4)
+    parser.add_argument('--dset_lazy', action='store_true', default=False)
+    parser.add_argument('--dset_workers', type=int, default=0)
+    parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
+    parser.add_argument('--node_batch', action='store_true', default=False)
     parser.add_argument('--frame_skip', type=int, default=2)
     parser.add_argument('--num_epochs', type=int, default=100)
     parser.add_argument('--pretrain_epochs', type=int, default=0)
@@ -172,21 +176,8 @@ def main():
 
     args = parser.parse_args()
 
-    loader_name = args.dset_name+'_loader.pth.tar'
-    if os.path.exists(loader_name):
-        assert os.path.isfile(loader_name)
-        state = torch.load(loader_name)
-
-        train_loader = state['train']
-        test_loader = state['test']
-    else:
-        _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'), min_agent=args.min_agent_train)
-        _, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'), min_agent=args.min_agent_test)
-
-        state = {}
-        state['train'] = train_loader
-        state['test'] = test_loader
-        torch.save(state, loader_name)
+    _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'), min_agent=args.min_agent_train)
+    _, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'), min_agent=args.min_agent_test)
 
     print(len(train_loader))
     print(len(test_loader))
@@ -33,45 +33,15 @@ def data_feeder(batch_data):
 
 
 def data_vectorize(batch_data_seq):
-    batch_vectorized_seq = []
-    first_value_dicts = []
-    for data_seq in batch_data_seq:
-        first_value_dict = WriteOnceDict()
-        vectorized_seq = []
-
-        num_nodes = data_seq.size(1)
-        frame0 = data_seq[0, :]
-        for node in range(num_nodes):
-            first_value_dict[node] = frame0[node, :]
-        for i in range(1, len(data_seq)): #1 --> 0 so that all observe frame will be included (orginally exclude first 1) TONY
-            frame = data_seq[i]
-            vectorized_frame = torch.zeros(num_nodes, data_seq.size(-1))
-            for node in range(num_nodes):
-                vectorized_frame[node] = frame[node, :]-first_value_dict[node]
-            vectorized_seq.append(vectorized_frame)
-        batch_vectorized_seq.append(torch.stack(vectorized_seq))
-        first_value_dicts.append(first_value_dict)
-
-    return torch.stack(batch_vectorized_seq), first_value_dicts
-
-
-def data_revert(batch_data_seq, first_value_dicts, dev):
-    batch_reverted_seq = []
-
-    for i in range(len(batch_data_seq)):
-        data_seq = batch_data_seq[i]
-        first_value_dict = first_value_dicts[i]
-        reverted_seq = data_seq.clone()
-
-        num_nodes = data_seq.size(1)
-        for j, frame in enumerate(data_seq):
-            for node in range(num_nodes):
-                node_value = first_value_dict[node]
-                node_value = node_value.to(dev)
-                reverted_seq[j, node, :] = frame[node, :]+node_value[:2]
-        batch_reverted_seq.append(reverted_seq)
-
-    return torch.stack(batch_reverted_seq)
+    # frames 1..T-1 relative to frame 0 of every node, offsets (N, V, F) are the frame 0 values for data_revert
+    first_values = batch_data_seq[:, 0].clone()
+
+    return batch_data_seq[:, 1:]-first_values.unsqueeze(1), first_values
+
+
+def data_revert(batch_data_seq, first_values, dev):
+    # inverse of data_vectorize on the positions, batch_data_seq holds positions only
+    return batch_data_seq+first_values[:, :, :2].to(dev).unsqueeze(1)
 
 
 def output_activation(x):
@@ -98,7 +98,7 @@ def exec_model(dataloader_train, dataloader_test, args):
 				g = Graph(input_data[0, :, :])
 				A = g.normalize_undigraph()
 
-				input_data, first_values_dict = data_vectorize(input_data)
+				input_data, first_values = data_vectorize(input_data)
 
 				inputs = input_data[:, :, :2]
 				ngbrs, ngbrs_A = data_ngbrs(inputs, A)
@@ -110,7 +110,7 @@ def exec_model(dataloader_train, dataloader_test, args):
 					pred_data = pred_data.to(dev)
 
 				preds = net(inputs, ngbrs, ngbrs_A)
-				ret_data = data_revert(preds[:, :, :2], first_values_dict)
+				ret_data = data_revert(preds[:, :, :2], first_values)
 
 				error = displacement_error(ret_data[:15, :, :], pred_data[:15, :, :2])
 				err_batch += error.item()
@@ -153,27 +153,17 @@ def main():
 	parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
 	parser.add_argument('--dset_tag', type=str, default="NGSIM")
 	parser.add_argument('--dset_feature', type=int, default=4)
+	parser.add_argument('--dset_lazy', action='store_true', default=False)
+	parser.add_argument('--dset_workers', type=int, default=0)
+	parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
 	parser.add_argument('--frame_skip', type=int, default=2)
 	parser.add_argument('--num_epochs', type=int, default=100)
 	parser.add_argument('--pretrain_epochs', type=int, default=0)
 
 	args = parser.parse_args()
 
-	loader_name = args.dset_name+'_loader.pth.tar'
-	if os.path.exists(loader_name):
-		assert os.path.isfile(loader_name)
-		state = torch.load(loader_name)
-
-		train_loader = state['train']
-		test_loader = state['test']
-	else:
-		_, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
-		_, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
-
-		state = {}
-		state['train'] = train_loader
-		state['test'] = test_loader
-		torch.save(state, loader_name)
+	_, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
+	_, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
 
 	print(len(train_loader))
 	print(len(test_loader))
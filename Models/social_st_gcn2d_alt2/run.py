@@ -94,7 +94,7 @@ def exec_model(dataloader_train, dataloader_test, args):
 				masks = data_masks(num_node_list[i], args.grid_size, args.enc_hidden_size)
 				input_data, pred_data = input_data_list[i], pred_data_list[i]
 
-				input_data, first_values_dict = data_vectorize(input_data)
+				input_data, first_values = data_vectorize(input_data)
 
 				inputs = input_data[:, :, :2]
 				ngbrs = data_ngbrs(inputs)
@@ -106,10 +106,10 @@ def exec_model(dataloader_train, dataloader_test, args):
 					pred_data = pred_data.to(dev)
 
 				preds = net(inputs, ngbrs, masks)
-				ret_data = data_revert(preds[:, :, :2], first_values_dict)
+				ret_data = data_revert(preds[:, :, :2], first_values)
 
 				error = displacement_error(ret_data[:, :, :], pred_data[:, :, :2])[14]
-                                err_batch += error.item()
+				err_batch += error.item()
 
 			t_end = time.time()
 			err_batch /= batch_size
@@ -150,27 +150,17 @@ def main():
 	parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
 	parser.add_argument('--dset_tag', type=str, default="NGSIM")
 	parser.add_argument('--dset_feature', type=int, default=4)
+	parser.add_argument('--dset_lazy', action='store_true', default=False)
+	parser.add_argument('--dset_workers', type=int, default=0)
+	parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
 	parser.add_argument('--frame_skip', type=int, default=2)
 	parser.add_argument('--num_epochs', type=int, default=100)
 	parser.add_argument('--pretrain_epochs', type=int, default=0)
 
 	args = parser.parse_args()
 
-	loader_name = args.dset_name+'_loader.pth.tar'
-	if os.path.exists(loader_name):
-		assert os.path.isfile(loader_name)
-		state = torch.load(loader_name)
-
-		train_loader = state['train']
-		test_loader = state['test']
-	else:
-		_, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
-		_, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
-
-		state = {}
-		state['train'] = train_loader
-		state['test'] = test_loader
-		torch.save(state, loader_name)
+	_, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
+	_, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
 
 	print(len(train_loader))
 	print(len(test_loader))
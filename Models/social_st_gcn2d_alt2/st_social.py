@@ -58,7 +58,7 @@ class STSocialModel(nn.Module):
 
 		soc_enc = torch.zeros_like(masks).float()
 		soc_enc = soc_enc.masked_scatter_(masks, ngbrs)
-                soc_enc = soc_enc.permute(0, 3, 2, 1)
+		soc_enc = soc_enc.permute(0, 3, 2, 1)
 
 		soc_enc = self.pool(self.convs(soc_enc))
 		soc_enc = soc_enc.view(-1, self.soc_size)
@@ -5,7 +5,7 @@ import torch.optim as optim
 import argparse
 import time
 from st_gcn2d import STGCN2DModel
-from graph import Graph
+from graph import Graph, SparseGraph
 from utils import *
 
 import os
@@ -13,6 +13,21 @@ import sys
 sys.path.append(os.path.join(os.getcwd(), '..', '..', 'DataSet'))
 from trajectories import *
 from loader import *
+sys.path.append(os.path.join(os.getcwd(), '..', 'common'))
+from losses import masked_nll_loss, masked_mse_loss, masked_displacement_error
+
+
+def batch_groups(batch, padded):
+    # (input, pred, node_mask) stacks of one batch: one per node count, or with --dset_padded
+    # the whole padded batch at once, node_mask is None for the unpadded stacks
+    if padded:
+        input_data, pred_data, _, node_mask, _ = batch
+        return [(input_data, pred_data, node_mask)]
+
+    input_data_list, pred_data_list, _, num_nodes_list = batch
+    num2input_dict, num2pred_dict = data_batch(input_data_list, pred_data_list, num_nodes_list)
+
+    return [(torch.stack(num2input_dict[num]), torch.stack(num2pred_dict[num]), None) for num in num2input_dict.keys()]
 
 
 def exec_model(dataloader_train, dataloader_test, args):
@@ -20,7 +35,7 @@ def exec_model(dataloader_train, dataloader_test, args):
     if args.use_cuda:
         dev = torch.device('cuda:'+str(args.gpu))
 
-    net = STGCN2DModel(args.pred_len, args.in_channels, args.spatial_kernel_size, args.temporal_kernel_size, args.enc_hidden_size, args.dec_hidden_size, args.out_dim, args.gru, args.use_cuda, dev, dropout=args.dropout) # , residual=args.residual TONY Change
+    net = STGCN2DModel(args.pred_len, args.in_channels, args.spatial_kernel_size, args.temporal_kernel_size, args.enc_hidden_size, args.dec_hidden_size, args.out_dim, args.gru, args.use_cuda, dev, dropout=args.dropout, sparse=args.graph_radius > 0) # , residual=args.residual TONY Change
     optimizer = optim.Adam(net.parameters(), lr=args.lr)
 
     err_epochs = []
@@ -32,37 +47,44 @@ def exec_model(dataloader_train, dataloader_test, args):
 
         num_batch = 0
         for batch in dataloader_train:
-            input_data_list, pred_data_list, _, num_nodes_list = batch
-            num2input_dict, num2pred_dict = data_batch(input_data_list, pred_data_list, num_nodes_list)
-            
-            for num in num2input_dict.keys():
+            for batch_input_data, batch_pred_data, node_mask in batch_groups(batch, args.dset_padded):
                 t_start = time.time()
-                batch_size = len(num2input_dict[num])
-                batch_input_data, batch_pred_data = torch.stack(num2input_dict[num]), torch.stack(num2pred_dict[num])
+                batch_size = len(batch_input_data)
 
                 batch_data = torch.cat((batch_input_data, batch_pred_data), dim=1)
-                batch_data, _ = data_vectorize(batch_data)
+                batch_data, first_values = data_vectorize(batch_data)
                 batch_input_data, batch_pred_data = batch_data[:, :-args.pred_len, :, :], batch_data[:, -args.pred_len:, :, :]
 
                 # inputs = data_feeder(batch_input_data)
                 inputs = batch_input_data[:, :, :, :2]
 
-                g = Graph(batch_input_data[:, 0, :, :])
+                if args.graph_radius > 0:
+                    positions = batch_input_data[:, 0, :, :2]+first_values[:, :, :2]  # absolute positions of the graph frame
+                    g = SparseGraph(batch_input_data[:, 0, :, :], args.graph_radius, node_mask, positions)
+                else:
+                    g = Graph(batch_input_data[:, 0, :, :], node_mask)
                 As = g.normalize_undigraph()
 
                 if args.use_cuda:
                     inputs = inputs.to(dev)
                     As = As.to(dev)
                     batch_pred_data = batch_pred_data.to(dev)
+                    node_mask = node_mask.to(dev) if node_mask is not None else None
                 
-                preds = net(inputs, As)
+                preds = net(inputs, As, node_mask)
 
                 loss = 0.0
-                for i in range(len(preds)):
+                if node_mask is not None:
                     if epoch < args.pretrain_epochs:
-                        loss += mse_loss(preds[i], batch_pred_data[i])
+                        loss = masked_mse_loss(preds, batch_pred_data, node_mask)
                     else:
-                        loss += nll_loss(preds[i], batch_pred_data[i])
+                        loss = masked_nll_loss(preds, batch_pred_data, node_mask)
+                else:
+                    for i in range(len(preds)):
+                        if epoch < args.pretrain_epochs:
+                            loss += mse_loss(preds[i], batch_pred_data[i])
+                        else:
+                            loss += nll_loss(preds[i], batch_pred_data[i])
                 loss_batch = loss.item() / batch_size
                 loss /= batch_size
 
@@ -88,34 +110,39 @@ def exec_model(dataloader_train, dataloader_test, args):
 
         num_batch = 0
         for batch in dataloader_test:
-            input_data_list, pred_data_list, _, num_nodes_list = batch
-            num2input_dict, num2pred_dict = data_batch(input_data_list, pred_data_list, num_nodes_list)
-            for num in num2input_dict.keys():
+            for batch_input_data, batch_pred_data, node_mask in batch_groups(batch, args.dset_padded):
                 t_start = time.time()
                 err_batch = 0.0
-                batch_size = len(num2input_dict[num])
-                batch_input_data, batch_pred_data = torch.stack(num2input_dict[num]), torch.stack(num2pred_dict[num])
+                batch_size = len(batch_input_data)
 
-                batch_input_data, first_values_dicts = data_vectorize(batch_input_data)
+                batch_input_data, first_values = data_vectorize(batch_input_data)
                 # inputs = data_feeder(batch_input_data)
                 inputs = batch_input_data[:, :, :, :2]
 
-                g = Graph(batch_input_data[:, 0, :, :])
+                if args.graph_radius > 0:
+                    positions = batch_input_data[:, 0, :, :2]+first_values[:, :, :2]  # absolute positions of the graph frame
+                    g = SparseGraph(batch_input_data[:, 0, :, :], args.graph_radius, node_mask, positions)
+                else:
+                    g = Graph(batch_input_data[:, 0, :, :], node_mask)
                 As = g.normalize_undigraph()
 
                 if args.use_cuda:
                     inputs = inputs.to(dev)
                     As = As.to(dev)
                     batch_pred_data = batch_pred_data.to(dev)
+                    node_mask = node_mask.to(dev) if node_mask is not None else None
                 
-                preds = net(inputs, As)
-                batch_ret_data = data_revert(preds[:, :, :, :2], first_values_dicts, dev)
+                preds = net(inputs, As, node_mask)
+                batch_ret_data = data_revert(preds[:, :, :, :2], first_values, dev)
                 batch_ret_data = batch_ret_data[:, :, :, :2]
 
                 error = 0.0
-                for i in range(len(preds)):
-                    error += displacement_error(batch_ret_data[i][:15, :, :], batch_pred_data[i][:15, :, :2])
-                    # error += final_displacement_error(batch_ret_data[i][-1], batch_pred_data[i][-1][:, :2])
+                if node_mask is not None:
+                    error = masked_displacement_error(batch_ret_data[:, :15], batch_pred_data[:, :15, :, :2], node_mask)
+                else:
+                    for i in range(len(preds)):
+                        error += displacement_error(batch_ret_data[i][:15, :, :], batch_pred_data[i][:15, :, :2])
+                        # error += final_displacement_error(batch_ret_data[i][-1], batch_pred_data[i][-1][:, :2])
                 err_batch = error.item() / batch_size
 
                 t_end = time.time()
@@ -155,30 +182,23 @@ def main():
     parser.add_argument('--gru', action='store_true', default=False)
     parser.add_argument('--use_cuda', action='store_true', default=True)
     parser.add_argument('--gpu', type=int, default=0)
+    parser.add_argument('--graph_radius', type=float, default=0.0)  # > 0: sparse graph of the node pairs within this radius
     parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
     parser.add_argument('--dset_tag', type=str, default="NGSIM")
     parser.add_argument('--dset_feature', type=int, default=4)
+    parser.add_argument('--dset_lazy', action='store_true', default=False)
+    parser.add_argument('--dset_workers', type=int, default=0)
+    parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
+    parser.add_argument('--node_batch', action='store_true', default=False)
+    parser.add_argument('--dset_padded', action='store_true', default=False)  # one padded forward pass per batch, masked losses
     parser.add_argument('--frame_skip', type=int, default=2)
     parser.add_argument('--num_epochs', type=int, default=30)
     parser.add_argument('--pretrain_epochs', type=int, default=0)
 
     args = parser.parse_args()
 
-    loader_name = args.dset_name+'_loader.pth.tar'
-    if os.path.exists(loader_name):
-        assert os.path.isfile(loader_name)
-        state = torch.load(loader_name)
-
-        train_loader = state['train']
-        test_loader = state['test']
-    else:
-        _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
-        _, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
-
-        state = {}
-        state['train'] = train_loader
-        state['test'] = test_loader
-        torch.save(state, loader_name)
+    _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
+    _, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
 
     print(len(train_loader))
     print(len(test_loader))
@@ -33,15 +33,37 @@ class GraphConvNet2D(nn.Module):
         return x.contiguous(), A
 
 
+class SparseGraphConvNet2D(GraphConvNet2D):
+    # message passing over a SparseAdjacency, same result as GraphConvNet2D on the dense graph
+    # cost grows with the number of edges instead of V*V
+    def forward(self, x, A):
+        assert A.weights.size(0) == self.s_kernel_size
+
+        x = self.conv(x)
+
+        n, kc, t, v = x.size()
+        assert A.num_nodes == n*v
+        x = x.view(n, self.s_kernel_size, kc // self.s_kernel_size, t, v)
+        x = x.permute(1, 0, 4, 2, 3).reshape(self.s_kernel_size*n*v, -1)  # row k*n*v+node
+
+        x = torch.sparse.mm(A.matrix, x)
+        x = x.view(n, v, kc // self.s_kernel_size, t).permute(0, 2, 3, 1)
+
+        return x.contiguous(), A
+
+
 class ST_GCN2D(nn.Module):
-    def __init__(self, in_channels, out_channels, kernel_size, stride=1, dropout=0, residual=True):
+    def __init__(self, in_channels, out_channels, kernel_size, stride=1, dropout=0, residual=True, sparse=False):
         super(ST_GCN2D, self).__init__()
 
         assert len(kernel_size) == 2
         assert kernel_size[0] % 2 == 1
         padding = ((kernel_size[0]-1) // 2, 0)
 
-        self.gcn = GraphConvNet2D(in_channels, out_channels, kernel_size[1])
+        if sparse:
+            self.gcn = SparseGraphConvNet2D(in_channels, out_channels, kernel_size[1])
+        else:
+            self.gcn = GraphConvNet2D(in_channels, out_channels, kernel_size[1])
 
         self.tcn = nn.Sequential(
             nn.BatchNorm2d(out_channels),
@@ -75,7 +97,16 @@ class ST_GCN2D(nn.Module):
         self.relu = nn.ReLU()
 
     
-    def forward(self, x, A):
+    def forward(self, x, A, node_mask=None):
+        if node_mask is not None:
+            # padded batches: the tcn and the residual branch act on every node alone, they only get the real nodes
+            # so their BatchNorm statistics are the ones of the same scenes without padding
+            res = self.residual(pack_nodes(x, node_mask))
+            x, A = self.gcn(x, A)
+            x = self.relu(self.tcn(pack_nodes(x, node_mask))+res)
+
+            return unpack_nodes(x, node_mask), A
+
         res = self.residual(x)
         x, A = self.gcn(x, A)
         x = self.relu(self.tcn(x)+res)
@@ -83,6 +114,21 @@ class ST_GCN2D(nn.Module):
         return x, A
 
 
+def pack_nodes(x, node_mask):
+    # x size: (N, C, T, V_max), node_mask (N, V_max) -> (1, C, T, R) with the R real nodes side by side
+    return x.permute(1, 2, 0, 3)[:, :, node_mask].unsqueeze(0)
+
+
+def unpack_nodes(x, node_mask):
+    # inverse of pack_nodes, padded nodes are 0
+    _, C, T, _ = x.size()
+    N, V = node_mask.size()
+    out = x.new_zeros(C, T, N, V)
+    out[:, :, node_mask] = x[0]
+
+    return out.permute(2, 0, 1, 3).contiguous()
+
+
 class STGCN2DModel(nn.Module):
     def __init__(self, pred_len, in_channels, spatial_kernel_size, temporal_kernel_size, enc_hidden_size, dec_hidden_size, out_dim, gru=False, use_cuda=True, device=None, **kwargs):
         super(STGCN2DModel, self).__init__()
@@ -122,7 +168,9 @@ class STGCN2DModel(nn.Module):
             self.to(device)
 
 
-    def forward(self, x, A):
+    def forward(self, x, A, node_mask=None):
+        # node_mask (N, V_max) for padded batches, the graph A must not link padded nodes (Graph / SparseGraph node_mask)
+        # the encoder and decoder take the nodes of a scene as their batch, padded nodes do not change the real ones
         N, T, V, _ = x.size()
         o_enc = torch.zeros(N, T, V, self.enc_dim).to(self.device)
         o_pred = torch.zeros(N, self.pred_len, V, self.out_dim).to(self.device)
@@ -134,7 +182,7 @@ class STGCN2DModel(nn.Module):
         x = o_enc.permute(0, 3, 1, 2).contiguous()
 
         for gcn in self.st_gcn2d_modules:
-            x, _ = gcn(x, A)
+            x, _ = gcn(x, A, node_mask)
         
         _, C, T, V = x.size()
         x = x.permute(0, 3, 1, 2).contiguous()
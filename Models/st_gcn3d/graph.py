@@ -1,4 +1,9 @@
 import torch
+import os
+import sys
+sys.path.append(os.path.join(os.getcwd(), '..', 'common'))
+from graph_ops import ttc_weights, normalize_adjacency
+
 
 class Graph:
     # batch_templates size: (N, V, 4), 4 dims are: x, y, vx, vy
@@ -20,32 +25,94 @@ class Graph:
         self.A[:, 0] = torch.eye(V).repeat(N, 1, 1)
 
         # s_kernel == 1
-        for num in range(N):
-            for i in range(V):
-                for j in range(i+1, V):
-                    xi, yi, vxi, vyi = batch_templates[num, i]
-                    xj, yj, vxj, vyj = batch_templates[num, j]
-                    a, b, c, d = (xi-xj), (yi-yj), (vxi-vxj), (vyi-vyj)
-                    tmin = -(a*c+b*d)/(c**2+d**2).ceil().item()
-                    self.A[num, 1, i, j] = 1.0 / tmin if tmin > 0.0 else 0.0
-                    self.A[num, 1, j, i] = self.A[num, 1, i, j]
+        self.A[:, 1] = ttc_weights(batch_templates)
     
 
     def normalize_undigraph(self, alpha=1e-3):
-        DADs = torch.zeros(self.A.size())
-        DADs.requires_grad = False
+        return normalize_adjacency(self.A, alpha)
 
-        N = self.A.size()[0]
-        V = self.A.size()[-1]
 
-        for num in range(N):
-            for k in range(self.s_kernel):
-                A = self.A[num, k]
-                D1 = torch.sum(A, 0)+alpha
-                Dn = torch.zeros(V, V)
-                for i in range(V):
-                    Dn[i, i] = D1[i]**(-0.5)
-                DAD = Dn.mm(A).mm(Dn)
-                DADs[num, k] = DAD
-        
-        return DADs
+def radius_edges(positions, radius):
+    # positions size: (N, V, 2) -> (src, dst) over the N*V flattened nodes, every ordered pair i != j
+    # of the same scene closer than radius; cell list: nodes are bucketed into radius sized grid cells
+    # and each node is only compared with the nodes of its own and the 8 surrounding cells
+    N, V, _ = positions.size()
+    pos = positions.reshape(N*V, 2)
+    scene = torch.arange(N).repeat_interleave(V)
+
+    cells = torch.floor(pos/radius).long()
+    cells = cells-cells.min(0)[0]+1  # empty ring around the occupied cells, neighbour keys never wrap
+    width = cells.max(0)[0]+2
+    keys = (scene*width[0]+cells[:, 0])*width[1]+cells[:, 1]
+    sorted_keys, order = torch.sort(keys)
+
+    src, dst = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            target = keys+dx*width[1]+dy
+            lo = torch.searchsorted(sorted_keys, target)
+            counts = torch.searchsorted(sorted_keys, target, right=True)-lo
+            starts = torch.cumsum(counts, 0)-counts
+            rank = torch.arange(int(counts.sum()))-starts.repeat_interleave(counts)
+            src.append(torch.arange(N*V).repeat_interleave(counts))
+            dst.append(order[lo.repeat_interleave(counts)+rank])
+    src, dst = torch.cat(src), torch.cat(dst)
+
+    keep = (src != dst) & (((pos[src]-pos[dst])**2).sum(-1) <= radius**2)
+
+    return src[keep], dst[keep]
+
+
+class SparseAdjacency:
+    # COO adjacency of a batch of graphs: edges (2, E) index the N*V flattened nodes, weights (s_kernel, E)
+    def __init__(self, edges, weights, num_nodes):
+        self.edges = edges
+        self.weights = weights
+        self.num_nodes = num_nodes
+
+        # all kernels as one (num_nodes, s_kernel*num_nodes) sparse operator: row dst, column k*num_nodes+src
+        K = weights.size(0)
+        src, dst = edges
+        index = torch.stack((dst.repeat(K), (torch.arange(K).to(src).unsqueeze(1)*num_nodes+src).reshape(-1)))
+        self.matrix = torch.sparse_coo_tensor(index, weights.reshape(-1), (num_nodes, K*num_nodes)).coalesce()
+
+
+    def to(self, device):
+        return SparseAdjacency(self.edges.to(device), self.weights.to(device), self.num_nodes)
+
+
+class SparseGraph:
+    # batch_templates size: (N, V, 4), 4 dims are: x, y, vx, vy
+    # same kernels as Graph, kernel 1 only keeps the pairs within radius, edges with no weight are dropped
+    # positions (N, V, 2) are the absolute positions of the radius search, the templates are only used for the weights:
+    # vectorized templates (offsets from frame 0, as data_vectorize) would link the nodes that move alike
+    def __init__(self, batch_templates, radius, positions=None):
+        N, V, C = batch_templates.size()
+
+        self.s_kernel = 2
+        self.num_nodes = N*V
+
+        self.edges(batch_templates, radius, positions)
+
+
+    def edges(self, batch_templates, radius, positions=None):
+        templates = batch_templates.reshape(self.num_nodes, -1)
+        src, dst = radius_edges(batch_templates[..., :2] if positions is None else positions, radius)
+
+        w = ttc_weights(torch.stack((templates[src], templates[dst]), dim=1))[:, 0, 1]
+        src, dst, w = src[w != 0.0], dst[w != 0.0], w[w != 0.0]
+
+        # s_kernel == 0 on the self loops, s_kernel == 1 on the neighbour pairs
+        nodes = torch.arange(self.num_nodes)
+        self.E = torch.stack((torch.cat((nodes, src)), torch.cat((nodes, dst))))
+        self.W = torch.zeros(self.s_kernel, self.E.size(1))
+        self.W[0, :self.num_nodes] = 1.0
+        self.W[1, self.num_nodes:] = w
+
+
+    def normalize_undigraph(self, alpha=1e-3):
+        # D^-1/2 A D^-1/2 on the edge list, D is the column sum of A plus alpha as in normalize_adjacency
+        src, dst = self.E
+        Dn = (torch.zeros(self.s_kernel, self.num_nodes).index_add_(1, dst, self.W)+alpha)**(-0.5)
+
+        return SparseAdjacency(self.E, Dn[:, src]*self.W*Dn[:, dst], self.num_nodes)
@@ -5,7 +5,7 @@ import torch.optim as optim
 import argparse
 import time
 from st_gcn3d import STGCN3DModel
-from graph import Graph
+from graph import Graph, SparseGraph
 from utils import *
 
 import os
@@ -20,7 +20,7 @@ def exec_model(dataloader_train, dataloader_test, args):
 	if args.use_cuda:
 		dev = torch.device('cuda:'+str(args.gpu))
 
-	net = STGCN3DModel(args.pred_len, args.in_channels, args.spatial_kernel, args.temporal_kernel, args.dec_hidden_size, args.out_dim, args.gru, args.use_cuda, dev, dropout=args.dropout, residual=args.residual)
+	net = STGCN3DModel(args.pred_len, args.in_channels, args.spatial_kernel, args.temporal_kernel, args.dec_hidden_size, args.out_dim, args.gru, args.use_cuda, dev, dropout=args.dropout, residual=args.residual, sparse=args.graph_radius > 0)
 	optimizer = optim.Adam(net.parameters(), lr=args.lr)
 
 	err_epochs = []
@@ -39,12 +39,16 @@ def exec_model(dataloader_train, dataloader_test, args):
 				batch_input_data, batch_pred_data = torch.stack(num2input_dict[num]), torch.stack(num2pred_dict[num])
 
 				batch_data = torch.cat((batch_input_data, batch_pred_data), dim=1)
-				batch_data, _ = data_vectorize(batch_data)
+				batch_data, first_values = data_vectorize(batch_data)
 				batch_input_data, batch_pred_data = batch_data[:, :-args.pred_len, :, :], batch_data[:, -args.pred_len:, :, :]
 
-				inputs = data_feeder(batch_input_data)
+				inputs = node_feeder(batch_input_data)
 
-				g = Graph(batch_input_data[:, 0, :, :])
+				if args.graph_radius > 0:
+					positions = batch_input_data[:, 0, :, :2]+first_values[:, :, :2]  # absolute positions of the graph frame
+					g = SparseGraph(batch_input_data[:, 0, :, :], args.graph_radius, positions=positions)
+				else:
+					g = Graph(batch_input_data[:, 0, :, :])
 				As = g.normalize_undigraph()
 
 				if args.use_cuda:
@@ -92,10 +96,14 @@ def exec_model(dataloader_train, dataloader_test, args):
 				batch_size = len(num2input_dict[num])
 				batch_input_data, batch_pred_data = torch.stack(num2input_dict[num]), torch.stack(num2pred_dict[num])
 				
-				batch_input_data, first_value_dicts = data_vectorize(batch_input_data)
-				inputs = data_feeder(batch_input_data)
-
-				g = Graph(batch_input_data[:, 0, :, :])
+				batch_input_data, first_values = data_vectorize(batch_input_data)
+				inputs = node_feeder(batch_input_data)
+
+				if args.graph_radius > 0:
+					positions = batch_input_data[:, 0, :, :2]+first_values[:, :, :2]  # absolute positions of the graph frame
+					g = SparseGraph(batch_input_data[:, 0, :, :], args.graph_radius, positions=positions)
+				else:
+					g = Graph(batch_input_data[:, 0, :, :])
 				As = g.normalize_undigraph()
 
 				if args.use_cuda:
@@ -105,7 +113,7 @@ def exec_model(dataloader_train, dataloader_test, args):
 
 				pred_outs = net(inputs, As)
 
-				pred_rets = data_revert(pred_outs, first_value_dicts)
+				pred_rets = data_revert(pred_outs, first_values)
 				pred_rets = pred_rets[:, :, :, :2]
 
 				error = 0.0
@@ -148,30 +156,22 @@ def main():
 	parser.add_argument('--gru', action='store_true', default=True)
 	parser.add_argument('--use_cuda', action='store_true', default=True)
 	parser.add_argument('--gpu', type=int, default=3)
+	parser.add_argument('--graph_radius', type=float, default=0.0)  # > 0: sparse graph of the node pairs within this radius
 	parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
 	parser.add_argument('--dset_tag', type=str, default='')
 	parser.add_argument('--dset_feature', type=int, default=4)
+	parser.add_argument('--dset_lazy', action='store_true', default=False)
+	parser.add_argument('--dset_workers', type=int, default=0)
+	parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
+	parser.add_argument('--node_batch', action='store_true', default=False)
 	parser.add_argument('--frame_skip', type=int, default=2)
 	parser.add_argument('--num_epochs', type=int, default=400)
 	parser.add_argument('--pretrain_epochs', type=int, default=0)
 
 	args = parser.parse_args()
 
-	loader_name = args.dset_name+'_loader.pth.tar'
-	if os.path.exists(loader_name):
-		assert os.path.isfile(loader_name)
-		state = torch.load(loader_name)
-		
-		train_loader = state['train']
-		test_loader = state['test']
-	else:
-		_, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
-		_, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
-		
-		state = {}
-		state['train'] = train_loader
-		state['test'] = test_loader
-		torch.save(state, loader_name)
+	_, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
+	_, test_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'test'))
 
 	print(len(train_loader))
 	print(len(test_loader))
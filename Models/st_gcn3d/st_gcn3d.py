@@ -1,8 +1,13 @@
 import torch
 import torch.nn as nn
 
+import os
+import sys
+
 from graph import *
 from utils import *
+sys.path.append(os.path.join(os.getcwd(), '..', 'common'))
+from node_conv import node_terms, node_graph_conv
 
 class GraphConvNet3D(nn.Module):
     def __init__(self, in_channels, out_channels, s_kernel_size=1, t_kernel_size=1, t_stride=1, t_padding=0, t_dilation=1, bias=True):
@@ -20,6 +25,10 @@ class GraphConvNet3D(nn.Module):
     def forward(self, x, A):
         assert A.size(1) == self.s_kernel_size
 
+        if x.dim() == 4:
+            # node inputs from node_feeder, the pair tensor is never built
+            return node_graph_conv(self.conv, self.s_kernel_size, x, A), A
+
         x = self.conv(x)
 
         n, kc, t, u, v = x.size()
@@ -33,15 +42,57 @@ class GraphConvNet3D(nn.Module):
         return x.contiguous(), A
 
 
+class SparseGraphConvNet3D(GraphConvNet3D):
+    # message passing over a SparseAdjacency, same result as GraphConvNet3D on the dense graph
+    # only the aggregation over v is sparse, U*E instead of U*V*V per channel and frame: the pair activations
+    # (n, c, t, u, v) of the 3D model stay dense, so memory and the convs still grow with V*V
+    def forward(self, x, A):
+        assert A.weights.size(0) == self.s_kernel_size
+
+        if x.dim() == 4:
+            return self.forward_nodes(x, A)
+
+        x = self.conv(x)
+
+        n, kc, t, u, v = x.size()
+        assert A.num_nodes == n*v
+        x = x.view(n, self.s_kernel_size, kc // self.s_kernel_size, t, u, v)
+        x = x.permute(1, 0, 5, 2, 3, 4).reshape(self.s_kernel_size*n*v, -1)  # row k*n*v+node
+
+        x = torch.sparse.mm(A.matrix, x)
+        x = x.view(n, v, kc // self.s_kernel_size, t, u).permute(0, 2, 3, 4, 1)
+
+        return x.contiguous(), A
+
+
+    def forward_nodes(self, x, A):
+        x_u, x_v = node_terms(self.conv, self.s_kernel_size, x)
+
+        n, k, c, t, v = x_v.size()
+        assert A.num_nodes == n*v
+
+        # in-degree of every node per kernel, the column sums of the dense graph
+        degree = torch.sparse.mm(A.matrix, torch.eye(k).to(x).repeat_interleave(n*v, 0)).view(n, v, k)
+        x = torch.einsum('nkctu, nwk->nctuw', (x_u, degree))
+
+        x_v = torch.sparse.mm(A.matrix, x_v.permute(1, 0, 4, 2, 3).reshape(k*n*v, -1))
+        x = x+x_v.view(n, v, c, t).permute(0, 2, 3, 1).unsqueeze(3)
+
+        return x.contiguous(), A
+
+
 class ST_GCN3D(nn.Module):
-    def __init__(self, in_channels, out_channels, kernel_size, stride=1, dropout=0, residual=True):
+    def __init__(self, in_channels, out_channels, kernel_size, stride=1, dropout=0, residual=True, sparse=False):
         super(ST_GCN3D, self).__init__()
 
         assert len(kernel_size) == 2
         assert kernel_size[0] % 2 == 1
         padding = ((kernel_size[0]-1) // 2, 0, 0)
 
-        self.gcn = GraphConvNet3D(in_channels, out_channels, kernel_size[1])
+        if sparse:
+            self.gcn = SparseGraphConvNet3D(in_channels, out_channels, kernel_size[1])
+        else:
+            self.gcn = GraphConvNet3D(in_channels, out_channels, kernel_size[1])
 
         self.tcn = nn.Sequential(
             nn.BatchNorm3d(out_channels),
@@ -105,6 +156,7 @@ class STGCN3DModel(nn.Module):
             #ST_GCN3D(256, 256, kernel_size, stride=1, **kwargs),
             #ST_GCN3D(256, 256, kernel_size, stride=1, **kwargs)
         ))
+        self.data_pool = nn.AdaptiveAvgPool2d(1)
 
         #self.dec = nn.LSTM(256, dec_hidden_size)
         #if gru:
@@ -121,7 +173,12 @@ class STGCN3DModel(nn.Module):
 
     
     def forward(self, x, A):
-        N, C, T, U, V = x.size()
+        if x.dim() == 4:
+            # node inputs from node_feeder, the first layer pairs them up
+            N, C, T, V = x.size()
+            U = V
+        else:
+            N, C, T, U, V = x.size()
         o_pred = torch.zeros(N, self.pred_len, V, self.out_dim).to(self.device)
 
         #x = x.permute(0, 3, 4, 1, 2).contiguous()
@@ -137,8 +194,7 @@ class STGCN3DModel(nn.Module):
         _, C, T, _, _  = x.size()
         x = x.permute(0, 4, 1, 2, 3).contiguous()
         x = x.view(N*V, C, T, U)
-        data_pool = nn.AvgPool2d((T, U)).to(x)
-        x = data_pool(x)
+        x = self.data_pool(x)
         x = x.view(-1, V, C)
 
         # prediction
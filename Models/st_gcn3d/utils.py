@@ -35,44 +35,24 @@ def data_feeder(batch_data):
     return data
 
 
+def node_feeder(batch_data):
+    # (N, 2, T, V) positions, data_feeder without the (N, 4, T, V, V) pair tensor: the first ST_GCN3D layer pairs the nodes itself
+    return batch_data[:, :, :, :2].permute(0, 3, 1, 2).contiguous()
+
+
 def data_vectorize(batch_data_seq):
-    batch_vectorized_seq = []
-    first_value_dicts = []
-    for data_seq in batch_data_seq:
-        first_value_dict = WriteOnceDict()
-        vectorized_seq = []
-
-        num_nodes = data_seq.size(1)
-        frame0 = data_seq[0, :]
-        for node in range(num_nodes):
-            first_value_dict[node] = frame0[node, :]
-        for i in range(1, len(data_seq)):
-            frame = data_seq[i]
-            vectorized_frame = torch.zeros(num_nodes, data_seq.size(-1))
-            for node in range(num_nodes):
-                vectorized_frame[node] = frame[node, :]-first_value_dict[node]
-            vectorized_seq.append(vectorized_frame)
-        batch_vectorized_seq.append(torch.stack(vectorized_seq))
-        first_value_dicts.append(first_value_dict)
-
-    return torch.stack(batch_vectorized_seq), first_value_dicts
-
-
-def data_revert(batch_data_seq, first_value_dicts):
-    batch_reverted_seq = []
-
-    for i in range(len(batch_data_seq)):
-        data_seq = batch_data_seq[i]
-        first_value_dict = first_value_dicts[i]
-        reverted_seq = data_seq.clone()
-
-        num_nodes = data_seq.size(1)
-        for j, frame in enumerate(data_seq):
-            for node in range(num_nodes):
-                reverted_seq[j, node, :2] = frame[node, :2]+first_value_dict[node][:2].to(frame)
-        batch_reverted_seq.append(reverted_seq)
-
-    return torch.stack(batch_reverted_seq)
+    # frames 1..T-1 relative to frame 0 of every node, offsets (N, V, F) are the frame 0 values for data_revert
+    first_values = batch_data_seq[:, 0].clone()
+
+    return batch_data_seq[:, 1:]-first_values.unsqueeze(1), first_values
+
+
+def data_revert(batch_data_seq, first_values):
+    # inverse of data_vectorize on the positions, the other features are kept
+    reverted_seq = batch_data_seq.clone()
+    reverted_seq[..., :2] = batch_data_seq[..., :2]+first_values[:, :, :2].to(batch_data_seq).unsqueeze(1)
+
+    return reverted_seq
 
 
 def output_activation(x):
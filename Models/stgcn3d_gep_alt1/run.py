@@ -7,7 +7,7 @@ from sklearn.cluster import KMeans
 import argparse
 import time
 from stgcn3d_gep import STGCN3DGEPModel
-from graph import Graph
+from graph import normalized_seq
 from utils import *
 
 import os
@@ -61,9 +61,10 @@ def exec_model(dataloader_train, dataloader_test, args):
         num_batch = 0
 
         for batch in dataloader_train:
-            input_data_list, pred_data_list, _, num_node_list = batch
+            input_data_list, pred_data_list, _, num_node_list = batch[:4]
 
             num2input_dict, num2pred_dict = data_batch(input_data_list, pred_data_list, num_node_list)
+            num2graph_dict = graph_batch(batch[4], num_node_list) if args.dset_graphs else None
             for num in num2input_dict.keys():
                 t_start = time.time()
                 batch_size = len(num2input_dict[num])
@@ -73,14 +74,12 @@ def exec_model(dataloader_train, dataloader_test, args):
                 batch_data, _ = data_vectorize(batch_data)
                 batch_input_data, batch_pred_data = batch_data[:, :-args.pred_len, :, :], batch_data[:, -args.pred_len:, :, :]
 
-                inputs = data_feeder(batch_input_data)
+                inputs = node_feeder(batch_input_data)
 
-                As_seq = []
-                for i in range(args.obs_len+args.pred_len-1):
-                    g = Graph(batch_data[:, i, :, :])
-                    As = g.normalize_undigraph()
-                    As_seq.append(As)
-                As_seq = torch.stack(As_seq)
+                if args.dset_graphs:
+                    As_seq = torch.stack(num2graph_dict[num], dim=1)[:args.obs_len+args.pred_len-1]
+                else:
+                    As_seq = normalized_seq(batch_data, args.obs_len+args.pred_len-1)
                 As = As_seq[0]
 
                 obs_sentence_prob = obs_parse(batch_data, args.obs_len+args.pred_len-1, s_gae, As_seq, cluster_obj, args.nc, device=dev)
@@ -129,23 +128,22 @@ def exec_model(dataloader_train, dataloader_test, args):
         num_batch = 0
 
         for batch in dataloader_test:
-            input_data_list, pred_data_list, _, num_node_list = batch
+            input_data_list, pred_data_list, _, num_node_list = batch[:4]
 
             num2input_dict, num2pred_dict = data_batch(input_data_list, pred_data_list, num_node_list)
+            num2graph_dict = graph_batch(batch[4], num_node_list) if args.dset_graphs else None
             for num in num2input_dict.keys():
                 t_start = time.time()
                 batch_size = len(num2input_dict[num])
                 batch_input_data, batch_pred_data = torch.stack(num2input_dict[num]), torch.stack(num2pred_dict[num])
 
-                batch_input_data, first_value_dicts = data_vectorize(batch_input_data)
-                inputs = data_feeder(batch_input_data)
+                batch_input_data, first_values = data_vectorize(batch_input_data)
+                inputs = node_feeder(batch_input_data)
 
-                As_seq = []
-                for i in range(args.obs_len-1):
-                    g = Graph(batch_input_data[:, i, :, :])
-                    As = g.normalize_undigraph()
-                    As_seq.append(As)
-                As_seq = torch.stack(As_seq)
+                if args.dset_graphs:
+                    As_seq = torch.stack(num2graph_dict[num], dim=1)[:args.obs_len-1]
+                else:
+                    As_seq = normalized_seq(batch_input_data, args.obs_len-1)
                 As = As_seq[0]
 
                 obs_sentence_prob = obs_parse(batch_input_data, args.obs_len-1, s_gae, As_seq, cluster_obj, args.nc, device=dev)
@@ -164,7 +162,7 @@ def exec_model(dataloader_train, dataloader_test, args):
                 
                 pred_outs = stgcn_gep(inputs, As, one_hots)
 
-                pred_rets = data_revert(pred_outs, first_value_dicts)
+                pred_rets = data_revert(pred_outs, first_values)
                 pred_rets = pred_rets[:, :, :, :2]
 
                 error = 0.0
@@ -212,11 +210,19 @@ def main():
     parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
     parser.add_argument('--dset_tag', type=str, default='')
     parser.add_argument('--dset_feature', type=int, default=4)
+    parser.add_argument('--dset_lazy', action='store_true', default=False)
+    parser.add_argument('--dset_workers', type=int, default=0)
+    parser.add_argument('--dset_graphs', dest='dset_graphs', action='store_true')
+    parser.add_argument('--no_dset_graphs', dest='dset_graphs', action='store_false')
+    parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
+    parser.add_argument('--node_batch', action='store_true', default=False)
     parser.add_argument('--frame_skip', type=int, default=2)
     parser.add_argument('--num_epochs', type=int, default=300)
     parser.add_argument('--pretrain_epochs', type=int, default=0)
     parser.add_argument('--saved_name', type=str, default='NGSIM_GAEC3_GEP.pth.tar')
 
+    parser.set_defaults(dset_graphs=True)
+
     args = parser.parse_args()
 
     _, train_loader = data_loader(args, os.path.join(os.getcwd(), '..', '..', 'DataSet', 'dataset', args.dset_name, args.dset_tag, 'train'))
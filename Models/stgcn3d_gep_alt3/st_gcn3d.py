@@ -1,8 +1,13 @@
 import torch
 import torch.nn as nn
 
+import os
+import sys
+
 from graph import *
 from utils import *
+sys.path.append(os.path.join(os.getcwd(), '..', 'common'))
+from node_conv import node_graph_conv
 
 class GraphConvNet3D(nn.Module):
     def __init__(self, in_channels, out_channels, s_kernel_size=1, t_kernel_size=1, t_stride=1, t_padding=0, t_dilation=1, bias=True):
@@ -20,6 +25,10 @@ class GraphConvNet3D(nn.Module):
     def forward(self, x, A):
         assert A.size(1) == self.s_kernel_size
 
+        if x.dim() == 4:
+            # node inputs from node_feeder, the pair tensor is never built
+            return node_graph_conv(self.conv, self.s_kernel_size, x, A), A
+
         x = self.conv(x)
 
         n, kc, t, u, v = x.size()
@@ -101,10 +110,16 @@ class STGCN3DModule(nn.Module):
            #ST_GCN3D(cell_input_dim, cell_input_dim, kernel_size, stride=1, dropout=dropout, residual=residual),
            #ST_GCN3D(cell_input_dim, cell_input_dim, kernel_size, stride=1, dropout=dropout, residual=residual)
         ))
+        self.data_pool = nn.AdaptiveAvgPool2d(1)
 
     
     def forward(self, x, A):
-        N, C, T, U, V = x.size()
+        if x.dim() == 4:
+            # node inputs from node_feeder, the first layer pairs them up
+            N, C, T, V = x.size()
+            U = V
+        else:
+            N, C, T, U, V = x.size()
         # x = x.permute(0, 3, 4, 1, 2).contiguous()
         # x = x.view(N, U*V*C, T)
         # data_bn = nn.BatchNorm1d(U*V*C, affine=False).to(x)
@@ -119,8 +134,7 @@ class STGCN3DModule(nn.Module):
         x = x.permute(0, 4, 1, 2, 3).contiguous()
         x = x.view(N*V, C, T, U)
 
-        data_pool = nn.AvgPool2d((T, U)).to(x)
-        x = data_pool(x)
+        x = self.data_pool(x)
         x = x.view(-1, V, C)
 
         return x
@@ -146,7 +146,7 @@ class STGCN3DGEPModel(nn.Module):
 
     
     def forward(self, x, A, one_hots_c_obs_seq, one_hots_c_pred_seq):
-        N, _, _, _, V = x.size()
+        N, V = x.size(0), x.size(-1)
         pred_outs = torch.zeros(N, self.pred_len, V, self.out_dim).to(self.device)
 
         x = self.emb(x, one_hots_c_obs_seq)
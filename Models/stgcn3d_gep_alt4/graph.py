@@ -1,4 +1,9 @@
 import torch
+import os
+import sys
+sys.path.append(os.path.join(os.getcwd(), '..', 'common'))
+from graph_ops import ttc_weights, normalize_adjacency
+
 
 class Graph:
     # templates size: (V, 4), 4 dims are: x, y, vx, vy
@@ -18,27 +23,29 @@ class Graph:
         self.A[0, :self.num_nodes, :self.num_nodes] = torch.eye(self.num_nodes)
 
         # s_kernel == 1
-        for i in range(self.num_nodes):
-            for j in range(i+1, self.num_nodes):
-                xi, yi, vxi, vyi = templates[i]
-                xj, yj, vxj, vyj = templates[j]
-                a, b, c, d = (xi-xj), (yi-yj), (vxi-vxj), (vyi-vyj)
-                tmin = -(a*c+b*d)/(c**2+d**2).ceil().item()
-                self.A[1, i, j] = 1.0 / tmin if tmin > 0.0 else 0.0
-                self.A[1, j, i] = self.A[1, i, j]
+        self.A[1, :self.num_nodes, :self.num_nodes] = ttc_weights(templates)
     
 
     def normalize_undigraph(self, alpha=1e-3):
         DAD = torch.zeros(self.A.size())
         DAD.requires_grad = False
 
-        for k in range(self.s_kernel):
-            A_ = self.A[k, :self.num_nodes, :self.num_nodes]
-            D1 = torch.sum(A_, 0)+alpha
-            Dn = torch.zeros(self.num_nodes, self.num_nodes)
-            for i in range(self.num_nodes):
-                Dn[i, i] = D1[i]**(-0.5)
-            DAD_ = Dn.mm(A_).mm(Dn)
-            DAD[k] = DAD_
+        DAD[:, :self.num_nodes, :self.num_nodes] = normalize_adjacency(self.A[:, :self.num_nodes, :self.num_nodes], alpha)
         
-        return DAD
\ No newline at end of file
+        return DAD
+
+
+def normalized_seq(batch_data, seq_len, vmax, alpha=1e-3):
+    # batch_data size: (N, T, V, 4) -> As_seq (seq_len, N, s_kernel, vmax, vmax)
+    # same as stacking Graph(batch_data[num, i], vmax).normalize_undigraph() over samples and timesteps i < seq_len
+    templates = batch_data[:, :seq_len].transpose(0, 1)
+    T, N, V, C = templates.size()
+
+    A = torch.zeros(T, N, 2, V, V)
+    A[:, :, 0] = torch.eye(V)
+    A[:, :, 1] = ttc_weights(templates)
+
+    As_seq = torch.zeros(T, N, 2, vmax, vmax)
+    As_seq[..., :V, :V] = normalize_adjacency(A, alpha)
+
+    return As_seq
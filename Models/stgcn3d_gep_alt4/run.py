@@ -7,7 +7,7 @@ from sklearn.cluster import KMeans
 import argparse
 import time
 from stgcn3d_gep import STGCN3DGEPModel
-from graph import Graph
+from graph import normalized_seq
 from utils import *
 
 import os
@@ -67,18 +67,9 @@ def exec_model(dataloader_train, dataloader_test, args):
             batch_data, _ = data_vectorize(batch_data)
             batch_input_data, batch_pred_data = batch_data[:, :-args.pred_len, :, :], batch_data[:, -args.pred_len:, :, :]
 
-            inputs = data_feeder(batch_input_data)
-
-            As_seq = []
-            for i in range(args.obs_len-1):
-                As = []
-                for num in range(batch_size):
-                    g = Graph(batch_data[num, i, :, :], args.vmax)
-                    A = g.normalize_undigraph()
-                    As.append(A)
-                As = torch.stack(As)
-                As_seq.append(As)
-            As_seq = torch.stack(As_seq)
+            inputs = node_feeder(batch_input_data)
+
+            As_seq = normalized_seq(batch_data, args.obs_len-1, args.vmax)
             As = As_seq[0]
 
             obs_sentence_prob = obs_parse(batch_data, args.obs_len-1, s_gae, As_seq, cluster_obj, args.nc, device=dev)
@@ -131,19 +122,10 @@ def exec_model(dataloader_train, dataloader_test, args):
             batch_data = data_batch(input_data_list, pred_data_list, num_node_list, args.obs_len, args.pred_len, args.dset_feature, args.vmax)
             batch_input_data, batch_pred_data = batch_data[:, :-args.pred_len, :, :], batch_data[:, -args.pred_len:, :, :]
 
-            batch_input_data, first_value_dicts = data_vectorize(batch_input_data)
-            inputs = data_feeder(batch_input_data)
-
-            As_seq = []
-            for i in range(args.obs_len-1):
-                As = []
-                for num in range(batch_size):
-                    g = Graph(batch_input_data[num, i, :, :], args.vmax)
-                    A = g.normalize_undigraph()
-                    As.append(A)
-                As = torch.stack(As)
-                As_seq.append(As)
-            As_seq = torch.stack(As_seq)
+            batch_input_data, first_values = data_vectorize(batch_input_data)
+            inputs = node_feeder(batch_input_data)
+
+            As_seq = normalized_seq(batch_input_data, args.obs_len-1, args.vmax)
             As = As_seq[0]
 
             obs_sentence_prob = obs_parse(batch_input_data, args.obs_len-1, s_gae, As_seq, cluster_obj, args.nc, device=dev)
@@ -159,7 +141,7 @@ def exec_model(dataloader_train, dataloader_test, args):
 
             pred_outs = stgcn_gep(inputs, As, one_hots_pred_seq)
 
-            pred_rets = data_revert(pred_outs, first_value_dicts)
+            pred_rets = data_revert(pred_outs, first_values)
             pred_rets = pred_rets[:, :, :, :2]
 
             error = 0.0
@@ -210,6 +192,10 @@ def main():
     parser.add_argument('--dset_name', type=str, default='NGSIMDataset')
     parser.add_argument('--dset_tag', type=str, default='')
     parser.add_argument('--dset_feature', type=int, default=4)
+    parser.add_argument('--dset_lazy', action='store_true', default=False)
+    parser.add_argument('--dset_workers', type=int, default=0)
+    parser.add_argument('--dset_cache', type=str, default=os.path.join('..', '..', 'DataSet', 'cache'))
+    parser.add_argument('--node_batch', action='store_true', default=False)
     parser.add_argument('--frame_skip', type=int, default=2)
     parser.add_argument('--num_epochs', type=int, default=300)
     parser.add_argument('--pretrain_epochs', type=int, default=0)
@@ -0,0 +1,123 @@
+'''
+timing benchmark of STGCN3DGEPModel decoding: the per-scene cell loop STGCN3DGEPModel.forward used before (forward_loop)
+vs one cell call for all N*V agents per prediction step, forward+backward in training mode for growing batch sizes
+outputs and parameter gradients of both are compared
+'''
+
+import torch
+import torch.nn.functional as F
+
+import argparse
+import time
+
+from graph import normalized_seq
+from stgcn3d_gep import STGCN3DGEPModel
+from utils import node_feeder, output_activation, convert_one_hots
+
+
+def forward_loop(model, x, A, hidden_states, cell_states, one_hots_c_pred_seq):
+    # reference: training mode STGCN3DGEPModel.forward with one cell call per scene
+    N, V = x.size(0), x.size(-1)
+    pred_outs = torch.zeros(model.pred_len, N, V, model.out_dim)
+    c_outs = torch.zeros(model.pred_len, N, model.nc)
+
+    x = model.stgcn(x, A)
+
+    N, V, C = x.size()
+    x = x.repeat(model.pred_len, 1, 1, 1)
+
+    for i in range(model.pred_len):
+        for num in range(N):
+            if model.gru:
+                hidden_states[num] = model.cell(x[i, num], hidden_states[num].clone())
+            else:
+                hidden_states[num], cell_states[num] = model.cell(x[i, num], (hidden_states[num].clone(), cell_states[num].clone()))
+
+        o_c = model.classifier(hidden_states.clone())
+        c_outs[i] = o_c
+
+        o_p = model.predictor(hidden_states.clone(), one_hots_c_pred_seq[i])
+        pred_outs[i] = o_p
+
+    pred_outs = pred_outs.permute(1, 0, 2, 3).contiguous()
+    for i in range(len(pred_outs)):
+        pred_outs[i] = output_activation(pred_outs[i])
+
+    return pred_outs, c_outs
+
+
+def step(model, forward, inputs, As, one_hots_c_pred_seq, cell_h_dim):
+    N, V = inputs.size(0), inputs.size(-1)
+    hidden_states = torch.zeros(N, V, cell_h_dim)
+    cell_states = torch.zeros(N, V, cell_h_dim)
+
+    model.zero_grad()
+    pred_outs, c_outs = forward(inputs, As, hidden_states, cell_states, one_hots_c_pred_seq)
+    loss = pred_outs.pow(2).mean()+F.cross_entropy(c_outs.view(-1, model.nc), torch.zeros(c_outs.size(0)*N).long())
+    loss.backward()
+
+    return pred_outs.detach(), c_outs.detach(), [p.grad.clone() for p in model.parameters() if p.grad is not None]
+
+
+def time_call(func, repeat):
+    times = []
+    for _ in range(repeat):
+        t_start = time.time()
+        out = func()
+        times.append(time.time()-t_start)
+
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--num_nodes', type=int, default=4)
+    parser.add_argument('--obs_len', type=int, default=5)
+    parser.add_argument('--pred_len', type=int, default=25)
+    parser.add_argument('--in_channels', type=int, default=4)
+    parser.add_argument('--out_dim', type=int, default=5)
+    parser.add_argument('--nc', type=int, default=3)
+    parser.add_argument('--spatial_kernel_size', type=int, default=2)
+    parser.add_argument('--temporal_kernel_size', type=int, default=3)
+    parser.add_argument('--cell_input_dim', type=int, default=128)
+    parser.add_argument('--cell_h_dim', type=int, default=128)
+    parser.add_argument('--e_h_dim', type=int, default=256)
+    parser.add_argument('--e_c_dim', type=int, default=256)
+    parser.add_argument('--dropout', type=float, default=0.0)
+    parser.add_argument('--residual', action='store_true', default=True)
+    parser.add_argument('--gru', action='store_true', default=True)
+    parser.add_argument('--use_grammar', action='store_true', default=False)
+    parser.add_argument('--use_cuda', action='store_true', default=False)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    model = STGCN3DGEPModel(args)
+    model.train()
+
+    for N in args.batch_sizes:
+        batch_data = torch.randn(N, args.obs_len-1, args.num_nodes, 4)*torch.tensor([20.0, 20.0, 2.0, 2.0])
+        inputs = node_feeder(batch_data)
+        As = normalized_seq(batch_data, 1)[0]
+        one_hots_c_pred_seq = convert_one_hots(torch.randint(args.nc, (args.pred_len, N)), args.nc)
+
+        forward_batched = lambda *xs: model(*xs, None, None, None)
+        forward_looped = lambda *xs: forward_loop(model, *xs)
+
+        t_loop, (p_loop, c_loop, g_loop) = time_call(lambda: step(model, forward_looped, inputs, As, one_hots_c_pred_seq, args.cell_h_dim), args.repeat)
+        t_batch, (p_batch, c_batch, g_batch) = time_call(lambda: step(model, forward_batched, inputs, As, one_hots_c_pred_seq, args.cell_h_dim), args.repeat)
+
+        diff = max([(p_loop-p_batch).abs().max().item(), (c_loop-c_batch).abs().max().item()])
+        # absolute: the conv biases in front of a BatchNorm get zero gradient up to rounding
+        grad_diff = max((a-b).abs().max().item() for a, b in zip(g_loop, g_batch))
+
+        print('N = {:3d}: loop = {:.4f}s, batched = {:.4f}s, speedup = {:.1f}x, max out diff = {:.2e}, max grad diff = {:.2e}'.format(
+            N, t_loop, t_batch, t_loop/max(t_batch, 1e-9), diff, grad_diff))
+
+
+if __name__ == '__main__':
+    main()
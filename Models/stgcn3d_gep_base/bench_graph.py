@@ -0,0 +1,93 @@
+'''
+timing benchmark of graph building: per-pair loop (edges_loop) vs batched ttc_weights in Graph.edges,
+and the per-timestep As_seq loop with diagonal matmul normalization vs normalized_seq
+random (N, T, V, 4) templates, V from 2 to 64
+'''
+
+import torch
+
+import argparse
+import time
+
+from graph import Graph, normalized_seq
+
+
+def edges_loop(batch_templates):
+    # reference: the per-pair loop Graph.edges used before ttc_weights
+    N, V, C = batch_templates.size()
+    A = torch.zeros(N, 2, V, V)
+    A[:, 0] = torch.eye(V).repeat(N, 1, 1)
+
+    for num in range(N):
+        for i in range(V):
+            for j in range(i+1, V):
+                xi, yi, vxi, vyi = batch_templates[num, i]
+                xj, yj, vxj, vyj = batch_templates[num, j]
+                a, b, c, d = (xi-xj), (yi-yj), (vxi-vxj), (vyi-vyj)
+                tmin = -(a*c+b*d)/(c**2+d**2).ceil().item()
+                A[num, 1, i, j] = 1.0 / tmin if tmin > 0.0 else 0.0
+                A[num, 1, j, i] = A[num, 1, i, j]
+
+    return A
+
+
+def normalize_loop(A, alpha=1e-3):
+    # reference: the diagonal matmul Graph.normalize_undigraph used before normalize_adjacency
+    N, K, V, _ = A.size()
+    DADs = torch.zeros(A.size())
+    for num in range(N):
+        for k in range(K):
+            D1 = torch.sum(A[num, k], 0)+alpha
+            Dn = torch.zeros(V, V)
+            for i in range(V):
+                Dn[i, i] = D1[i]**(-0.5)
+            DADs[num, k] = Dn.mm(A[num, k]).mm(Dn)
+
+    return DADs
+
+
+def As_seq_loop(batch_data, seq_len):
+    return torch.stack([normalize_loop(Graph(batch_data[:, i]).A) for i in range(seq_len)])
+
+
+def time_call(func, repeat):
+    times = []
+    for _ in range(repeat):
+        t_start = time.time()
+        out = func()
+        times.append(time.time()-t_start)
+
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--batch_size', type=int, default=16)
+    parser.add_argument('--seq_len', type=int, default=19)
+    parser.add_argument('--num_nodes', type=int, nargs='+', default=[2, 4, 8, 16, 32, 64])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    for V in args.num_nodes:
+        templates = torch.randn(args.batch_size, V, 4)*torch.tensor([20.0, 20.0, 2.0, 2.0])
+
+        t_loop, A_loop = time_call(lambda: edges_loop(templates), 1)
+        t_batch, g = time_call(lambda: Graph(templates), args.repeat)
+
+        print('V = {:2d} edges:  loop = {:.4f}s, batched = {:.4f}s, speedup = {:.1f}x, identical = {}'.format(
+            V, t_loop, t_batch, t_loop/max(t_batch, 1e-9), torch.equal(A_loop, g.A)))
+
+        batch_data = torch.randn(args.batch_size, args.seq_len, V, 4)*torch.tensor([20.0, 20.0, 2.0, 2.0])
+        t_loop, As_loop = time_call(lambda: As_seq_loop(batch_data, args.seq_len), 1)
+        t_batch, As_batch = time_call(lambda: normalized_seq(batch_data, args.seq_len), args.repeat)
+
+        print('V = {:2d} As_seq: loop = {:.4f}s, batched = {:.4f}s, speedup = {:.1f}x, identical = {}'.format(
+            V, t_loop, t_batch, t_loop/max(t_batch, 1e-9), torch.equal(As_loop, As_batch)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+'''
+CPU latency of STGCN3DModule in eval mode vs inference_optimize (Conv+BatchNorm pairs folded, no Dropout)
+BatchNorm statistics are randomized first so the folding is not checked against identity normalizations only,
+outputs of both must match, the BatchNorm after each graph conv is kept so no speedup is expected
+no_bn drops the BatchNorm layers the frozen model keeps, its outputs differ: it only bounds what folding them could save
+'''
+
+import torch
+import torch.nn as nn
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+from graph import normalized_seq
+from st_gcn3d import STGCN3DModule
+from utils import node_feeder
+sys.path.append(os.path.join(os.getcwd(), '..', 'common'))
+from inference import inference_optimize
+
+
+def randomize_bn(model):
+    for module in model.modules():
+        if isinstance(module, nn.modules.batchnorm._BatchNorm):
+            module.running_mean.uniform_(-1.0, 1.0)
+            module.running_var.uniform_(0.5, 2.0)
+            if module.affine:
+                module.weight.data.uniform_(0.5, 1.5)
+                module.bias.data.uniform_(-0.5, 0.5)
+
+
+def drop_bn(model):
+    # timing bound only, not the same function
+    model = copy.deepcopy(model)
+    for module in model.modules():
+        if isinstance(module, nn.Sequential):
+            for i in range(len(module)):
+                if isinstance(module[i], nn.modules.batchnorm._BatchNorm):
+                    module[i] = nn.Identity()
+
+    return model
+
+
+def time_call(func, repeat):
+    times = []
+    for _ in range(repeat):
+        t_start = time.time()
+        with torch.no_grad():
+            out = func()
+        times.append(time.time()-t_start)
+
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 16])
+    parser.add_argument('--num_nodes', type=int, nargs='+', default=[4, 8, 16])
+    parser.add_argument('--obs_len', type=int, default=15)
+    parser.add_argument('--cell_input_dim', type=int, default=128)
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.threads > 0: torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+
+    model = STGCN3DModule(4, args.cell_input_dim, 2, 3, dropout=0.5, residual=True)
+    randomize_bn(model)
+    model.eval()
+    frozen = inference_optimize(model)
+    assert not any(param.requires_grad for param in frozen.parameters())
+    assert not any(isinstance(module, nn.Dropout) for module in frozen.modules())
+    no_bn = drop_bn(frozen)
+
+    for N in args.batch_sizes:
+        for V in args.num_nodes:
+            batch_data = torch.randn(N, args.obs_len-1, V, 4)*torch.tensor([20.0, 20.0, 2.0, 2.0])
+            inputs = node_feeder(batch_data)
+            As = normalized_seq(batch_data, 1)[0]
+
+            t_eval, out_eval = time_call(lambda: model(inputs, As), args.repeat)
+            t_frozen, out_frozen = time_call(lambda: frozen(inputs, As), args.repeat)
+            t_no_bn, _ = time_call(lambda: no_bn(inputs, As), args.repeat)
+            assert (out_eval-out_frozen).abs().max().item() <= 1e-5*max(1.0, out_eval.abs().max().item())
+
+            print('N = {:2d}, V = {:2d}: eval = {:.4f}s, frozen = {:.4f}s, speedup = {:.2f}x, no_bn = {:.4f}s ({:.2f}x), max diff = {:.2e} (max |out| = {:.2f})'.format(
+                N, V, t_eval, t_frozen, t_eval/max(t_frozen, 1e-9), t_no_bn, t_eval/max(t_no_bn, 1e-9),
+                (out_eval-out_frozen).abs().max().item(), out_eval.abs().max().item()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''
+timing benchmark of obs_parse: the per-timestep s_gae loop with per-sample cluster_prob used before (obs_parse_loop)
+vs one s_gae forward pass over all seq_len*N graphs and one batched distance to the cluster centers
+random GCNVAE in eval mode and a KMeans fitted on random features, sentence probabilities of both are compared
+'''
+
+import torch
+import torch.nn as nn
+
+import numpy as np
+from sklearn.cluster import KMeans
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.getcwd(), '..', 's_gae'))
+from gcn_vae import GCNVAE
+from utils import data_feeder_gae, obs_parse
+
+
+def obs_parse_loop(batch_data_seq, seq_len, s_gae, As_seq, cluster_obj, nc):
+    # reference: one s_gae call per timestep, features and cluster probabilities on the host
+    data = data_feeder_gae(batch_data_seq)
+    s_gae.eval()
+
+    feature_seq = []
+    with torch.no_grad():
+        for i in range(seq_len):
+            A = torch.sum(As_seq[i], 1)
+            _, mu, _ = s_gae(data[i], A)
+            mu = mu.permute(0, 2, 1).contiguous()
+            feature_seq.append(mu.mean(-1).data.cpu().numpy())
+
+    cluster_cs = cluster_obj.cluster_centers_
+    sentence_prob = []
+    for i in range(seq_len):
+        batch_prob = []
+        for feature in feature_seq[i]:
+            inv_dists = 1.0/(np.linalg.norm(cluster_cs-feature, axis=1)+1e-6)
+            batch_prob.append(inv_dists/np.sum(inv_dists))
+        sentence_prob.append(np.stack(batch_prob))
+
+    return torch.from_numpy(np.stack(sentence_prob))
+
+
+def time_call(func, repeat):
+    times = []
+    for _ in range(repeat):
+        t_start = time.time()
+        out = func()
+        times.append(time.time()-t_start)
+
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--num_nodes', type=int, default=8)
+    parser.add_argument('--obs_len', type=int, default=10)
+    parser.add_argument('--spatial_kernel_size', type=int, default=2)
+    parser.add_argument('--h_dim1', type=int, default=32)
+    parser.add_argument('--h_dim2', type=int, default=16)
+    parser.add_argument('--nc', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    s_gae = GCNVAE(4, args.h_dim1, args.h_dim2, use_cuda=False)
+    s_gae.bn.running_mean.uniform_(-1.0, 1.0)
+    s_gae.bn.running_var.uniform_(0.5, 2.0)
+    cluster_obj = KMeans(args.nc, n_init=3, random_state=args.seed).fit(np.random.RandomState(args.seed).randn(200, args.h_dim2))
+
+    seq_len = args.obs_len-1
+    for N in args.batch_sizes:
+        batch_data = torch.randn(N, seq_len, args.num_nodes, 4)*torch.tensor([20.0, 20.0, 2.0, 2.0])
+        As_seq = torch.rand(seq_len, N, args.spatial_kernel_size, args.num_nodes, args.num_nodes)
+
+        t_loop, p_loop = time_call(lambda: obs_parse_loop(batch_data, seq_len, s_gae, As_seq, cluster_obj, args.nc), args.repeat)
+        t_batch, p_batch = time_call(lambda: obs_parse(batch_data, seq_len, s_gae, As_seq, cluster_obj, args.nc), args.repeat)
+
+        print('N = {:2d}: loop = {:.4f}s, batched = {:.4f}s, speedup = {:.1f}x, max diff = {:.2e}'.format(
+            N, t_loop, t_batch, t_loop/max(t_batch, 1e-9), (p_loop-p_batch).abs().max().item()))
+
+
+if __name__ == '__main__':
+    main()
@@ -134,29 +134,29 @@ class STGCN3DGEPModel(nn.Module):
 			self.to(device)
 
 	# one_hots_c_seq forms differently in train / test
-	# x: (N, C, T, V, V); A: (N, V, V); hidden_states: (N, V, H); cell_states: (N, V, C)
+	# x: (N, C, T, V) from node_feeder or (N, C, T, V, V) from data_feeder; A: (N, V, V); hidden_states: (N, V, H); cell_states: (N, V, C)
 	# one_hots_c_pred_seq: (L, N, NC)
 	# grammar_gep: _; gep_parsed_sentence: (N, _)
 	# will add gae only part
 	def forward(self, x, A, hidden_states, cell_states, one_hots_c_pred_seq, grammar_gep, history, curr_l):
-		N, _, _, _, V = x.size()
-		pred_outs = torch.zeros(self.pred_len, N, V, self.out_dim).to(self.device)
-		c_outs = torch.zeros(self.pred_len, N, self.nc).to(self.device)
-
 		x = self.stgcn(x, A)
 
+		# all N*V agents step through the cell as one batch, the input is the same at every step
 		N, V, C = x.size()
-		x = x.repeat(self.pred_len, 1, 1, 1)
+		x = x.view(N*V, C)
+		h = hidden_states.reshape(N*V, -1)
+		c = cell_states.reshape(N*V, -1)
 
+		pred_outs, c_outs = [], []
 		for i in range(self.pred_len):
-			for num in range(N):
-				if self.gru:
-					hidden_states[num] = self.cell(x[i, num], hidden_states[num].clone())
-				else:
-					hidden_states[num], cell_states[num] = self.cell(x[i, num], (hidden_states[num].clone(), cell_states[num].clone()))
+			if self.gru:
+				h = self.cell(x, h)
+			else:
+				h, c = self.cell(x, (h, c))
+			hidden = h.view(N, V, -1)
 
-			o_c = self.classifier(hidden_states.clone())
-			c_outs[i] = o_c
+			o_c = self.classifier(hidden)
+			c_outs.append(o_c)
 
 			if self.training:
 				one_hots_c = one_hots_c_pred_seq[i]
@@ -166,11 +166,10 @@ class STGCN3DGEPModel(nn.Module):
 				else:
 					one_hots_c, history, curr_l = general_update(o_c, history, curr_l)
 
-			o_p = self.predictor(hidden_states.clone(), one_hots_c)
-			pred_outs[i] = o_p 
-		
-		pred_outs = pred_outs.permute(1, 0, 2, 3).contiguous()
-		for i in range(len(pred_outs)):
-			pred_outs[i] = output_activation(pred_outs[i])
+			pred_outs.append(self.predictor(hidden, one_hots_c))
+
+		# (L, N, V, D) -> (N, L, V, D), output_activation works on (_, V, D)
+		pred_outs = torch.stack(pred_outs, dim=1)
+		pred_outs = output_activation(pred_outs.view(N*self.pred_len, V, -1)).view(N, self.pred_len, V, -1)
 
-		return pred_outs, c_outs
+		return pred_outs, torch.stack(c_outs)
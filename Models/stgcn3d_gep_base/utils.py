@@ -27,6 +27,16 @@ def data_batch(input_data_list, pred_data_list, num_list):
     return num2input_dict, num2pred_dict
 
 
+def graph_batch(As_seq_list, num_list):
+    # same grouping as data_batch, for the As_seq precomputed by the dataset
+    num2graph_dict = {}
+    for i, num in enumerate(num_list):
+        if num not in num2graph_dict.keys(): num2graph_dict[num] = []
+        num2graph_dict[num].append(As_seq_list[i])
+
+    return num2graph_dict
+
+
 def data_feeder(batch_data):
     N, T, V, _ = batch_data.size()
     data = torch.zeros(N, T, V, V, 4)
@@ -39,71 +49,46 @@ def data_feeder(batch_data):
     return data
 
 
+def node_feeder(batch_data):
+    # (N, 2, T, V) positions, data_feeder without the (N, 4, T, V, V) pair tensor: the first ST_GCN3D layer pairs the nodes itself
+    return batch_data[:, :, :, :2].permute(0, 3, 1, 2).contiguous()
+
+
 def data_feeder_gae(batch_data):
+    # (T, N, 4, V, V), channels 0:2 are the positions of node u and 2:4 of node v
     N, T, V, _ = batch_data.size()
-    data = torch.zeros(N, T, V, V, 4).to(batch_data)
-    for i in range(V):
-        for j in range(V):
-            data[:, :, i, j, :2] = batch_data[:, :, i, :2]
-            data[:, :, i, j, 2:] = batch_data[:, :, j, :2]
-    data = data.permute(0, 1, 4, 2, 3).contiguous()
-    data = data.permute(1, 0, 2, 3, 4).contiguous()
+    pos = batch_data[:, :, :, :2]
+    data = torch.cat((pos.unsqueeze(3).expand(N, T, V, V, 2), pos.unsqueeze(2).expand(N, T, V, V, 2)), dim=4)
+    data = data.permute(1, 0, 4, 2, 3).contiguous()
 
     return data
 
 
 def data_vectorize(batch_data_seq):
-    batch_vectorized_seq = []
-    first_value_dicts = []
-    for data_seq in batch_data_seq:
-        first_value_dict = WriteOnceDict()
-        vectorized_seq = []
-
-        num_nodes = data_seq.size(1)
-        frame0 = data_seq[0, :]
-        for node in range(num_nodes):
-            first_value_dict[node] = frame0[node, :]
-        for i in range(1, len(data_seq)):
-            frame = data_seq[i]
-            vectorized_frame = torch.zeros(num_nodes, data_seq.size(-1))
-            for node in range(num_nodes):
-                vectorized_frame[node] = frame[node, :]-first_value_dict[node]
-            vectorized_seq.append(vectorized_frame)
-        batch_vectorized_seq.append(torch.stack(vectorized_seq))
-        first_value_dicts.append(first_value_dict)
+    # frames 1..T-1 relative to frame 0 of every node, offsets (N, V, F) are the frame 0 values for data_revert
+    first_values = batch_data_seq[:, 0].clone()
 
-    return torch.stack(batch_vectorized_seq), first_value_dicts
+    return batch_data_seq[:, 1:]-first_values.unsqueeze(1), first_values
 
 
-def data_revert(batch_data_seq, first_value_dicts):
-    batch_reverted_seq = []
+def data_revert(batch_data_seq, first_values):
+    # inverse of data_vectorize on the positions, the other features are kept
+    reverted_seq = batch_data_seq.clone()
+    reverted_seq[..., :2] = batch_data_seq[..., :2]+first_values[:, :, :2].to(batch_data_seq).unsqueeze(1)
 
-    for i in range(len(batch_data_seq)):
-        data_seq = batch_data_seq[i]
-        first_value_dict = first_value_dicts[i]
-        reverted_seq = data_seq.clone()
+    return reverted_seq
 
-        num_nodes = data_seq.size(1)
-        for j, frame in enumerate(data_seq):
-            for node in range(num_nodes):
-                reverted_seq[j, node, :2] = frame[node, :2]+first_value_dict[node][:2].to(frame)
-        batch_reverted_seq.append(reverted_seq)
 
-    return torch.stack(batch_reverted_seq)
+def cluster_prob(batch_feature, cluster_obj, nc, eps=1e-6):
+    # batch_feature: (..., C) tensor -> (..., nc) inverse distance weights to the cluster centers, on its device
+    # in double like the cluster centers
+    cluster_cs = torch.from_numpy(cluster_obj.cluster_centers_).to(batch_feature.device)
 
+    dists = torch.norm(batch_feature.double().unsqueeze(-2)-cluster_cs, dim=-1)
+    inv_dists = 1.0/(dists+eps)
+    # prob = np.exp(1.0/(dists+eps))/np.sum(np.exp(1.0/(dists+eps)))
 
-def cluster_prob(batch_feature, cluster_obj, nc, eps=1e-6):
-    cluster_cs = cluster_obj.cluster_centers_
-
-    batch_prob = []
-    for feature in batch_feature:
-        dists = np.linalg.norm(cluster_cs-feature, axis=1)
-        inv_dists = 1.0/(dists+eps)
-        # prob = np.exp(1.0/(dists+eps))/np.sum(np.exp(1.0/(dists+eps)))
-        prob = inv_dists/np.sum(inv_dists)
-        batch_prob.append(prob)
-    
-    return np.stack(batch_prob)
+    return inv_dists/inv_dists.sum(-1, keepdim=True)
 
 
 def convert_one_hots(sentence, nc):
@@ -161,25 +146,20 @@ def obs_parse(batch_data_seq, seq_len, s_gae, As_seq, cluster_obj, nc, device=No
         s_gae = s_gae.to(device)
         As_seq = As_seq.to(device)
 
-    data = data_feeder_gae(batch_data_seq)
+    # all seq_len*N graphs go through s_gae at once, in eval mode the samples do not interact
+    N, _, V, _ = batch_data_seq.size()
+    data = data_feeder_gae(batch_data_seq[:, :seq_len])
+    A = torch.sum(As_seq[:seq_len], 2)
     s_gae.eval()
 
-    feature_seq = []
-    for i in range(seq_len):
-        A = torch.sum(As_seq[i], 1)
-        _, mu, _ = s_gae(data[i], A)
-        mu = mu.permute(0, 2, 1).contiguous()
-        mu = mu.mean(-1)
-        feature_seq.append(mu.data.cpu().numpy())
-    feature_seq = np.stack(feature_seq)
-
-    sentence_prob = []
-    for i in range(seq_len):
-        batch_prob = cluster_prob(feature_seq[i], cluster_obj, nc)
-        sentence_prob.append(batch_prob)
-    sentence_prob = np.stack(sentence_prob)
+    with torch.no_grad():
+        _, mu, _ = s_gae(data.view(seq_len*N, -1, V, V), A.view(seq_len*N, V, V))
+    mu = mu.permute(0, 2, 1).contiguous()
+    feature_seq = mu.mean(-1).view(seq_len, N, -1)
+
+    sentence_prob = cluster_prob(feature_seq, cluster_obj, nc)
 
-    return torch.from_numpy(sentence_prob)
+    return sentence_prob.cpu()
 
 
 def general_update(o_c, history, curr_l):